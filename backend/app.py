@@ -1,30 +1,118 @@
 # backend/app.py
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify
 from flask_cors import CORS
-import requests
 from loguru import logger
 import os
-import sys
 import time
 from typing import Dict, Tuple
 
+from werkzeug.http import unquote_etag
+
+from proxy_cache import CachedResponse, create_proxy_cache
+from services import compression, metrics
+from services.log_setup import configure_logging, event
+from upstream import (CircuitOpen, UpstreamError, create_health_prober, create_upstream_client,
+                      is_unavailable)
+
 app = Flask(__name__)
 CORS(app)
+# Per-stage timings, Server-Timing headers and /metrics
+metrics.init_app(app)
+compression.init_app(app)
 
 
-# Configure logger
-logger.remove()
-logger.add(sys.stdout, level="INFO")
-if not os.getenv('VERCEL_ENV'):
-    logger.add("app.log", rotation="500 MB", level="INFO")
+# Configure logger: non-blocking sinks, plus a log file outside Vercel
+configure_logging(None if os.getenv('VERCEL_ENV') else "app.log")
 
 # Get the Model API URL from environment variables
 MODEL_API_URL = os.getenv('MODEL_API_URL', 'https://miroir-semantix-api.hf.space')
 
+# Shared keep-alive connection pool to the model API, behind a circuit breaker
+upstream = create_upstream_client(MODEL_API_URL)
+# Background health checks of the model API, read by /api/system-health
+prober = create_health_prober(upstream)
+prober.start()
+
+# Short-lived cache and request coalescing for the idempotent GET routes
+cache = create_proxy_cache()
+
+WAKING_UP_MESSAGE = "Le serveur de jeu démarre, veuillez réessayer dans quelques secondes"
+
+# Model API response headers kept on the proxied response
+PASSTHROUGH_HEADERS = ('Retry-After', 'ETag', 'Vary')
+
 
 import os
 from urllib.parse import urlparse, urlunparse
 
+def forward_headers() -> Dict[str, str]:
+    """Client headers passed through to the model API (session id, cache validator)."""
+    return {name: request.headers[name] for name in ('X-Session-Id', 'If-None-Match')
+            if name in request.headers}
+
+def fetch(method: str, path: str, json: Dict = None, headers: Dict[str, str] = None) -> CachedResponse:
+    """Send a request to the model API. Raises UpstreamError while it is down or waking up."""
+    response = upstream.request(method, path, json=json, headers=headers)
+    if is_unavailable(response):
+        raise UpstreamError(f"Model API answered {response.status_code}")
+    # Keep the model API's retry hint when it is busy, and its validators
+    kept = {name: response.headers[name] for name in PASSTHROUGH_HEADERS if name in response.headers}
+    if response.status_code != 304:
+        kept['Content-Type'] = response.headers.get('Content-Type', 'application/json')
+    return CachedResponse(response.status_code, response.content, kept)
+
+def to_response(cached: CachedResponse) -> Response:
+    return Response(cached.body if cached.status != 304 else None,
+                    status=cached.status, headers=cached.headers)
+
+def forward(method: str, path: str, json: Dict = None):
+    """
+    Forward the current request to the model API, keeping its status code.
+    While the model API is down or waking up, answers a fast 503 with a retry hint.
+    """
+    try:
+        return to_response(fetch(method, path, json=json, headers=forward_headers()))
+    except UpstreamError as e:
+        return upstream_unavailable(method, path, e)
+
+def forward_cached(path: str):
+    """
+    Forward a GET through the cache: joined to an identical request already
+    in flight, or answered from a response at most PROXY_CACHE_TTL old.
+    """
+    session_id = request.headers.get('X-Session-Id')
+    # The cache needs full bodies, so validators are checked here, not upstream
+    headers = {'X-Session-Id': session_id} if session_id else {}
+    try:
+        cached = cache.get(cache.key(path, session_id), lambda: fetch('GET', path, headers=headers))
+    except UpstreamError as e:
+        return upstream_unavailable('GET', path, e)
+    etag = cached.headers.get('ETag')
+    if cached.status == 200 and etag and request.if_none_match.contains_weak(unquote_etag(etag)[0]):
+        return Response(status=304, headers={k: v for k, v in cached.headers.items()
+                                             if k != 'Content-Type'})
+    return to_response(cached)
+
+def forward_update(path: str, json: Dict = None):
+    """Forward a POST that changes the session's game, invalidating its cached responses."""
+    session_id = request.headers.get('X-Session-Id')
+    # Before, so no read starting now is cached as current; after, for reads that overlapped
+    cache.invalidate(session_id)
+    try:
+        return forward('POST', path, json=json)
+    finally:
+        cache.invalidate(session_id)
+
+def upstream_unavailable(method: str, path: str, e: UpstreamError):
+    retry_after = e.retry_after if isinstance(e, CircuitOpen) else upstream.breaker.retry_after()
+    logger.debug(f"Model API unavailable for {method} {path}: {e}")
+    return waking_up(retry_after)
+
+def waking_up(retry_after: int):
+    """503 telling the client the model API is starting, and when to retry."""
+    return (jsonify({'error': WAKING_UP_MESSAGE, 'status': 'waking_up'}), 503,
+            {'Retry-After': str(retry_after)})
+
 def get_local_api_url() -> str:
     """Get the local API URL with correct port"""
     return "http://localhost:8000"  # FastAPI development server port
@@ -36,39 +124,12 @@ def is_local_url(url: str) -> bool:
 
 def check_huggingface_connection() -> Tuple[bool, str, float]:
     """
-    Check connection to Hugging Face service.
-    Falls back to local check if MODEL_API_URL is local.
+    Health of the Hugging Face service, from the prober's last snapshot
+    (probed now, with a short timeout, if it is stale).
     Returns: (success, message, response_time)
     """
-    try:
-        start_time = time.time()
-        
-        # Try root endpoint first, then fallback to /api/health
-        endpoints = ["", "/api/health"]
-        
-        for endpoint in endpoints:
-            try:
-                url = f"{MODEL_API_URL}{endpoint}"
-                logger.info(f"Trying endpoint: {url}")
-                response = requests.get(url)
-                response_time = time.time() - start_time
-                
-                if response.status_code == 200:
-                    health_data = response.json()
-                    model_status = health_data.get("model_loaded", True)
-                    if model_status:
-                        return True, "Service healthy and model loaded", response_time
-                    else:
-                        return False, "Service running but model not loaded", response_time
-            except requests.RequestException as e:
-                logger.warning(f"Failed to connect to {endpoint}: {str(e)}")
-                continue
-        
-        return False, "Could not connect to any health endpoints", time.time() - start_time
-            
-    except Exception as e:
-        logger.error(f"Connection error: {str(e)}")
-        return False, f"Failed to connect to service: {str(e)}", 0.0
+    snapshot = prober.snapshot()
+    return snapshot['healthy'], snapshot['message'], snapshot['response_time']
     
 @app.route('/api/system-health', methods=['GET'])
 def system_health():
@@ -77,7 +138,7 @@ def system_health():
     """
     try:
         actual_url = get_local_api_url() if is_local_url(MODEL_API_URL) else MODEL_API_URL
-        logger.info(f"Performing system health check for: {actual_url}")
+        logger.debug(f"Performing system health check for: {actual_url}")
         
         # Check service connection
         healthy, message, response_time = check_huggingface_connection()
@@ -92,18 +153,21 @@ def system_health():
             "services": {
                 "proxy": {
                     "status": "running",
-                    "message": "Proxy server is running"
+                    "message": "Proxy server is running",
+                    "cache": cache.stats()
                 },
                 "api": {
                     "status": "healthy" if healthy else "error",
                     "message": message,
                     "response_time": f"{response_time:.3f}s",
-                    "endpoint": actual_url
+                    "endpoint": actual_url,
+                    "circuit": upstream.breaker.snapshot()
                 }
             }
         }
         
-        logger.info(f"Health check results: {health_status}")
+        event('system_health', sampled=True, level='DEBUG', status=health_status['status'],
+              response_time=response_time, circuit=upstream.breaker.state)
         
         # In local development, return 200 even if service is down
         status_code = 200 if environment == "local" or healthy else 503
@@ -121,8 +185,7 @@ def system_health():
 @app.route('/api/visualization', methods=['GET'])
 def get_visualization():
     try:
-        response = requests.get(f"{MODEL_API_URL}/api/visualization")
-        return jsonify(response.json())
+        return forward_cached('/api/visualization')
     except Exception as e:
         logger.exception("Error getting visualization")
         return jsonify({'error': str(e)}), 500
@@ -130,8 +193,7 @@ def get_visualization():
 @app.route('/api/reset-game', methods=['POST'])
 def reset_game():
     try:
-        response = requests.post(f"{MODEL_API_URL}/api/reset-game")
-        return jsonify(response.json())
+        return forward_update('/api/reset-game', json=request.get_json(silent=True))
     except Exception as e:
         logger.exception("Error resetting game")
         return jsonify({'error': str(e)}), 500
@@ -139,22 +201,25 @@ def reset_game():
 @app.route('/api/check-word', methods=['POST'])
 def check_word():
     try:
-        data = request.get_json()
-        response = requests.post(f"{MODEL_API_URL}/api/check-word", json=data)
-        print(f"Response sent: {response}")
-        return jsonify(response.json())
+        return forward_update('/api/check-word', json=request.get_json())
     except Exception as e:
         logger.exception("Error checking word")
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/check-words', methods=['POST'])
+def check_words():
+    try:
+        return forward_update('/api/check-words', json=request.get_json())
+    except Exception as e:
+        logger.exception("Error checking words")
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/api/use-joker', methods=['POST', 'OPTIONS'])
 def use_joker():
     if request.method == 'OPTIONS':
         return '', 204
     try:
-        data = request.get_json()
-        response = requests.post(f"{MODEL_API_URL}/api/use-joker", json=data)
-        return jsonify(response.json())
+        return forward_update('/api/use-joker', json=request.get_json())
     except Exception as e:
         logger.exception("Error using joker")
         return jsonify({'error': str(e)}), 500
@@ -162,10 +227,7 @@ def use_joker():
 @app.route('/api/game-state', methods=['GET'])
 def get_game_state():
     try:
-        logger.info(f"Fetching game state from {MODEL_API_URL}/api/game-state")
-        response = requests.get(f"{MODEL_API_URL}/api/game-state")
-        logger.info(f"Response status: {response.status_code}")
-        return jsonify(response.json())
+        return forward_cached('/api/game-state')
     except Exception as e:
         logger.exception("Error getting game state")
         return jsonify({'error': str(e)}), 500
@@ -173,8 +235,7 @@ def get_game_state():
 @app.route('/api/health', methods=['GET'])
 def health_check():
     try:
-        response = requests.get(f"{MODEL_API_URL}/api/health")
-        return jsonify(response.json())
+        return forward_cached('/api/health')
     except Exception as e:
         logger.exception("Error checking health")
         return jsonify({'error': str(e)}), 500
@@ -182,13 +243,19 @@ def health_check():
 @app.route('/api/get-center-word', methods=['POST'])
 def get_center_word():
     try:
-        data = request.get_json()
-        response = requests.post(f"{MODEL_API_URL}/api/get-center-word", json=data)
-        return jsonify(response.json())
+        return forward('POST', '/api/get-center-word', json=request.get_json())
     except Exception as e:
         logger.exception("Error getting center word")
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/get-midpoint-word', methods=['POST'])
+def get_midpoint_word():
+    try:
+        return forward('POST', '/api/get-midpoint-word', json=request.get_json())
+    except Exception as e:
+        logger.exception("Error getting midpoint word")
+        return jsonify({'error': str(e)}), 500
+
 # Only use this for Vercel
 if os.getenv('VERCEL_ENV'):
     app = app.wsgi_app
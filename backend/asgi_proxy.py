@@ -0,0 +1,167 @@
+# backend/asgi_proxy.py
+"""
+Asynchronous (ASGI) variant of the proxy in app.py.
+
+Forwards the same /api routes to MODEL_API_URL through one pooled
+httpx.AsyncClient, so slow upstream calls don't hold a worker thread each
+and concurrent requests are forwarded concurrently. Uses the same PROXY_*
+settings as upstream.py, compresses responses like app.py and fails fast
+through the same circuit breaker while the model API is down. Requires httpx
+(pinned in requirements.txt; add h2 for PROXY_HTTP2=1) and an ASGI server:
+
+    pip install -r requirements.txt uvicorn
+    uvicorn asgi_proxy:app --port 5000
+"""
+import json
+import os
+
+import httpx
+from loguru import logger
+
+from services import compression
+from upstream import CircuitBreaker, is_unavailable
+
+MODEL_API_URL = os.getenv('MODEL_API_URL', 'https://miroir-semantix-api.hf.space').rstrip('/')
+
+# (method, path) pairs forwarded to the model API unchanged
+PROXIED_ROUTES = {
+    ('GET', '/api/visualization'),
+    ('POST', '/api/reset-game'),
+    ('POST', '/api/check-word'),
+    ('POST', '/api/check-words'),
+    ('POST', '/api/use-joker'),
+    ('GET', '/api/game-state'),
+    ('GET', '/api/health'),
+    ('POST', '/api/get-center-word'),
+    ('POST', '/api/get-midpoint-word'),
+}
+
+CORS_HEADERS = [
+    (b'access-control-allow-origin', b'*'),
+    (b'access-control-allow-headers', b'*'),
+    (b'access-control-allow-methods', b'GET, POST, OPTIONS'),
+]
+
+_client = None
+_breaker = CircuitBreaker(failure_threshold=int(os.getenv('PROXY_BREAKER_FAILURES', '5')),
+                          reset_timeout=float(os.getenv('PROXY_BREAKER_RESET', '15')))
+
+WAKING_UP_MESSAGE = "Le serveur de jeu démarre, veuillez réessayer dans quelques secondes"
+
+
+def _get_client() -> httpx.AsyncClient:
+    global _client
+    if _client is None:
+        pool_size = int(os.getenv('PROXY_POOL_SIZE', '20'))
+        _client = httpx.AsyncClient(
+            base_url=MODEL_API_URL,
+            http2=os.getenv('PROXY_HTTP2', '0') == '1',
+            timeout=httpx.Timeout(float(os.getenv('PROXY_READ_TIMEOUT', '30')),
+                                  connect=float(os.getenv('PROXY_CONNECT_TIMEOUT', '3.05'))),
+            limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size),
+        )
+    return _client
+
+
+async def _read_body(receive) -> bytes:
+    body = b''
+    while True:
+        message = await receive()
+        body += message.get('body', b'')
+        if not message.get('more_body', False):
+            return body
+
+
+async def _send_json(send, status: int, payload: dict, extra_headers: list = (),
+                     accept_encoding: str = '') -> None:
+    body, encoding = compression.encode(json.dumps(payload).encode('utf-8'), accept_encoding)
+    encoding_headers = [(b'content-encoding', encoding.encode())] if encoding else []
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [(b'content-type', b'application/json'),
+                    (b'content-length', str(len(body)).encode()),
+                    (b'vary', b'Accept-Encoding')]
+                   + encoding_headers + list(extra_headers) + CORS_HEADERS,
+    })
+    await send({'type': 'http.response.body', 'body': body})
+
+
+async def _waking_up(send) -> None:
+    await _send_json(send, 503, {'error': WAKING_UP_MESSAGE, 'status': 'waking_up'},
+                     [(b'retry-after', str(_breaker.retry_after()).encode())])
+
+
+async def app(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                if _client is not None:
+                    await _client.aclose()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    if scope['type'] != 'http':
+        return
+
+    method, path = scope['method'], scope['path']
+    if method == 'OPTIONS':
+        await send({'type': 'http.response.start', 'status': 204, 'headers': CORS_HEADERS})
+        await send({'type': 'http.response.body', 'body': b''})
+        return
+    if (method, path) not in PROXIED_ROUTES:
+        await _send_json(send, 404, {'error': 'Not found'})
+        return
+
+    headers = {}
+    accept_encoding = ''
+    for name, value in scope['headers']:
+        if name == b'x-session-id':
+            headers['X-Session-Id'] = value.decode('latin-1')
+        elif name == b'if-none-match':
+            headers['If-None-Match'] = value.decode('latin-1')
+        elif name == b'accept-encoding':
+            accept_encoding = value.decode('latin-1')
+    body = await _read_body(receive) if method == 'POST' else b''
+    if body:
+        headers['Content-Type'] = 'application/json'
+
+    if not _breaker.allow():
+        await _waking_up(send)
+        return
+    # Every request let through records exactly one result, so a half-open
+    # trial that fails in an unexpected way (or is cancelled) still settles the circuit
+    recorded = False
+    try:
+        try:
+            response = await _get_client().request(method, path, content=body or None, headers=headers)
+        except httpx.TransportError as e:
+            logger.debug(f"Model API unavailable for {method} {path}: {e}")
+            recorded = True
+            _breaker.record_failure()
+            await _waking_up(send)
+            return
+        recorded = True
+        if is_unavailable(response):
+            _breaker.record_failure()
+            await _waking_up(send)
+            return
+        _breaker.record_success()
+        # Keep the model API's retry hint when it is busy, and its cache validator
+        extra_headers = [(name.encode(), response.headers[name].encode())
+                         for name in ('retry-after', 'etag') if name in response.headers]
+        if response.status_code == 304:
+            await send({'type': 'http.response.start', 'status': 304,
+                        'headers': extra_headers + CORS_HEADERS})
+            await send({'type': 'http.response.body', 'body': b''})
+            return
+        await _send_json(send, response.status_code, response.json(), extra_headers, accept_encoding)
+    except Exception as e:
+        logger.exception(f"Error forwarding {method} {path}")
+        await _send_json(send, 500, {'error': str(e)})
+    finally:
+        if not recorded:
+            _breaker.record_failure()
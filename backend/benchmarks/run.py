@@ -0,0 +1,224 @@
+# file location: backend/benchmarks/run.py
+"""
+Benchmarks for the embedding, game and visualization hot paths.
+
+Builds a synthetic store (see benchmarks/synthetic.py), then times each
+case for a number of iterations after a warm-up and reports p50/p95/p99
+latency, throughput and the process's peak RSS. Results are written as
+JSON and can be compared against an earlier run; the exit status is 1 if
+any case's p50 or p95 regressed by more than the threshold.
+
+Usage (from backend/):
+    python -m benchmarks.run --vocab 100000 --dim 300 --output bench.json
+    python -m benchmarks.run --output new.json --compare bench.json
+"""
+
+import argparse
+import datetime
+import json
+import os
+import platform
+import random
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List
+
+import numpy as np
+from loguru import logger
+
+from benchmarks.synthetic import make_store
+
+
+def measure(fn: Callable[[int], None], iterations: int, warmup: int) -> Dict:
+    """Time fn(i) for `iterations` calls after `warmup` untimed ones."""
+    for i in range(warmup):
+        fn(i)
+    timings = np.empty(iterations)
+    start = time.perf_counter()
+    for i in range(iterations):
+        t0 = time.perf_counter()
+        fn(warmup + i)
+        timings[i] = time.perf_counter() - t0
+    total = time.perf_counter() - start
+    p50, p95, p99 = np.percentile(timings, [50, 95, 99]) * 1000
+    return {
+        'iterations': iterations,
+        'p50_ms': round(float(p50), 4),
+        'p95_ms': round(float(p95), 4),
+        'p99_ms': round(float(p99), 4),
+        'mean_ms': round(float(timings.mean() * 1000), 4),
+        'throughput_per_s': round(iterations / total, 2),
+        'peak_rss_mb': round(peak_rss_mb(), 1),
+    }
+
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of this process so far."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def build_cases(words: List[str], n_guesses: int, seed: int) -> Dict[str, Callable[[int], None]]:
+    """Set up the services over the current store and return the timed calls by name."""
+    from services.game_service import GameService
+    from services.state_store import MemoryStateStore
+    from services.visualization_service import VisualizationService
+    from services.word_service import WordEmbeddingService
+
+    word_service = WordEmbeddingService(background=False)
+    game_service = GameService(word_service, state_store=MemoryStateStore())
+    visualization_service = VisualizationService(word_service)
+
+    rng = random.Random(seed)
+    target = rng.choice(words)
+    word_service.prepare_target(target)
+    guesses = [w['word'] for w in word_service.get_most_similar_words(target, n=n_guesses // 2)]
+    guesses += rng.sample(words, n_guesses - len(guesses))
+    probes = [rng.choice(words) for _ in range(1000)]
+    fresh_targets = rng.sample(words, 1000)
+
+    def new_game(session_id: str) -> None:
+        game_service.state_store.save(session_id, game_service._create_initial_state(target))
+
+    new_game('bench')
+
+    def save_attempt(i: int) -> None:
+        if i % 50 == 0:
+            new_game('bench')
+        word = probes[i % len(probes)]
+        game_service.save_attempt(word, word_service.calculate_similarity(target, word),
+                                  session_id='bench')
+
+    def visualization_cold(i: int) -> None:
+        # A new session each call, so no cached layout is reused
+        visualization_service.prepare_3d_visualization(target, guesses, session_id=f"viz-{i}")
+
+    return {
+        'calculate_similarity': lambda i: word_service.calculate_similarity(
+            target, probes[i % len(probes)]),
+        'get_words_in_range': lambda i: word_service.get_words_in_range(target, 0.4, 0.7, n=5),
+        'get_center_word': lambda i: word_service.get_center_word(
+            [probes[i % len(probes)], probes[(i + 1) % len(probes)]], target),
+        'combine_16_midpoints': lambda i: word_service.combine(
+            [{target: 0.5, probes[(i + j) % len(probes)]: 0.5} for j in range(16)], k=5),
+        'get_most_similar_words': lambda i: word_service.get_most_similar_words(target, n=100),
+        'prepare_target': lambda i: word_service.prepare_target(fresh_targets[i % len(fresh_targets)]),
+        'save_attempt': save_attempt,
+        'prepare_3d_visualization': visualization_cold,
+        'prepare_3d_visualization_cached': lambda i: visualization_service.prepare_3d_visualization(
+            target, guesses, session_id='viz-cached'),
+    }
+
+
+def compare(results: Dict, baseline: Dict, threshold: float, min_diff_ms: float) -> List[str]:
+    """
+    Print a p50/p95 comparison table and return the names of regressed cases:
+    slower by more than `threshold` (relative) and `min_diff_ms` (absolute).
+    """
+    regressions = []
+    print(f"{'case':34} {'p50 ms':>10} {'base':>10} {'diff':>8} {'p95 ms':>10} {'base':>10} {'diff':>8}")
+    for name, current in results['cases'].items():
+        previous = baseline.get('cases', {}).get(name)
+        if previous is None:
+            print(f"{name:34} {current['p50_ms']:>10.3f} {'-':>10} {'new':>8}")
+            continue
+        row, regressed = [], False
+        for key in ('p50_ms', 'p95_ms'):
+            change = (current[key] - previous[key]) / previous[key] if previous[key] else 0.0
+            regressed |= change > threshold and current[key] - previous[key] > min_diff_ms
+            row.append(f"{current[key]:>10.3f} {previous[key]:>10.3f} {change:>+8.1%}")
+        print(f"{name:34} {' '.join(row)}{'  REGRESSION' if regressed else ''}")
+        if regressed:
+            regressions.append(name)
+    return regressions
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except Exception:
+        return 'unknown'
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--vocab', type=int, default=100000, help='synthetic vocabulary size')
+    parser.add_argument('--dim', type=int, default=300, help='embedding dimension')
+    parser.add_argument('--dtype', default=os.getenv('EMBEDDING_DTYPE', 'float32'),
+                        help='embedding storage (float32, float16 or int8)')
+    parser.add_argument('--iterations', type=int, default=200)
+    parser.add_argument('--warmup', type=int, default=5)
+    parser.add_argument('--guesses', type=int, default=30, help='guesses in the visualized game')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--only', nargs='*', help='run only these cases')
+    parser.add_argument('--output', default='bench.json', help='where to write the results')
+    parser.add_argument('--compare', help='earlier results to compare against')
+    parser.add_argument('--threshold', type=float, default=0.10,
+                        help='relative slowdown counted as a regression (default 0.10)')
+    parser.add_argument('--min-diff-ms', type=float, default=0.05,
+                        help='ignore slowdowns smaller than this, in ms (default 0.05)')
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix='semantix-bench-')
+    os.environ.update(
+        EMBEDDING_STORE_DIR=os.path.join(work_dir, 'embeddings'),
+        EMBEDDING_DTYPE=args.dtype,
+        PUZZLE_PACK_DIR=os.path.join(work_dir, 'puzzles'),
+        MODEL_BACKGROUND_LOAD='0',
+    )
+    logger.remove()
+    logger.add(sys.stderr, level='WARNING')
+
+    try:
+        return run(args)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def run(args: argparse.Namespace) -> int:
+    start = time.perf_counter()
+    words = make_store(os.environ['EMBEDDING_STORE_DIR'], args.vocab, args.dim, seed=args.seed)
+    print(f"Synthetic store: {args.vocab} words x {args.dim} ({time.perf_counter() - start:.1f}s)")
+
+    cases = build_cases(words, args.guesses, args.seed)
+    results = {
+        'created_at': datetime.datetime.now().isoformat(timespec='seconds'),
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'machine': platform.machine(),
+        'params': {k: v for k, v in vars(args).items() if k not in ('output', 'compare')},
+        'cases': {},
+    }
+    for name, fn in cases.items():
+        if args.only and name not in args.only:
+            continue
+        stats = measure(fn, args.iterations, args.warmup)
+        results['cases'][name] = stats
+        print(f"{name:34} p50 {stats['p50_ms']:9.3f} ms  p95 {stats['p95_ms']:9.3f} ms  "
+              f"p99 {stats['p99_ms']:9.3f} ms  {stats['throughput_per_s']:10.1f}/s  "
+              f"rss {stats['peak_rss_mb']:.0f} MB")
+
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {args.output}")
+
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold, args.min_diff_ms)
+        if regressions:
+            print(f"Regressed: {', '.join(regressions)}")
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,35 @@
+# file location: backend/benchmarks/synthetic.py
+"""
+Synthetic embedding stores for benchmarks.
+
+Vectors are drawn around random cluster centres so that, like real word
+embeddings, every word has a handful of close neighbours and a long tail
+of unrelated ones. The same (vocab_size, dim, seed) always gives the same
+store.
+"""
+
+from typing import List
+
+import numpy as np
+
+from services import embedding_store
+
+
+def synthetic_words(vocab_size: int) -> List[str]:
+    return [f"mot{i}" for i in range(vocab_size)]
+
+
+def make_store(store_dir: str, vocab_size: int = 100000, dim: int = 300,
+               n_clusters: int = 500, noise: float = 0.5, seed: int = 0,
+               block: int = 65536) -> List[str]:
+    """Write a clustered synthetic store to `store_dir` and return its vocabulary."""
+    rng = np.random.default_rng(seed)
+    centres = rng.standard_normal((n_clusters, dim)).astype(np.float32)
+    vectors = np.empty((vocab_size, dim), dtype=np.float32)
+    for start in range(0, vocab_size, block):
+        end = min(start + block, vocab_size)
+        clusters = rng.integers(0, n_clusters, end - start)
+        vectors[start:end] = centres[clusters] + noise * rng.standard_normal((end - start, dim))
+    words = synthetic_words(vocab_size)
+    embedding_store.write_store(store_dir, words, vectors)
+    return words
@@ -0,0 +1,51 @@
+# backend/gunicorn.conf.py
+"""
+Gunicorn settings for serving the model API from several worker processes.
+
+When EMBEDDING_SHARED_MEMORY is set, the master process builds the
+embedding store if the disk has none (downloading and converting the model
+before the server binds its port), then publishes the matrix into shared
+memory once, before forking, and every worker attaches to it read-only
+instead of loading its own copy:
+
+    EMBEDDING_SHARED_MEMORY=semantix_embeddings gunicorn -c gunicorn.conf.py <module>:app
+
+The master also loads the vocabulary and its word -> row index; workers
+inherit those Python objects through fork, copy-on-write, rather than
+rebuilding them. Pages a worker writes to (reference counts of the words
+it looks up) are still copied, so the sharing is partial.
+
+If the store cannot be built or published, the master logs a warning and
+workers load it themselves. Without the setting, workers memory-map the
+same vectors.npy and still share its pages through the OS page cache.
+"""
+import os
+
+from loguru import logger
+
+bind = f"0.0.0.0:{os.getenv('PORT', '7860')}"
+workers = int(os.getenv('WEB_CONCURRENCY', '4'))
+timeout = 120
+
+
+def on_starting(server):
+    name = os.getenv('EMBEDDING_SHARED_MEMORY')
+    if name:
+        from services import shared_embeddings
+        from services.word_service import WordEmbeddingService
+        store_dir = os.getenv('EMBEDDING_STORE_DIR', 'data/embeddings')
+        dtype = os.getenv('EMBEDDING_DTYPE', 'float32')
+        try:
+            WordEmbeddingService.ensure_store(store_dir)
+            shared_embeddings.publish_store(store_dir, name, dtype)
+            shared_embeddings.preload_vocab(store_dir)
+        except Exception as e:
+            logger.warning(f"Could not publish the embedding store to shared memory ({e}), "
+                           f"workers will map it themselves")
+
+
+def on_exit(server):
+    name = os.getenv('EMBEDDING_SHARED_MEMORY')
+    if name:
+        from services import shared_embeddings
+        shared_embeddings.unlink(name)
@@ -0,0 +1,180 @@
+# file location: backend/loadtest/loadgen.py
+"""
+Load generator simulating concurrent players against the game API.
+
+Each simulated player keeps its own session (X-Session-Id) and plays in a
+loop: reset the game, then a series of guesses, with a joker, a look at the
+visualization and a center-word request now and then. Players run for a
+fixed duration at each concurrency stage; raising the stages until the
+throughput stops growing or errors appear shows the saturation point.
+
+Point --url at the proxy (app.py) or straight at the model API (or at
+loadtest/stub_model_api.py): the difference between the two runs is the
+proxy's overhead.
+
+Usage (from backend/):
+    python -m loadtest.loadgen --url http://localhost:5000 --players 10 50 100 --duration 30
+    python -m loadtest.loadgen --url http://localhost:8000 --players 50 --output direct.json
+"""
+
+import argparse
+import json
+import random
+import threading
+import time
+import uuid
+from collections import defaultdict
+from typing import Dict, List
+
+import numpy as np
+import requests
+
+# Upper bounds of the latency histogram buckets, in ms
+HISTOGRAM_BOUNDS = [1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, float('inf')]
+
+
+class Recorder:
+    """Latencies and outcomes per endpoint, shared by every player."""
+
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def record(self, endpoint: str, seconds: float, ok: bool) -> None:
+        with self._lock:
+            self.latencies[endpoint].append(seconds * 1000)
+            if not ok:
+                self.errors[endpoint] += 1
+
+    def summary(self, duration: float) -> Dict:
+        endpoints = {}
+        for endpoint, values in sorted(self.latencies.items()):
+            values = np.array(values)
+            p50, p95, p99 = np.percentile(values, [50, 95, 99])
+            counts = np.histogram(values, bins=[0] + HISTOGRAM_BOUNDS)[0]
+            endpoints[endpoint] = {
+                'requests': len(values),
+                'error_rate': round(self.errors[endpoint] / len(values), 4),
+                'p50_ms': round(float(p50), 2),
+                'p95_ms': round(float(p95), 2),
+                'p99_ms': round(float(p99), 2),
+                'max_ms': round(float(values.max()), 2),
+                'histogram': {f"<={b:g}": int(c) for b, c in zip(HISTOGRAM_BOUNDS, counts)},
+            }
+        total = sum(e['requests'] for e in endpoints.values())
+        errors = sum(self.errors.values())
+        return {
+            'requests': total,
+            'throughput_per_s': round(total / duration, 1),
+            'error_rate': round(errors / total, 4) if total else 0.0,
+            'endpoints': endpoints,
+        }
+
+
+class Player:
+    def __init__(self, url: str, words: List[str], recorder: Recorder, guesses: int,
+                 timeout: float):
+        self.url = url.rstrip('/')
+        self.words = words
+        self.recorder = recorder
+        self.guesses = guesses
+        self.timeout = timeout
+        self.session = requests.Session()
+        self.session.headers['X-Session-Id'] = uuid.uuid4().hex
+
+    def call(self, method: str, endpoint: str, json_body: Dict = None):
+        start = time.perf_counter()
+        try:
+            response = self.session.request(method, f"{self.url}/api/{endpoint}", json=json_body,
+                                            timeout=self.timeout)
+            ok = response.status_code < 400
+            body = response.json() if ok else None
+        except (requests.RequestException, ValueError):
+            ok, body = False, None
+        self.recorder.record(endpoint, time.perf_counter() - start, ok)
+        return body
+
+    def play(self, stop: threading.Event) -> None:
+        while not stop.is_set():
+            self.call('POST', 'reset-game', {})
+            guessed = []
+            for turn in range(self.guesses):
+                if stop.is_set():
+                    return
+                word = random.choice(self.words)
+                self.call('POST', 'check-word', {'word': word})
+                guessed.append(word)
+                if turn % 5 == 4 and random.random() < 0.5:
+                    self.call('POST', 'use-joker',
+                              {'joker_type': random.choice(['high_similarity', 'medium_similarity'])})
+                if turn % 10 == 9:
+                    self.call('GET', 'visualization')
+                    self.call('POST', 'get-center-word', {'chosen_words': random.sample(guessed, 2)})
+            self.call('GET', 'game-state')
+
+
+def run_stage(url: str, players: int, duration: float, words: List[str], guesses: int,
+              timeout: float) -> Dict:
+    recorder = Recorder()
+    stop = threading.Event()
+    threads = [
+        threading.Thread(target=Player(url, words, recorder, guesses, timeout).play,
+                         args=(stop,), daemon=True)
+        for _ in range(players)
+    ]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    time.sleep(duration)
+    stop.set()
+    for thread in threads:
+        thread.join(timeout)
+    summary = recorder.summary(time.perf_counter() - start)
+    summary['players'] = players
+    return summary
+
+
+def print_stage(summary: Dict) -> None:
+    print(f"\n{summary['players']} players: {summary['requests']} requests, "
+          f"{summary['throughput_per_s']}/s, {summary['error_rate']:.2%} errors")
+    print(f"  {'endpoint':18} {'reqs':>7} {'err':>7} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}  histogram")
+    for endpoint, stats in summary['endpoints'].items():
+        peak = max(stats['histogram'].values()) or 1
+        bars = ''.join(' .:-=+*#'[min(7, int(8 * c / peak))] if c else ' '
+                       for c in stats['histogram'].values())
+        print(f"  {endpoint:18} {stats['requests']:>7} {stats['error_rate']:>7.2%} "
+              f"{stats['p50_ms']:>9.1f} {stats['p95_ms']:>9.1f} {stats['p99_ms']:>9.1f}  |{bars}|")
+    print(f"  histogram buckets (ms): {' '.join(f'{b:g}' for b in HISTOGRAM_BOUNDS)}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', default='http://localhost:5000', help='proxy or model API base URL')
+    parser.add_argument('--players', type=int, nargs='+', default=[10],
+                        help='concurrent players, one stage per value')
+    parser.add_argument('--duration', type=float, default=30, help='seconds per stage')
+    parser.add_argument('--guesses', type=int, default=20, help='guesses per game')
+    parser.add_argument('--timeout', type=float, default=30)
+    parser.add_argument('--words', default='data/word_list.json', help='JSON file with a "words" list')
+    parser.add_argument('--output', help='write the stage summaries to this JSON file')
+    args = parser.parse_args()
+
+    with open(args.words, 'r', encoding='utf-8') as f:
+        words = json.load(f)['words']
+
+    stages = []
+    for players in args.players:
+        summary = run_stage(args.url, players, args.duration, words, args.guesses, args.timeout)
+        print_stage(summary)
+        stages.append(summary)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({'url': args.url, 'duration': args.duration, 'stages': stages}, f, indent=2)
+        print(f"\nResults written to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
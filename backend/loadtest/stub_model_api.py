@@ -0,0 +1,74 @@
+# file location: backend/loadtest/stub_model_api.py
+"""
+Local stand-in for the model API (the Hugging Face Space), for load tests.
+
+Serves the real routes from routes.py over the dummy services of
+test_config.py, so responses have the production shape, and delays every
+request by a configurable latency so the proxy can be measured against a
+known backend. Latency is set per route (the path without /api/) or for
+all routes with 'default', in milliseconds, with optional normal jitter
+and a share of requests failing with a 500.
+
+Usage (from backend/):
+    python -m loadtest.stub_model_api --port 8000 --latency default=20 visualization=150
+    MODEL_API_URL=http://localhost:8000 python app.py
+"""
+
+import argparse
+import random
+import time
+from typing import Dict, List
+
+from flask import Flask, jsonify, request
+from loguru import logger
+
+from routes import register_routes
+from services.work_pool import WorkPool
+from test_config import TEST_CONFIG
+
+
+def parse_latencies(specs: List[str]) -> Dict[str, float]:
+    """['default=20', 'visualization=150'] -> {'default': 20.0, 'visualization': 150.0}"""
+    latencies = {'default': 0.0}
+    for spec in specs:
+        route, _, value = spec.partition('=')
+        latencies[route] = float(value)
+    return latencies
+
+
+def create_stub_app(latencies: Dict[str, float], jitter_ms: float = 0.0,
+                    error_rate: float = 0.0, workers: int = 16) -> Flask:
+    app = Flask(__name__)
+
+    @app.before_request
+    def simulate_backend():
+        route = request.path.removeprefix('/api/')
+        delay = latencies.get(route, latencies['default'])
+        if jitter_ms:
+            delay = max(0.0, random.gauss(delay, jitter_ms))
+        time.sleep(delay / 1000)
+        if error_rate and random.random() < error_rate:
+            return jsonify({'error': 'Injected failure'}), 500
+        return None
+
+    register_routes(app, TEST_CONFIG['game_service'], TEST_CONFIG['word_service'],
+                    TEST_CONFIG['visualization_service'],
+                    work_pool=WorkPool(max_workers=workers, max_queue=workers * 4))
+    return app
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--latency', nargs='*', default=['default=20'],
+                        help='route=milliseconds pairs, e.g. default=20 visualization=150')
+    parser.add_argument('--jitter-ms', type=float, default=0.0)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    args = parser.parse_args()
+
+    latencies = parse_latencies(args.latency)
+    logger.info(f"Stub model API on {args.host}:{args.port}, latencies {latencies} ms")
+    create_stub_app(latencies, args.jitter_ms, args.error_rate).run(
+        host=args.host, port=args.port, threaded=True)
@@ -0,0 +1,117 @@
+# backend/proxy_cache.py
+"""
+Short-lived response cache with request coalescing, for the proxy's
+idempotent GET routes (game state, visualization, health).
+
+Identical requests arriving while one is already in flight to the model
+API wait for it and share its response (single flight), and successful
+responses are kept for a few seconds, so frontend polling costs one
+upstream call per session and TTL rather than one per poll.
+
+Entries are keyed on the route, the session and the session's generation.
+Routes that change a game (check-word, use-joker, reset-game...) bump the
+generation before and after forwarding, so nothing read before or during
+the change is served once it is done. Each proxy process has its own
+cache: with several workers, another worker may serve a state up to
+PROXY_CACHE_TTL seconds old.
+
+    PROXY_CACHE_TTL      seconds a response is reused, 0 to disable (default 2)
+    PROXY_CACHE_ENTRIES  responses kept, least recently used evicted (default 1024)
+"""
+import os
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from typing import Callable, Dict, Hashable, Optional
+
+CachedResponse = namedtuple('CachedResponse', ['status', 'body', 'headers'])
+
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.response: Optional[CachedResponse] = None
+        self.error: Optional[BaseException] = None
+
+
+class ProxyCache:
+    def __init__(self, ttl: float = 2.0, max_entries: int = 1024, wait_timeout: float = 60.0):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        # How long a coalesced request waits for the one in flight before fetching itself
+        self.wait_timeout = wait_timeout
+        # key -> (expiry, response), least recently used first
+        self._entries = OrderedDict()
+        self._flights: Dict[Hashable, _Flight] = {}
+        self._generations: Dict[Optional[str], int] = {}
+        self._stats = {'hits': 0, 'misses': 0, 'coalesced': 0}
+        self._lock = threading.Lock()
+
+    def key(self, route: str, session_id: Optional[str]) -> Hashable:
+        with self._lock:
+            return route, session_id, self._generations.get(session_id, 0)
+
+    def invalidate(self, session_id: Optional[str]) -> None:
+        """Make the session's cached responses unreachable; they age out of the LRU."""
+        with self._lock:
+            self._generations[session_id] = self._generations.get(session_id, 0) + 1
+            # Generations only need to differ, so cap the table instead of tracking sessions
+            if len(self._generations) > 4 * self.max_entries:
+                self._generations.clear()
+                self._entries.clear()
+
+    def get(self, key: Hashable, fetch: Callable[[], CachedResponse]) -> CachedResponse:
+        """
+        The cached response for `key`, else the one being fetched for it, else
+        the result of `fetch()`, kept for `ttl` seconds if it is a 200.
+        Errors raised by `fetch` are raised to every request waiting on it.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                self._entries.move_to_end(key)
+                self._stats['hits'] += 1
+                return entry[1]
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+                self._stats['misses'] += 1
+            else:
+                self._stats['coalesced'] += 1
+
+        if not leader:
+            if flight.done.wait(self.wait_timeout):
+                if flight.error is not None:
+                    raise flight.error
+                return flight.response
+            return fetch()
+
+        try:
+            flight.response = fetch()
+            return flight.response
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                self._flights.pop(key, None)
+                if flight.response is not None and flight.response.status == 200 and self.ttl > 0:
+                    self._entries[key] = (time.monotonic() + self.ttl, flight.response)
+                    self._entries.move_to_end(key)
+                    while len(self._entries) > self.max_entries:
+                        self._entries.popitem(last=False)
+            flight.done.set()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {**self._stats, 'entries': len(self._entries), 'ttl': self.ttl}
+
+
+def create_proxy_cache() -> ProxyCache:
+    """Build the cache from the PROXY_CACHE_* environment variables."""
+    return ProxyCache(
+        ttl=float(os.getenv('PROXY_CACHE_TTL', '2')),
+        max_entries=int(os.getenv('PROXY_CACHE_ENTRIES', '1024')),
+        wait_timeout=float(os.getenv('PROXY_READ_TIMEOUT', '30')) + 5,
+    )
@@ -1,23 +1,103 @@
 # backend/routes.py
+import time
+from typing import Dict, List, Optional
+
 from flask import jsonify, request
 from loguru import logger
 
-def register_routes(app, game_service, word_service, visualization_service):
-    """Register all routes for the application."""
+from services import compression, metrics
+from services.log_setup import event
+from services.state_store import DEFAULT_SESSION
+from services.work_pool import DeadlineExceeded, PoolSaturated, create_work_pool
+
+# Largest list of guesses accepted by /api/check-words
+MAX_BATCH_WORDS = 200
+# Similarity from which a guess wins and the win screen's neighbours are fetched
+WIN_SIMILARITY = 0.99
+# Retry-After sent while the model loads, and delay before retrying a failed load
+MODEL_LOADING_RETRY_AFTER = 5
+MODEL_LOAD_RETRY_SECONDS = 30
+
+def get_session_id() -> str:
+    """Session id sent by the client in the X-Session-Id header (or ?session_id=)."""
+    session_id = request.headers.get('X-Session-Id') or request.args.get('session_id')
+    if not session_id or len(session_id) > 128:
+        return DEFAULT_SESSION
+    return session_id
+
+def read_since(data) -> Optional[int]:
+    """The client's count of attempts already seen, if it asked for a delta response."""
+    since = data.get('since')
+    if isinstance(since, int) and not isinstance(since, bool) and since >= 0:
+        return since
+    return None
+
+def history_fields(attempts: List[Dict], since: Optional[int]) -> Dict:
+    """
+    The full history, or with `since` only the attempts after the first
+    `since` ones, plus the indexes the client needs to merge them.
+    """
+    if since is None:
+        return {'history': attempts}
+    since = min(since, len(attempts))
+    return {'history': attempts[since:], 'history_since': since, 'history_length': len(attempts)}
+
+def busy_response(e):
+    """503 for work the pool could not take or finish in time, with a retry hint."""
+    response = jsonify({'error': str(e), 'retry_after': e.retry_after})
+    response.headers['Retry-After'] = str(e.retry_after)
+    return response, 503
+
+def register_routes(app, game_service, word_service, visualization_service, work_pool=None):
+    """
+    Register all routes for the application.
+
+    Layouts, joker range scans, center-word searches and the win screen's
+    neighbours run in `work_pool` (created from WORK_POOL_* if not given).
+    """
+    work_pool = work_pool or create_work_pool()
+    # Per-stage timings, Server-Timing headers and /metrics
+    metrics.init_app(app)
+    compression.init_app(app)
+
+    def run_heavy(heavy, fn, *args, **kwargs):
+        """Run fn in the work pool if `heavy`, else on the request thread."""
+        if heavy:
+            return work_pool.run(fn, *args, **kwargs)
+        return fn(*args, **kwargs)
+
+    @app.before_request
+    def require_model():
+        """Answer every route but the health check with a fast 503 until the model is loaded."""
+        if (request.path in ('/api/health', '/metrics') or request.method == 'OPTIONS'
+                or word_service.is_ready()):
+            return None
+        status = word_service.loading_status()
+        if status['stage'] == 'failed' and time.time() - status['finished_at'] > MODEL_LOAD_RETRY_SECONDS:
+            # The failure may have been transient (network, disk): try again
+            word_service.start_loading()
+        response = jsonify({'error': 'Le modèle est en cours de chargement', 'loading': status})
+        response.headers['Retry-After'] = str(MODEL_LOADING_RETRY_AFTER)
+        return response, 503
     
     @app.route('/api/visualization', methods=['GET'])
     def get_visualization():
         try:
-            game_state = game_service.get_state()
+            session_id = get_session_id()
+            game_state = game_service.get_state(session_id=session_id)
             target_word = game_state['target_word']
             guessed_words = [attempt['word'] for attempt in game_state['attempts']]
             
-            viz_data = visualization_service.prepare_3d_visualization(
+            viz_data = work_pool.run(
+                visualization_service.prepare_3d_visualization,
                 target_word, 
-                guessed_words
+                guessed_words,
+                session_id=session_id
             )
             
             return jsonify(viz_data)
+        except (PoolSaturated, DeadlineExceeded) as e:
+            return busy_response(e)
         except Exception as e:
             logger.exception("Error getting visualization")
             return jsonify({'error': str(e)}), 500
@@ -25,8 +105,12 @@ def register_routes(app, game_service, word_service, visualization_service):
     @app.route('/api/reset-game', methods=['POST'])
     def reset_game():
         try:
-            new_state = game_service.reset_game()
-            logger.info(f"Game reset with new state: {new_state}")
+            data = request.get_json(silent=True) or {}
+            session_id = get_session_id()
+            new_state = game_service.reset_game(daily=bool(data.get('daily', False)),
+                                                session_id=session_id)
+            event('game_reset', session=session_id, daily=bool(data.get('daily', False)),
+                  version=new_state.get('version'))
             return jsonify(new_state)
         except Exception as e:
             logger.exception("Error resetting game")
@@ -41,34 +125,116 @@ def register_routes(app, game_service, word_service, visualization_service):
             if not guess_word:
                 return jsonify({'error': 'Le mot ne peut pas être vide'}), 400
             
-            state = game_service.get_state()
+            since = read_since(data)
+            session_id = get_session_id()
+            state = game_service.get_state(session_id=session_id)
             target_word = state['target_word']
             
+            # Accent and case variants count as the vocabulary word ('ecole' -> 'école')
+            resolved = word_service.resolve_word(guess_word)
+            if resolved is not None:
+                guess_word = resolved
             similarity = word_service.calculate_similarity(target_word, guess_word)
             
             if similarity > 0:
-                updated_state = game_service.save_attempt(guess_word, similarity)
+                rank = word_service.get_rank(target_word, guess_word)
+                updated_state = run_heavy(similarity > WIN_SIMILARITY,
+                                          game_service.save_attempt, guess_word, similarity, rank,
+                                          session_id=session_id)
+                word_found = updated_state.get('word_found', False)
+                # Delta clients get the win screen's words once, with the winning guess
+                send_similar = word_found and (since is None or not state['word_found'])
                 response = {
+                    'word': guess_word,
                     'similarity': similarity,
-                    'history': updated_state['attempts'],
-                    'word_found': updated_state.get('word_found', False),
-                    'similar_words': updated_state.get('similar_words', []) 
-                                   if updated_state.get('word_found', False) else []
+                    'rank': rank,
+                    **history_fields(updated_state['attempts'], since),
+                    'word_found': word_found,
+                    'similar_words': updated_state.get('similar_words', []) if send_similar else []
                 }
+                attempts = updated_state['attempts']
             else:
                 response = {
                     'error': 'Le mot n\'a pas été trouvé dans le dictionnaire',
+                    'word': guess_word,
                     'similarity': 0,
-                    'history': state['attempts']
+                    'suggestions': word_service.suggest_words(guess_word) if resolved is None else [],
+                    **history_fields(state['attempts'], since)
                 }
+                attempts = state['attempts']
             
-            logger.info(f"Word check response: {response}")
+            event('check_word', sampled=True, session=session_id, word=guess_word,
+                  similarity=similarity, rank=response.get('rank'),
+                  found=response.get('word_found', False), attempts=len(attempts))
             return jsonify(response)
             
+        except (PoolSaturated, DeadlineExceeded) as e:
+            return busy_response(e)
         except Exception as e:
             logger.exception("Error checking word")
             return jsonify({'error': str(e)}), 500
 
+    @app.route('/api/check-words', methods=['POST'])
+    def check_words():
+        """Score a list of guesses in one matrix operation and record them in one write."""
+        try:
+            data = request.get_json() or {}
+            words = data.get('words', [])
+            if not isinstance(words, list) or not words:
+                return jsonify({'error': 'La liste de mots ne peut pas être vide'}), 400
+            if len(words) > MAX_BATCH_WORDS:
+                return jsonify({'error': f'Au plus {MAX_BATCH_WORDS} mots par requête'}), 400
+
+            guesses = [str(w).lower().strip() for w in words]
+            resolved = [word_service.resolve_word(g) if g else None for g in guesses]
+            words = [r or g for r, g in zip(resolved, guesses)]
+            since = read_since(data)
+            session_id = get_session_id()
+            state = game_service.get_state(session_id=session_id)
+            target_word = state['target_word']
+
+            similarities = word_service.calculate_similarities(target_word, words)
+            ranks = word_service.get_ranks(target_word, words)
+
+            results, attempts = [], []
+            for guess, known, word, similarity, rank in zip(guesses, resolved, words,
+                                                             similarities, ranks):
+                if word and similarity > 0:
+                    attempt = {'word': word, 'similarity': similarity}
+                    if rank is not None:
+                        attempt['rank'] = rank
+                    attempts.append(attempt)
+                    result = {'word': word, 'similarity': similarity, 'rank': rank}
+                else:
+                    result = {
+                        'word': word,
+                        'similarity': 0,
+                        'error': 'Le mot n\'a pas été trouvé dans le dictionnaire',
+                        'suggestions': word_service.suggest_words(word) if word and known is None else []
+                    }
+                if word != guess:
+                    result['guess'] = guess
+                results.append(result)
+
+            updated_state = run_heavy(any(a['similarity'] > WIN_SIMILARITY for a in attempts),
+                                      game_service.save_attempts, attempts, session_id=session_id)
+            word_found = updated_state.get('word_found', False)
+            event('check_words', sampled=True, session=session_id, words=len(words),
+                  valid=len(attempts), found=word_found)
+            send_similar = word_found and (since is None or not state['word_found'])
+            return jsonify({
+                'results': results,
+                **history_fields(updated_state['attempts'], since),
+                'word_found': word_found,
+                'similar_words': updated_state.get('similar_words', []) if send_similar else []
+            })
+
+        except (PoolSaturated, DeadlineExceeded) as e:
+            return busy_response(e)
+        except Exception as e:
+            logger.exception("Error checking words")
+            return jsonify({'error': str(e)}), 500
+
     @app.route('/api/use-joker', methods=['POST', 'OPTIONS'])
     def use_joker():
         if request.method == 'OPTIONS':
@@ -78,20 +244,21 @@ def register_routes(app, game_service, word_service, visualization_service):
             data = request.get_json()
             joker_type = data.get('joker_type')
             
-            logger.info(f"Received joker request with type: {joker_type}")
-            
             if not joker_type:
                 logger.error("No joker type provided")
                 return jsonify({'error': 'Joker type is required'}), 400
                 
-            result = game_service.use_joker(joker_type)
+            session_id = get_session_id()
+            result = work_pool.run(game_service.use_joker, joker_type, session_id=session_id)
             
-            logger.info("Joker response:")
-            logger.info(f"Words: {[w['word'] for w in result['joker_words']]}")
-            logger.info(f"Remaining jokers: {result['jokers']}")
+            event('joker', session=session_id, type=joker_type,
+                  words=[w['word'] for w in result['joker_words']],
+                  remaining=result['jokers'].get(joker_type, {}).get('remaining'))
             
             return jsonify(result)
             
+        except (PoolSaturated, DeadlineExceeded) as e:
+            return busy_response(e)
         except ValueError as e:
             logger.error(f"ValueError in use_joker: {str(e)}")
             return jsonify({'error': str(e)}), 400
@@ -102,9 +269,18 @@ def register_routes(app, game_service, word_service, visualization_service):
     @app.route('/api/game-state', methods=['GET'])
     def get_game_state():
         try:
-            state = game_service.get_state()
-            logger.info(f"Retrieved game state: {state}")
-            return jsonify(state)
+            session_id = get_session_id()
+            state = game_service.get_state(session_id=session_id)
+            event('game_state', sampled=True, level='DEBUG', session=session_id,
+                  attempts=len(state['attempts']), version=state.get('version'))
+            response = jsonify(state)
+            # The game id and the version bumped by every write identify the
+            # representation; the version alone repeats across games
+            if state.get('game_id') and state.get('version') is not None:
+                response.set_etag(f"{state['game_id']}-v{state['version']}", weak=True)
+                response.vary.add('X-Session-Id')
+                response = response.make_conditional(request)
+            return response
         except Exception as e:
             logger.exception("Error getting game state")
             return jsonify({'error': str(e)}), 500
@@ -112,13 +288,20 @@ def register_routes(app, game_service, word_service, visualization_service):
     # Add a health check endpoint
     @app.route('/api/health', methods=['GET'])
     def health_check():
-        """Health check endpoint to verify API is running."""
+        """Health check endpoint to verify API is running, and how far the model has loaded."""
+        loading = word_service.loading_status()
         return jsonify({
-            'status': 'healthy',
+            'status': 'healthy' if loading['model_loaded'] else 'loading',
+            'model_loaded': loading['model_loaded'],
+            'loading': loading,
             'services': {
                 'game_service': game_service is not None,
                 'word_service': word_service is not None,
                 'visualization_service': visualization_service is not None
+            },
+            'work_pool': {
+                'pending': work_pool.pending,
+                'capacity': work_pool.max_workers + work_pool.max_queue
             }
         })
     
@@ -127,10 +310,33 @@ def register_routes(app, game_service, word_service, visualization_service):
         """Compute and return a new 'center word' from chosen words + target word."""
         data = request.get_json()
         chosen_words = data.get('chosen_words', [])
-        logger.info(f"Received chosen words: {chosen_words}")
+        event('center_word', session=get_session_id(), chosen=chosen_words)
         
-        center_word_info = game_service.get_center_word_power(chosen_words)
+        try:
+            center_word_info = work_pool.run(game_service.get_center_word_power, chosen_words,
+                                             session_id=get_session_id())
+        except (PoolSaturated, DeadlineExceeded) as e:
+            return busy_response(e)
         if not center_word_info:
             return jsonify({"error": "No center word found."}), 400
         
-        return jsonify(center_word_info)
\ No newline at end of file
+        return jsonify(center_word_info)
+
+    @app.route('/api/get-midpoint-word', methods=['POST'])
+    def get_midpoint_word():
+        """Return the word halfway between a chosen word and the target word."""
+        data = request.get_json() or {}
+        chosen_word = str(data.get('chosen_word', '')).lower().strip()
+        if not chosen_word:
+            return jsonify({'error': 'Le mot ne peut pas être vide'}), 400
+        event('midpoint_word', session=get_session_id(), chosen=chosen_word)
+
+        try:
+            midpoint_info = work_pool.run(game_service.get_midpoint_word_power, chosen_word,
+                                          session_id=get_session_id())
+        except (PoolSaturated, DeadlineExceeded) as e:
+            return busy_response(e)
+        if not midpoint_info:
+            return jsonify({"error": "No midpoint word found."}), 400
+
+        return jsonify(midpoint_info)
\ No newline at end of file
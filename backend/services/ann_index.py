@@ -0,0 +1,135 @@
+# file location: backend/services/ann_index.py
+"""
+Inverted-file (IVF) approximate nearest-neighbour index over an embedding store.
+
+The vocabulary is clustered with spherical k-means; a query is compared
+against the cluster centroids and only the rows of the `n_probe` closest
+clusters are scored. Raising `n_probe` trades latency for recall; probing
+every list is equivalent to exact search.
+
+The index is built offline and saved next to the store as ivf.npz, tagged
+with the store's vocabulary fingerprint so a stale index is never used:
+
+    python -m services.ann_index build data/embeddings
+"""
+
+import sys
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+from loguru import logger
+
+from services import embedding_store
+
+INDEX_FILE = 'ivf.npz'
+
+
+class IVFIndex:
+    def __init__(self, centroids: np.ndarray, list_offsets: np.ndarray, list_rows: np.ndarray):
+        self.centroids = centroids
+        # Rows of list i are list_rows[list_offsets[i]:list_offsets[i + 1]]
+        self.list_offsets = list_offsets
+        self.list_rows = list_rows
+
+    @property
+    def n_lists(self) -> int:
+        return len(self.centroids)
+
+    def candidates(self, query: np.ndarray, n_probe: int) -> np.ndarray:
+        """Rows stored in the `n_probe` lists whose centroids are closest to `query`."""
+        n_probe = min(n_probe, self.n_lists)
+        centroid_scores = self.centroids @ query
+        probed = np.argpartition(-centroid_scores, n_probe - 1)[:n_probe]
+        return np.concatenate([
+            self.list_rows[self.list_offsets[i]:self.list_offsets[i + 1]] for i in probed
+        ])
+
+    @classmethod
+    def build(cls, matrix: np.ndarray, scales: Optional[np.ndarray] = None,
+              n_lists: Optional[int] = None, n_iter: int = 10,
+              sample_size: int = 200000, seed: int = 0,
+              block: int = 65536) -> 'IVFIndex':
+        """Cluster the rows of `matrix` with spherical k-means and bucket them."""
+        n_rows = len(matrix)
+        if n_lists is None:
+            n_lists = max(1, int(4 * np.sqrt(n_rows)))
+        rng = np.random.default_rng(seed)
+
+        sample_rows = np.sort(rng.choice(n_rows, size=min(sample_size, n_rows), replace=False))
+        sample = _decode(matrix, scales, sample_rows)
+        centroids = sample[rng.choice(len(sample), size=min(n_lists, len(sample)), replace=False)]
+
+        for iteration in range(n_iter):
+            assignment = _assign(sample, centroids)
+            order = np.argsort(assignment, kind='stable')
+            counts = np.bincount(assignment, minlength=len(centroids))
+            starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+            filled = counts > 0
+            sums = np.zeros_like(centroids)
+            sums[filled] = np.add.reduceat(sample[order], starts[filled], axis=0)
+            norms = np.linalg.norm(sums, axis=1, keepdims=True)
+            empty = norms[:, 0] == 0
+            # Re-seed empty clusters from random sample points
+            sums[empty] = sample[rng.choice(len(sample), size=int(empty.sum()))]
+            norms[empty] = 1.0
+            centroids = sums / norms
+            logger.debug(f"IVF k-means iteration {iteration + 1}/{n_iter}")
+
+        assignment = np.empty(n_rows, dtype=np.int32)
+        for start in range(0, n_rows, block):
+            rows = np.arange(start, min(start + block, n_rows))
+            assignment[rows] = _assign(_decode(matrix, scales, rows), centroids)
+
+        list_rows = np.argsort(assignment, kind='stable').astype(np.int32)
+        counts = np.bincount(assignment, minlength=len(centroids))
+        list_offsets = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+        logger.info(f"Built IVF index with {len(centroids)} lists over {n_rows} rows")
+        return cls(centroids.astype(np.float32), list_offsets, list_rows)
+
+    def save(self, store_dir: str) -> None:
+        fingerprint = embedding_store.read_meta(store_dir)['fingerprint']
+        with embedding_store.atomic_path(Path(store_dir) / INDEX_FILE, '.npz') as tmp_file:
+            np.savez(tmp_file, centroids=self.centroids, list_offsets=self.list_offsets,
+                     list_rows=self.list_rows, fingerprint=np.array(fingerprint))
+
+    @classmethod
+    def load(cls, store_dir: str) -> Optional['IVFIndex']:
+        """Load the store's index, or None if it is missing, unreadable or was built for another vocabulary."""
+        path = Path(store_dir) / INDEX_FILE
+        if not path.exists():
+            return None
+        fingerprint = embedding_store.read_meta(store_dir)['fingerprint']
+        try:
+            with np.load(path) as data:
+                if str(data['fingerprint']) != fingerprint:
+                    logger.warning(f"Ignoring stale IVF index at {path}")
+                    return None
+                return cls(data['centroids'], data['list_offsets'], data['list_rows'])
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable IVF index {path}: {e}")
+            return None
+
+
+def _assign(vectors: np.ndarray, centroids: np.ndarray, block: int = 4096) -> np.ndarray:
+    """Index of the closest centroid for each vector, without a full score matrix."""
+    assignment = np.empty(len(vectors), dtype=np.int32)
+    for start in range(0, len(vectors), block):
+        assignment[start:start + block] = np.argmax(vectors[start:start + block] @ centroids.T, axis=1)
+    return assignment
+
+
+def _decode(matrix: np.ndarray, scales: Optional[np.ndarray], rows: np.ndarray) -> np.ndarray:
+    vectors = np.asarray(matrix[rows], dtype=np.float32)
+    if scales is not None:
+        vectors = vectors * scales[rows][:, None]
+    return vectors
+
+
+if __name__ == '__main__':
+    if len(sys.argv) != 3 or sys.argv[1] != 'build':
+        print("Usage: python -m services.ann_index build <store_dir>")
+        sys.exit(1)
+    store = sys.argv[2]
+    matrix, _ = embedding_store.load_matrix(store)
+    IVFIndex.build(matrix).save(store)
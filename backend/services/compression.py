@@ -0,0 +1,70 @@
+# file location: backend/services/compression.py
+"""
+gzip / brotli compression of JSON and text responses.
+
+Bodies smaller than MIN_SIZE bytes are sent as they are. Brotli is used
+when the client accepts it and the optional `brotli` package is installed,
+gzip otherwise.
+
+    COMPRESSION_MIN_SIZE  smallest body compressed, in bytes (default 1024)
+"""
+
+import gzip
+import os
+from typing import Optional, Tuple
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+MIN_SIZE = int(os.getenv('COMPRESSION_MIN_SIZE', '1024'))
+COMPRESSIBLE_TYPES = ('application/json', 'text/')
+
+
+def choose_encoding(accept_encoding: str) -> Optional[str]:
+    """Best encoding we can produce among those the client accepts."""
+    accepted = set()
+    for part in accept_encoding.split(','):
+        name, _, params = part.partition(';')
+        quality = params.strip().removeprefix('q=')
+        try:
+            if params and float(quality) == 0:
+                continue
+        except ValueError:
+            pass
+        accepted.add(name.strip().lower())
+    if brotli is not None and 'br' in accepted:
+        return 'br'
+    if 'gzip' in accepted:
+        return 'gzip'
+    return None
+
+
+def encode(body: bytes, accept_encoding: str) -> Tuple[bytes, Optional[str]]:
+    """Return (body, encoding), compressed when worth it and accepted by the client."""
+    encoding = choose_encoding(accept_encoding) if len(body) >= MIN_SIZE else None
+    if encoding == 'br':
+        return brotli.compress(body, quality=4), encoding
+    if encoding == 'gzip':
+        return gzip.compress(body, compresslevel=6), encoding
+    return body, None
+
+
+def init_app(app) -> None:
+    """Compress the eligible responses of the Flask `app`."""
+    from flask import request
+
+    @app.after_request
+    def compress_response(response):
+        if (response.direct_passthrough or response.is_streamed
+                or response.status_code < 200 or response.status_code in (204, 304)
+                or 'Content-Encoding' in response.headers
+                or not response.mimetype.startswith(COMPRESSIBLE_TYPES)):
+            return response
+        response.vary.add('Accept-Encoding')
+        body, encoding = encode(response.get_data(), request.headers.get('Accept-Encoding', ''))
+        if encoding is not None:
+            response.set_data(body)
+            response.headers['Content-Encoding'] = encoding
+        return response
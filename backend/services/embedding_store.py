@@ -0,0 +1,348 @@
+# file location: backend/services/embedding_store.py
+"""
+Binary, memory-mappable embedding store.
+
+A store is a directory converted once from a word2vec text file:
+
+    vectors.npy  (n_words, dim) float32 matrix, rows L2-normalised
+    vocab.txt    one word per line, in row order
+    meta.json    vocabulary size, dimension and vocabulary fingerprint
+
+Quantized copies of the matrix are derived from vectors.npy on first use:
+
+    vectors.float16.npy          half-precision rows
+    vectors.int8.npy, scales.npy int8 rows with one float32 scale per row
+
+Opening a store maps `vectors.npy` with `np.load(mmap_mode='r')`, so start-up
+does not parse any text and the pages are shared by every process reading
+the same file through the OS page cache.
+
+Files are written under unique temporary names and renamed into place, and
+building or quantizing holds an exclusive lock on `.build.lock`, so server
+workers that all find the store missing build it once: the others wait and
+then open the finished store.
+
+Usage:
+    python -m services.embedding_store convert cc.fr.300.reduced.vec data/embeddings
+    python -m services.embedding_store report data/embeddings int8
+"""
+
+import hashlib
+import json
+import os
+import sys
+import tempfile
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process lock, builds must not overlap
+    fcntl = None
+
+import numpy as np
+from loguru import logger
+
+VECTORS_FILE = 'vectors.npy'
+VOCAB_FILE = 'vocab.txt'
+META_FILE = 'meta.json'
+SCALES_FILE = 'scales.npy'
+LOCK_FILE = '.build.lock'
+
+DTYPES = ('float32', 'float16', 'int8')
+
+# Rows widened to float32 at a time when scanning, converting or quantizing:
+# about 10 MB at 300 dimensions, per concurrent scan
+BLOCK_ROWS = 8192
+
+
+def store_exists(store_dir: str) -> bool:
+    """Return True if `store_dir` holds a complete store."""
+    path = Path(store_dir)
+    return all((path / name).exists() for name in (VECTORS_FILE, VOCAB_FILE, META_FILE))
+
+
+def read_meta(store_dir: str) -> Dict:
+    """Read the store's meta.json."""
+    with open(Path(store_dir) / META_FILE, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+@contextmanager
+def build_lock(store_dir: str) -> Iterator[None]:
+    """
+    Hold an exclusive lock on `store_dir` shared by every process, for as
+    long as the store is downloaded, converted or quantized. Callers
+    re-check whether the work is still needed once they hold it.
+    """
+    path = Path(store_dir)
+    path.mkdir(parents=True, exist_ok=True)
+    with open(path / LOCK_FILE, 'a') as f:
+        if fcntl is not None:
+            try:
+                fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                logger.info(f"Waiting for another process building the embedding store {store_dir}")
+                fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+
+@contextmanager
+def atomic_path(target: Path, suffix: str = '.tmp') -> Iterator[Path]:
+    """
+    Yield a unique temporary path next to `target` and rename it onto
+    `target` when the block succeeds; it is removed if the block fails.
+    `suffix` keeps the extension NumPy expects ('.npy', '.npz').
+    """
+    target = Path(target)
+    fd, name = tempfile.mkstemp(dir=target.parent, prefix=f".{target.name}.", suffix=suffix)
+    os.close(fd)
+    tmp = Path(name)
+    try:
+        yield tmp
+        # mkstemp creates the file private to its owner
+        os.chmod(tmp, 0o644)
+        os.replace(tmp, target)
+    finally:
+        tmp.unlink(missing_ok=True)
+
+
+def convert_word2vec(vec_path: str, store_dir: str,
+                     progress: Optional[Callable[[int, int], None]] = None) -> None:
+    """
+    Convert a word2vec text file into a store.
+    Vectors are streamed straight into the output matrix, so the text
+    file is never held in memory as a whole. `progress`, if given, is
+    called with (words read, words announced) as the conversion advances.
+    """
+    path = Path(store_dir)
+    path.mkdir(parents=True, exist_ok=True)
+    logger.info(f"Converting {vec_path} into embedding store {store_dir}")
+
+    with atomic_path(path / VECTORS_FILE, '.npy') as tmp_vectors:
+        with open(vec_path, 'r', encoding='utf-8', errors='replace') as f:
+            n_words, dim = (int(x) for x in f.readline().split())
+            matrix = np.lib.format.open_memmap(tmp_vectors, mode='w+',
+                                               dtype=np.float32, shape=(n_words, dim))
+            words = []
+            for line in f:
+                parts = line.rstrip('\n').rstrip(' ').split(' ')
+                if len(parts) <= dim:
+                    continue
+                if len(words) == n_words:
+                    break
+                matrix[len(words)] = np.asarray(parts[-dim:], dtype=np.float32)
+                words.append(' '.join(parts[:-dim]))
+                if progress is not None and len(words) % 50000 == 0:
+                    progress(len(words), n_words)
+
+        if len(words) != n_words:
+            logger.warning(f"Header announced {n_words} words, read {len(words)}")
+
+        _normalise_rows(matrix, len(words))
+        matrix.flush()
+        del matrix
+
+        if len(words) != n_words:
+            # Rewrite with the true row count so the header matches the vocabulary
+            full = np.load(tmp_vectors, mmap_mode='r')
+            with atomic_path(tmp_vectors, '.npy') as trimmed:
+                np.save(trimmed, full[:len(words)])
+                del full
+
+        _remove_derived(path)
+        _write_vocab_and_meta(path, words, dim)
+        # Leaving the block moves vectors.npy into place last, completing the store
+    logger.info(f"Embedding store written with {len(words)} words of dimension {dim}")
+
+
+def write_store(store_dir: str, words: List[str], vectors: np.ndarray) -> None:
+    """Write an in-memory vocabulary and vector matrix as a store."""
+    path = Path(store_dir)
+    path.mkdir(parents=True, exist_ok=True)
+    matrix = np.array(vectors, dtype=np.float32, order='C', copy=True)
+    _normalise_rows(matrix, len(matrix))
+
+    with atomic_path(path / VECTORS_FILE, '.npy') as tmp_vectors:
+        np.save(tmp_vectors, matrix)
+        _remove_derived(path)
+        _write_vocab_and_meta(path, list(words), matrix.shape[1])
+
+
+def load_store(store_dir: str, mmap: bool = True) -> Tuple[np.ndarray, List[str]]:
+    """
+    Open a store and return (matrix, vocabulary).
+    With `mmap` the matrix is a read-only memory map of vectors.npy.
+    """
+    matrix = np.load(Path(store_dir) / VECTORS_FILE, mmap_mode='r' if mmap else None)
+    vocab = load_vocab(store_dir)
+    if len(vocab) != matrix.shape[0]:
+        raise ValueError(f"Corrupt embedding store {store_dir}: "
+                         f"{len(vocab)} words for {matrix.shape[0]} vectors")
+    return matrix, vocab
+
+
+def load_matrix(store_dir: str, dtype: str = 'float32',
+                mmap: bool = True) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+    """
+    Open the matrix in the requested storage `dtype` and return (matrix, scales).
+    `scales` is only set for int8, where row i decodes as matrix[i] * scales[i].
+    The quantized file is written from vectors.npy the first time it is
+    needed, by one process at a time.
+    """
+    if dtype not in DTYPES:
+        raise ValueError(f"Unsupported embedding dtype '{dtype}', expected one of {DTYPES}")
+    path = Path(store_dir)
+    mmap_mode = 'r' if mmap else None
+    if dtype == 'float32':
+        return np.load(path / VECTORS_FILE, mmap_mode=mmap_mode), None
+
+    if not (path / _quantized_file(dtype)).exists():
+        with build_lock(store_dir):
+            if not (path / _quantized_file(dtype)).exists():
+                quantize_store(store_dir, dtype)
+    matrix = np.load(path / _quantized_file(dtype), mmap_mode=mmap_mode)
+    scales = np.load(path / SCALES_FILE, mmap_mode=mmap_mode) if dtype == 'int8' else None
+    return matrix, scales
+
+
+def quantize_store(store_dir: str, dtype: str, block: int = BLOCK_ROWS) -> None:
+    """Write the float16 or per-row-scaled int8 copy of the store's matrix."""
+    path = Path(store_dir)
+    source = np.load(path / VECTORS_FILE, mmap_mode='r')
+    logger.info(f"Quantizing embedding store {store_dir} to {dtype}")
+
+    with atomic_path(path / _quantized_file(dtype), '.npy') as tmp_file:
+        target = np.lib.format.open_memmap(tmp_file, mode='w+', dtype=np.dtype(dtype),
+                                           shape=source.shape)
+        scales = np.ones(len(source), dtype=np.float32)
+        for start in range(0, len(source), block):
+            chunk = np.asarray(source[start:start + block], dtype=np.float32)
+            if dtype == 'int8':
+                chunk_scales = np.abs(chunk).max(axis=1) / 127.0
+                chunk_scales[chunk_scales == 0] = 1.0
+                scales[start:start + block] = chunk_scales
+                chunk = np.rint(chunk / chunk_scales[:, None])
+            target[start:start + block] = chunk.astype(dtype)
+        target.flush()
+        del target
+
+        if dtype == 'int8':
+            with atomic_path(path / SCALES_FILE, '.npy') as tmp_scales:
+                np.save(tmp_scales, scales)
+
+
+def quantization_report(store_dir: str, dtype: str, n_queries: int = 200,
+                        k: int = 100, seed: int = 0) -> Dict:
+    """
+    Compare similarity rankings computed on the quantized matrix against
+    float32 for `n_queries` random vocabulary words: recall of the float32
+    top-`k`, and the absolute error of the similarity values.
+    """
+    exact, _ = load_matrix(store_dir, 'float32')
+    quantized, scales = load_matrix(store_dir, dtype)
+    rng = np.random.default_rng(seed)
+    rows = rng.choice(len(exact), size=min(n_queries, len(exact)), replace=False)
+
+    recalls, errors = [], []
+    for row in rows:
+        query = np.asarray(exact[row], dtype=np.float32)
+        exact_scores = exact @ query
+        approx_scores = score_rows(quantized, scales, query)
+        kk = min(k, len(exact_scores))
+        exact_top = np.argpartition(-exact_scores, kk - 1)[:kk]
+        approx_top = np.argpartition(-approx_scores, kk - 1)[:kk]
+        recalls.append(len(np.intersect1d(exact_top, approx_top)) / kk)
+        errors.append(np.abs(exact_scores[exact_top] - approx_scores[exact_top]))
+
+    errors = np.concatenate(errors)
+    quantized_bytes = quantized.nbytes + (scales.nbytes if scales is not None else 0)
+    return {
+        'dtype': dtype,
+        'queries': len(rows),
+        'k': k,
+        'recall_at_k': float(np.mean(recalls)),
+        'mean_abs_error': float(errors.mean()),
+        'max_abs_error': float(errors.max()),
+        'bytes': int(quantized_bytes),
+        'compression': float(exact.nbytes / quantized_bytes),
+    }
+
+
+def score_rows(matrix: np.ndarray, scales: Optional[np.ndarray], query: np.ndarray,
+               block: int = BLOCK_ROWS) -> np.ndarray:
+    """
+    Dot product of every row of a (possibly quantized) matrix with a float32
+    `query` vector, or with each row of a (n_queries, dim) `query` matrix,
+    giving one row of scores per query. Quantized rows are widened block by
+    block, so the full matrix is never decoded at once.
+    """
+    if matrix.dtype == np.float32:
+        return query @ matrix.T
+    out = np.empty(query.shape[:-1] + (len(matrix),), dtype=np.float32)
+    for start in range(0, len(matrix), block):
+        out[..., start:start + block] = query @ matrix[start:start + block].astype(np.float32).T
+    if scales is not None:
+        out *= scales
+    return out
+
+
+def load_vocab(store_dir: str) -> List[str]:
+    """Read the store's vocabulary, in row order."""
+    with open(Path(store_dir) / VOCAB_FILE, 'r', encoding='utf-8') as f:
+        vocab = f.read().split('\n')
+    if vocab and vocab[-1] == '':
+        vocab.pop()
+    return vocab
+
+
+def _normalise_rows(matrix: np.ndarray, n_rows: int, block: int = BLOCK_ROWS) -> None:
+    """L2-normalise the first `n_rows` rows of `matrix` in place, block by block."""
+    for start in range(0, n_rows, block):
+        chunk = matrix[start:min(start + block, n_rows)]
+        norms = np.linalg.norm(chunk, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        chunk /= norms
+
+
+def _quantized_file(dtype: str) -> str:
+    return f"vectors.{dtype}.npy"
+
+
+def _remove_derived(path: Path) -> None:
+    """Drop files derived from a previous vectors.npy."""
+    for name in [_quantized_file(d) for d in DTYPES[1:]] + [SCALES_FILE]:
+        if (path / name).exists():
+            (path / name).unlink()
+
+
+def _write_vocab_and_meta(path: Path, words: List[str], dim: int) -> None:
+    data = ('\n'.join(words) + '\n').encode('utf-8')
+    with atomic_path(path / VOCAB_FILE) as tmp_vocab:
+        with open(tmp_vocab, 'wb') as f:
+            f.write(data)
+
+    meta = {
+        'vocab_size': len(words),
+        'dim': int(dim),
+        'fingerprint': hashlib.sha1(data).hexdigest(),
+    }
+    with atomic_path(path / META_FILE) as tmp_meta:
+        with open(tmp_meta, 'w', encoding='utf-8') as f:
+            json.dump(meta, f, indent=2)
+
+
+if __name__ == '__main__':
+    if len(sys.argv) == 4 and sys.argv[1] == 'convert':
+        convert_word2vec(sys.argv[2], sys.argv[3])
+    elif len(sys.argv) == 4 and sys.argv[1] == 'report':
+        print(json.dumps(quantization_report(sys.argv[2], sys.argv[3]), indent=2))
+    else:
+        print("Usage: python -m services.embedding_store convert <model.vec> <store_dir>\n"
+              "       python -m services.embedding_store report <store_dir> <float16|int8>")
+        sys.exit(1)
@@ -1,31 +1,54 @@
 # file location: backend/services/game_service.py
 
+import datetime
 import json
+import os
+import uuid
 from pathlib import Path
 from loguru import logger
 import random
-from typing import Dict, List
+from typing import Dict, List, Optional
+
+from services.puzzle_pack import PuzzlePack
+from services.state_store import DEFAULT_SESSION, SessionExpired, StateStore, create_state_store
+from services.work_pool import DeadlineExceeded, commit_point
 
 class GameService:
-    def __init__(self, word_service):
-        self.data_file = Path('data/game_state.json')
+    def __init__(self, word_service, state_store: Optional[StateStore] = None):
         self.words_file = Path('data/word_list.json')
         self.word_service = word_service
-        self._ensure_data_file()
+        self.state_store = state_store or create_state_store()
+        self._words = None
+        # Precomputed neighbours and joker buckets, see services/puzzle_pack.py
+        self._puzzles = PuzzlePack.load(os.getenv('PUZZLE_PACK_DIR', 'data/puzzles'))
+        self._puzzles_checked = False
 
-    def _ensure_data_file(self):
-        """Initialize game state file if it doesn't exist."""
-        if not self.data_file.exists():
-            self.data_file.parent.mkdir(exist_ok=True)
-            self._save_state(self._create_initial_state())
+    @property
+    def puzzles(self) -> Optional[PuzzlePack]:
+        """
+        The puzzle pack, once the model is loaded and the pack is known to be
+        built against the same store; None before then or if it is not.
+        """
+        if not self._puzzles_checked:
+            if self._puzzles is None or not self.word_service.is_ready():
+                return None
+            fingerprint = self.word_service.store_fingerprint()
+            if self._puzzles.fingerprint != fingerprint:
+                logger.warning(f"Ignoring the puzzle pack: built for store {self._puzzles.fingerprint}, "
+                               f"serving store {fingerprint}; rebuild it")
+                self._puzzles = None
+            self._puzzles_checked = True
+        return self._puzzles
 
-    def _create_initial_state(self) -> Dict:
+    def _create_initial_state(self, target_word: Optional[str] = None) -> Dict:
         """Create a new game state with default values from config."""
         from config.game_config import GAME_CONFIG, CURRENT_DIFFICULTY
         difficulty_config = GAME_CONFIG["difficulty"][CURRENT_DIFFICULTY]
         
         return {
-            'target_word': self._get_random_word(),
+            # Identifies this game: versions only order the writes within one
+            'game_id': uuid.uuid4().hex[:12],
+            'target_word': target_word or self._get_random_word(),
             'attempts': [],
             'word_found': False,
             'similar_words': [],
@@ -41,21 +64,28 @@ class GameService:
             }
         }
 
-    def reset_game(self) -> Dict:
-        """Reset the game with a new random word and fresh jokers."""
+    def reset_game(self, daily: bool = False, session_id: str = DEFAULT_SESSION) -> Dict:
+        """
+        Reset the game with a new random word and fresh jokers.
+        With `daily`, use today's scheduled puzzle when the pack has one.
+        """
         try:
-            new_state = self._create_initial_state()
-            self._save_state(new_state)
+            target_word = None
+            if daily and self.puzzles is not None:
+                target_word = self.puzzles.scheduled(datetime.date.today())
+            new_state = self._create_initial_state(target_word)
+            new_state['version'] = self.state_store.save(session_id, new_state)
+            # Rank the whole vocabulary against the new target once, up front
+            self.word_service.prepare_target(new_state['target_word'])
             return new_state
         except Exception:
             logger.exception("Error resetting game")
             raise
 
-    def use_joker(self, joker_type: str) -> Dict:
+    def use_joker(self, joker_type: str, session_id: str = DEFAULT_SESSION) -> Dict:
         """Use a joker to get words within a specific similarity range."""
         try:
-            logger.info(f"Using joker of type: {joker_type}")
-            state = self._load_state()
+            state = self._load_state(session_id)
 
             # Validate joker type and availability
             if joker_type not in ['high_similarity', 'medium_similarity']:
@@ -68,47 +98,46 @@ class GameService:
                 raise ValueError("No jokers remaining of this type")
                 
             # Similarity range
-            sim_range = {
-                'high_similarity': (0.7, 0.8),
-                'medium_similarity': (0.6, 0.7)
-            }[joker_type]
+            from config.game_config import GAME_CONFIG
+            bounds = GAME_CONFIG["jokers"]["similarity_ranges"][joker_type.replace('_similarity', '')]
+            sim_range = (bounds['min'], bounds['max'])
 
             target = state['target_word']
-            logger.info(f"Target word: {target}, range: {sim_range}")
             
-            # Get words in range
-            similar_words = self.word_service.get_words_in_range(
-                target,
-                sim_range[0],
-                sim_range[1],
-                n=joker['words_per_use']
-            )
+            # Get words in range, from the puzzle pack when the target was precomputed
+            similar_words = None
+            if self.puzzles is not None and self.puzzles.has(target):
+                similar_words = self.puzzles.bucket_words(target, joker_type, joker['words_per_use'])
+            if similar_words is None:
+                similar_words = self.word_service.get_words_in_range(
+                    target,
+                    sim_range[0],
+                    sim_range[1],
+                    n=joker['words_per_use']
+                )
             
-            # Log the results
-            logger.info(f"Found {len(similar_words)} words using joker:")
-            for w in similar_words:
-                logger.info(f"- {w['word']} (similarity: {w['similarity']:.3f})")
-
-            # Update joker count
+            # Update joker count, unless the caller stopped waiting for this one
+            commit_point()
             joker['remaining'] -= 1
-            self._save_state(state)
-            
-            logger.info(f"Remaining {joker_type} jokers: {joker['remaining']}")
+            self._write(session_id, state, self.state_store.update, {'jokers': state['jokers']})
             
             return {'joker_words': similar_words, 'jokers': state['jokers']}
 
+        except DeadlineExceeded:
+            raise
         except Exception:
             logger.exception("Error using joker")
             raise
     
-    def get_center_word_power(self, chosen_words: List[str]) -> Dict[str, float]:
+    def get_center_word_power(self, chosen_words: List[str],
+                              session_id: str = DEFAULT_SESSION) -> Dict[str, float]:
         """
         Compute and return the “center word” based on the user’s chosen words
         and the current target word. 
         """
         try:
             # Load current state to get the target word
-            state = self._load_state()
+            state = self._load_state(session_id)
             target_word = state['target_word']
 
             result = self.word_service.get_center_word(chosen_words, target_word)
@@ -116,79 +145,130 @@ class GameService:
                 logger.warning("Center word power returned no result.")
                 return {}
             
-            logger.info(f"Center word found: {result['word']} (sim={result['similarity']:.3f})")
+            logger.debug(f"Center word found: {result['word']} (sim={result['similarity']:.3f})")
             return result
 
         except Exception:
             logger.exception("Error computing center word power")
             return {}
 
+    def get_midpoint_word_power(self, chosen_word: str,
+                                session_id: str = DEFAULT_SESSION) -> Dict[str, float]:
+        """Return the word halfway between the user's chosen word and the current target word."""
+        try:
+            state = self._load_state(session_id)
+            result = self.word_service.midpoint(chosen_word, state['target_word'], k=1)
+            if not result:
+                logger.warning("Midpoint word power returned no result.")
+                return {}
+            return result[0]
+
+        except Exception:
+            logger.exception("Error computing midpoint word power")
+            return {}
+
     def _get_random_word(self) -> str:
-        """Get a random word from the game's word list."""
+        """Get a random word from the puzzle pack, or else the game's word list."""
         try:
-            with open(self.words_file, 'r', encoding='utf-8') as f:
-                words_data = json.load(f)
-                return random.choice(words_data['words'])
+            if self.puzzles is not None and self.puzzles.targets:
+                return random.choice(self.puzzles.targets)
+            if self._words is None:
+                with open(self.words_file, 'r', encoding='utf-8') as f:
+                    self._words = json.load(f)['words']
+            return random.choice(self._words)
         except Exception:
             logger.exception("Error loading word list")
             return "mathématiques"  # fallback word
 
-    def save_attempt(self, word: str, similarity: float) -> Dict:
+    def save_attempt(self, word: str, similarity: float, rank: Optional[int] = None,
+                     session_id: str = DEFAULT_SESSION) -> Dict:
         """Save a word attempt and update game state."""
+        attempt = {'word': word, 'similarity': similarity}
+        if rank is not None:
+            attempt['rank'] = rank
+        return self.save_attempts([attempt], session_id=session_id)
+
+    def save_attempts(self, attempts: List[Dict], session_id: str = DEFAULT_SESSION) -> Dict:
+        """
+        Save several scored attempts ({'word', 'similarity'[, 'rank']}) in a
+        single state write and update game state.
+        """
         try:
-            if not word or similarity <= 0:
-                return self._load_state()
-                
-            state = self._load_state()
-            state['attempts'].append({'word': word, 'similarity': similarity})
-            
+            attempts = [a for a in attempts if a['word'] and a['similarity'] > 0]
+            state = self._load_state(session_id)
+            if not attempts:
+                return state
+
             # Check if word is found (similarity > 0.99)
-            if similarity > 0.99:
+            found = any(a['similarity'] > 0.99 for a in attempts) and not state['word_found']
+            if found:
+                # Get similar words when the target is found, before writing anything
+                target = state['target_word']
+                if self.puzzles is not None and self.puzzles.has(target):
+                    similar_words = self.puzzles.top(target, 100)
+                else:
+                    similar_words = self.word_service.get_most_similar_words(
+                        target, n=100
+                    )
+
+            # Skip the writes if the caller stopped waiting, so its retry isn't recorded twice
+            commit_point()
+            state['attempts'].extend(attempts)
+            state['version'] = self._write(session_id, state, self.state_store.append_attempts, attempts)
+
+            if found:
                 state['word_found'] = True
-                # Get similar words when the target is found
-                state['similar_words'] = self.word_service.get_most_similar_words(
-                    state['target_word'], n=100
-                )
+                state['similar_words'] = similar_words
+                state['version'] = self._write(session_id, state, self.state_store.update, {
+                    'word_found': True,
+                    'similar_words': state['similar_words']
+                })
                 
-            self._save_state(state)
             return state
+        except DeadlineExceeded:
+            raise
         except Exception:
-            logger.exception("Error saving attempt")
+            logger.exception("Error saving attempts")
             raise
 
-    def _save_state(self, state: Dict) -> None:
-        """Save game state to file."""
+    def _write(self, session_id: str, state: Dict, write, change) -> int:
+        """
+        Apply `write(session_id, change)`, a partial write of a change already
+        made to `state`. If the session expired since `state` was loaded, save
+        `state` whole instead, re-creating the session. Returns the new version.
+        """
         try:
-            self.data_file.parent.mkdir(exist_ok=True)
-            with open(self.data_file, 'w', encoding='utf-8') as f:
-                json.dump(state, f, ensure_ascii=False, indent=2)
-        except Exception:
-            logger.exception("Error saving game state")
-            raise
+            return write(session_id, change)
+        except SessionExpired:
+            logger.info(f"Session {session_id} expired during a write, saving its game again")
+            return self.state_store.save(session_id, state)
 
-    def _load_state(self) -> Dict:
-        """Load game state from file."""
+    def _load_state(self, session_id: str) -> Dict:
+        """Load a session's game state, starting a new game for unknown sessions."""
         try:
-            if not self.data_file.exists():
-                self._ensure_data_file()
-            with open(self.data_file, 'r', encoding='utf-8') as f:
-                return json.load(f)
+            state = self.state_store.load(session_id)
+            if state is None:
+                state = self._create_initial_state()
+                state['version'] = self.state_store.save(session_id, state)
+                # A first visit starts a game here, not in reset_game: rank it up front too
+                self.word_service.prepare_target(state['target_word'])
+            return state
         except Exception:
             logger.exception("Error loading game state")
             raise
 
-    def get_state(self) -> Dict:
+    def get_state(self, session_id: str = DEFAULT_SESSION) -> Dict:
         """Get current game state."""
         try:
-            return self._load_state()
+            return self._load_state(session_id)
         except Exception:
             logger.exception("Error getting game state")
             raise
 
-    def get_history(self) -> List[Dict]:
+    def get_history(self, session_id: str = DEFAULT_SESSION) -> List[Dict]:
         """Get history of attempts."""
         try:
-            state = self._load_state()
+            state = self._load_state(session_id)
             return state['attempts']
         except Exception:
             logger.exception("Error getting history")
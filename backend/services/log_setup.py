@@ -0,0 +1,66 @@
+# file location: backend/services/log_setup.py
+"""
+Logging configuration and compact per-request events.
+
+configure_logging() installs the loguru sinks with enqueue=True: a request
+only puts the record on a queue, and a background thread formats and
+writes it. Tracebacks are logged without variable values (diagnose=False),
+which are slow to render and may hold player data.
+
+event() logs one 'name key=value ...' line whose fields are bounded:
+strings are cut to MAX_FIELD_CHARS and lists to their first MAX_FIELD_ITEMS
+items plus a count, so no request can log a whole game state. Events of
+high-volume routes pass sampled=True and only LOG_SAMPLE_RATE of them are
+written.
+
+    LOG_LEVEL        minimum level (default INFO)
+    LOG_SAMPLE_RATE  share of sampled events written (default 0.05)
+"""
+
+import os
+import random
+import sys
+from typing import Optional
+
+from loguru import logger
+
+MAX_FIELD_CHARS = 80
+MAX_FIELD_ITEMS = 5
+LOG_FORMAT = "{time:YYYY-MM-DD HH:mm:ss.SSS} | {level: <7} | {name}:{line} | {message}"
+
+_sample_rate = float(os.getenv('LOG_SAMPLE_RATE', '0.05'))
+
+
+def configure_logging(log_file: Optional[str] = None) -> None:
+    """Log to stdout, and to `log_file` if given, through non-blocking sinks."""
+    level = os.getenv('LOG_LEVEL', 'INFO')
+    logger.remove()
+    logger.add(sys.stdout, level=level, format=LOG_FORMAT, enqueue=True,
+               backtrace=False, diagnose=False)
+    if log_file:
+        logger.add(log_file, level=level, format=LOG_FORMAT, enqueue=True,
+                   backtrace=False, diagnose=False, rotation="500 MB", retention=3)
+
+
+def event(name: str, sampled: bool = False, level: str = 'INFO', **fields) -> None:
+    """Log a compact event; with `sampled`, only LOG_SAMPLE_RATE of the calls are written."""
+    if sampled and random.random() >= _sample_rate:
+        return
+    text = ' '.join(f"{key}={_bounded(value)}" for key, value in fields.items())
+    # depth=1 reports the caller's module and line, not this function's
+    logger.opt(depth=1).log(level, f"{name} {text}" if text else name)
+
+
+def _bounded(value) -> str:
+    if isinstance(value, float):
+        return f"{value:.4g}"
+    if isinstance(value, (list, tuple)):
+        items = ','.join(_bounded(v) for v in value[:MAX_FIELD_ITEMS])
+        more = f",+{len(value) - MAX_FIELD_ITEMS}" if len(value) > MAX_FIELD_ITEMS else ''
+        return f"[{items}{more}]"
+    if isinstance(value, dict):
+        return _bounded([f"{k}:{_bounded(v)}" for k, v in value.items()])
+    text = str(value)
+    if len(text) > MAX_FIELD_CHARS:
+        text = text[:MAX_FIELD_CHARS] + '…'
+    return repr(text) if (' ' in text or '=' in text or not text) else text
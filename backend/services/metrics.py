@@ -0,0 +1,168 @@
+# file location: backend/services/metrics.py
+"""
+Request and stage timing, exposed in the Prometheus text format.
+
+`timed(stage)` (a context manager and a decorator) measures one stage of
+the work: model load, state I/O, similarity, range scans, layouts, calls
+to the model API... Each measure is recorded in the
+semantix_stage_seconds histogram, labelled with the stage and the route
+being served ('background' outside a request), and added to the current
+request's Server-Timing header.
+
+`init_app(app)` times every request into semantix_request_seconds, sets
+the Server-Timing header and serves the registry at /metrics. Metrics are
+per process: with several workers, each one is scraped on its own.
+"""
+
+import contextvars
+import math
+import threading
+import time
+from contextlib import ContextDecorator
+from typing import Dict, List, Optional, Sequence, Tuple
+
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                   1.0, 2.5, 5.0, 10.0, 30.0, 120.0, math.inf)
+
+# Route being served, and the stage timings collected for its Server-Timing header
+_endpoint = contextvars.ContextVar('endpoint', default='background')
+_timings: contextvars.ContextVar[Optional[List[Tuple[str, float]]]] = \
+    contextvars.ContextVar('timings', default=None)
+
+
+class Histogram:
+    def __init__(self, name: str, documentation: str, label_names: Sequence[str],
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(buckets)
+        # label values -> [bucket counts..., sum]
+        self._series: Dict[Tuple[str, ...], List[float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels) -> None:
+        key = tuple(str(labels.get(name, '')) for name in self.label_names)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * len(self.buckets) + [0.0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-1] += value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = {key: list(values) for key, values in self._series.items()}
+        for key, values in sorted(series.items()):
+            labels = ','.join(f'{n}="{_escape(v)}"' for n, v in zip(self.label_names, key))
+            prefix = f"{labels}," if labels else ''
+            for bound, count in zip(self.buckets, values):
+                le = '+Inf' if bound == math.inf else repr(bound)
+                lines.append(f'{self.name}_bucket{{{prefix}le="{le}"}} {count}')
+            suffix = f"{{{labels}}}" if labels else ''
+            lines.append(f"{self.name}_sum{suffix} {values[-1]}")
+            lines.append(f"{self.name}_count{suffix} {values[len(self.buckets) - 1]}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, Histogram] = {}
+        self._lock = threading.Lock()
+
+    def histogram(self, name: str, documentation: str, label_names: Sequence[str],
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        """Return the histogram called `name`, creating it on first use."""
+        with self._lock:
+            if name not in self._metrics:
+                self._metrics[name] = Histogram(name, documentation, label_names, buckets)
+            return self._metrics[name]
+
+    def render(self) -> str:
+        lines = []
+        for metric in list(self._metrics.values()):
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+STAGE_SECONDS = REGISTRY.histogram(
+    'semantix_stage_seconds', 'Time spent in one stage of the work', ('stage', 'endpoint'))
+REQUEST_SECONDS = REGISTRY.histogram(
+    'semantix_request_seconds', 'Time spent serving a request', ('endpoint', 'method', 'status'))
+
+
+class timed(ContextDecorator):
+    """Time a block or function as `stage` of the current request."""
+
+    def __init__(self, stage: str):
+        self.stage = stage
+        self._starts = threading.local()
+
+    def __enter__(self):
+        self._starts.__dict__.setdefault('stack', []).append(time.perf_counter())
+        return self
+
+    def __exit__(self, *exc):
+        record(self.stage, time.perf_counter() - self._starts.stack.pop())
+        return False
+
+
+def record(stage: str, seconds: float) -> None:
+    """Record a stage measured elsewhere."""
+    STAGE_SECONDS.observe(seconds, stage=stage, endpoint=_endpoint.get())
+    timings = _timings.get()
+    if timings is not None:
+        timings.append((stage, seconds))
+
+
+def server_timing(timings: List[Tuple[str, float]], total: float) -> str:
+    """Server-Timing header value, stages summed by name, in ms."""
+    totals: Dict[str, float] = {}
+    for stage, seconds in timings:
+        totals[stage] = totals.get(stage, 0.0) + seconds
+    entries = [f"{stage};dur={seconds * 1000:.2f}" for stage, seconds in totals.items()]
+    entries.append(f"total;dur={total * 1000:.2f}")
+    return ', '.join(entries)
+
+
+def init_app(app) -> None:
+    """Time every request of the Flask `app` and serve the metrics at /metrics."""
+    from flask import Response, g, request
+
+    @app.before_request
+    def start_timing():
+        g.metrics_start = time.perf_counter()
+        g.metrics_tokens = (
+            _endpoint.set(request.url_rule.rule if request.url_rule else 'unmatched'),
+            _timings.set([]),
+        )
+
+    @app.after_request
+    def finish_timing(response):
+        start = g.pop('metrics_start', None)
+        if start is None:
+            return response
+        total = time.perf_counter() - start
+        REQUEST_SECONDS.observe(total, endpoint=_endpoint.get(), method=request.method,
+                                status=response.status_code)
+        response.headers['Server-Timing'] = server_timing(_timings.get() or [], total)
+        return response
+
+    @app.teardown_request
+    def reset_timing(exc=None):
+        tokens = g.pop('metrics_tokens', None)
+        if tokens is not None:
+            _endpoint.reset(tokens[0])
+            _timings.reset(tokens[1])
+
+    @app.route('/metrics', methods=['GET'])
+    def metrics():
+        return Response(REGISTRY.render(), mimetype='text/plain; version=0.0.4')
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
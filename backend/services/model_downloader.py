@@ -1,29 +1,198 @@
+# file location: backend/services/model_downloader.py
+"""
+Download manager for the model file.
+
+The file is fetched into `<model_path>.part` in parallel HTTP Range segments
+(one connection each, large buffered writes), with the bytes completed per
+segment saved to `<model_path>.part.json` so an interrupted download resumes
+where it stopped. Once complete it is checked against the expected SHA-256,
+if one is given, and atomically renamed to `model_path`. A server without
+Range support gets a single streamed connection that restarts from zero.
+
+A verified digest is recorded in `<model_path>.sha256`, so later starts find
+the cached file without downloading or re-hashing it.
+
+    MODEL_DOWNLOAD_SEGMENTS  parallel segments (default 4)
+"""
+
+import hashlib
+import json
 import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable, List, Optional
+
 import requests
+from requests.adapters import HTTPAdapter
 from loguru import logger
-from pathlib import Path
 
-def download_model(url: str, model_path: str):
-    """Download the model file if it doesn't exist."""
-    if os.path.exists(model_path):
+CHUNK_SIZE = 1024 * 1024
+# Minimum segment size; smaller files are fetched over fewer connections
+MIN_SEGMENT_SIZE = 8 * 1024 * 1024
+# How often (in bytes written) the resume state is saved
+STATE_SAVE_INTERVAL = 16 * 1024 * 1024
+
+
+class DownloadError(Exception):
+    """The model could not be downloaded or failed verification."""
+
+
+def download_model(url: str, model_path: str, sha256: Optional[str] = None,
+                   segments: Optional[int] = None,
+                   progress: Optional[Callable[[int, int], None]] = None,
+                   timeout: tuple = (10, 60)) -> str:
+    """
+    Download `url` to `model_path` unless a verified copy is already there.
+    `progress`, if given, is called with (bytes done, total bytes; 0 if
+    unknown). Returns `model_path`.
+    """
+    path = Path(model_path)
+    sha256 = sha256.lower() if sha256 else None
+    if path.exists() and _is_verified(path, sha256):
         logger.info(f"Model file already exists at {model_path}")
-        return
+        return model_path
+
+    segments = segments or int(os.getenv('MODEL_DOWNLOAD_SEGMENTS', '4'))
+    path.parent.mkdir(parents=True, exist_ok=True)
+    part_file = path.with_name(path.name + '.part')
+    state_file = path.with_name(path.name + '.part.json')
 
-    logger.info(f"Downloading model from {url}")
-    os.makedirs(os.path.dirname(model_path), exist_ok=True)
-    
     try:
-        response = requests.get(url, stream=True)
-        response.raise_for_status()
-        
-        total_size = int(response.headers.get('content-length', 0))
-        block_size = 1024  # 1 KB
-
-        with open(model_path, 'wb') as f:
-            for data in response.iter_content(block_size):
-                f.write(data)
-                
-        logger.info(f"Model downloaded successfully to {model_path}")
-    except Exception as e:
+        with requests.Session() as session:
+            session.mount('http://', HTTPAdapter(pool_maxsize=segments))
+            session.mount('https://', HTTPAdapter(pool_maxsize=segments))
+            total, ranges = _probe(session, url, timeout)
+            if ranges and total:
+                logger.info(f"Downloading model from {url} ({total} bytes)")
+                _download_segments(session, url, total, segments, part_file, state_file,
+                                   progress, timeout)
+            else:
+                logger.info(f"Downloading model from {url} (no range support)")
+                _download_stream(session, url, total, part_file, progress, timeout)
+    except requests.RequestException as e:
         logger.error(f"Error downloading model: {str(e)}")
-        raise
\ No newline at end of file
+        raise DownloadError(f"Error downloading model from {url}: {e}") from e
+
+    digest = file_sha256(part_file)
+    if sha256 and digest != sha256:
+        part_file.unlink()
+        state_file.unlink(missing_ok=True)
+        raise DownloadError(f"Checksum mismatch for {url}: expected {sha256}, got {digest}")
+
+    os.replace(part_file, path)
+    state_file.unlink(missing_ok=True)
+    path.with_name(path.name + '.sha256').write_text(digest)
+    logger.info(f"Model downloaded successfully to {model_path} (sha256 {digest})")
+    return model_path
+
+
+def file_sha256(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(CHUNK_SIZE), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _is_verified(path: Path, sha256: Optional[str]) -> bool:
+    """An existing file is trusted unless a checksum is expected and its recorded one differs."""
+    if sha256 is None:
+        return True
+    recorded = path.with_name(path.name + '.sha256')
+    digest = recorded.read_text().strip() if recorded.exists() else file_sha256(path)
+    if digest == sha256:
+        return True
+    logger.warning(f"Cached model {path} does not match the expected checksum, downloading again")
+    return False
+
+
+def _probe(session: requests.Session, url: str, timeout: tuple):
+    """Return (size in bytes or 0, whether the server honours Range requests)."""
+    response = session.head(url, allow_redirects=True, timeout=timeout)
+    response.raise_for_status()
+    total = int(response.headers.get('Content-Length', 0))
+    ranges = response.headers.get('Accept-Ranges', '').lower() == 'bytes'
+    return total, ranges
+
+
+def _plan(total: int, segments: int) -> List[List[int]]:
+    """Split [0, total) into [start, end, done] segments."""
+    count = max(1, min(segments, total // MIN_SEGMENT_SIZE))
+    bounds = [total * i // count for i in range(count + 1)]
+    return [[bounds[i], bounds[i + 1], 0] for i in range(count)]
+
+
+def _download_segments(session: requests.Session, url: str, total: int, segments: int,
+                       part_file: Path, state_file: Path,
+                       progress: Optional[Callable[[int, int], None]], timeout: tuple) -> None:
+    state = None
+    if part_file.exists() and state_file.exists():
+        with open(state_file, 'r', encoding='utf-8') as f:
+            state = json.load(f)
+        if state.get('url') != url or state.get('size') != total:
+            state = None
+    if state is None:
+        state = {'url': url, 'size': total, 'segments': _plan(total, segments)}
+        with open(part_file, 'wb') as f:
+            f.truncate(total)
+    else:
+        done = sum(s[2] for s in state['segments'])
+        logger.info(f"Resuming model download at {done}/{total} bytes")
+
+    lock = threading.Lock()
+    unsaved = [0]
+
+    def save_state() -> None:
+        tmp_file = state_file.with_name(state_file.name + '.tmp')
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump(state, f)
+        os.replace(tmp_file, state_file)
+
+    def fetch(segment: List[int]) -> None:
+        start, end, done = segment
+        if start + done >= end:
+            return
+        headers = {'Range': f"bytes={start + done}-{end - 1}"}
+        with session.get(url, headers=headers, stream=True, timeout=timeout) as response:
+            response.raise_for_status()
+            if response.status_code != 206:
+                raise DownloadError(f"{url} ignored the Range header")
+            with open(part_file, 'r+b', buffering=CHUNK_SIZE) as f:
+                f.seek(start + done)
+                for chunk in response.iter_content(CHUNK_SIZE):
+                    f.write(chunk)
+                    # Bytes counted as done must reach the file before the state records them
+                    f.flush()
+                    with lock:
+                        segment[2] += len(chunk)
+                        unsaved[0] += len(chunk)
+                        if unsaved[0] >= STATE_SAVE_INTERVAL:
+                            save_state()
+                            unsaved[0] = 0
+                        if progress is not None:
+                            progress(sum(s[2] for s in state['segments']), total)
+
+    save_state()
+    try:
+        with ThreadPoolExecutor(max_workers=len(state['segments'])) as executor:
+            list(executor.map(fetch, state['segments']))
+    finally:
+        with lock:
+            save_state()
+
+    if sum(s[2] for s in state['segments']) != total:
+        raise DownloadError(f"Incomplete download of {url}")
+
+
+def _download_stream(session: requests.Session, url: str, total: int, part_file: Path,
+                     progress: Optional[Callable[[int, int], None]], timeout: tuple) -> None:
+    with session.get(url, stream=True, timeout=timeout) as response:
+        response.raise_for_status()
+        done = 0
+        with open(part_file, 'wb', buffering=CHUNK_SIZE) as f:
+            for chunk in response.iter_content(CHUNK_SIZE):
+                f.write(chunk)
+                done += len(chunk)
+                if progress is not None:
+                    progress(done, total)
@@ -0,0 +1,73 @@
+# file location: backend/services/projection.py
+"""
+3D projection engines for the visualization.
+
+Every engine takes the (n, dim) L2-normalised embeddings of a game, the
+target first, plus each row's cosine similarity to the target, and returns
+(n, 3) coordinates with the target at the origin.
+
+    pca    exact PCA through an SVD of the centred points
+    polar  target-centric: distance to the origin is 1 - similarity, the
+           direction comes from PCA of the part orthogonal to the target
+    umap   UMAP with a cosine metric (umap-learn, imported on first use)
+
+PCA and polar are deterministic and take microseconds for the few dozen
+points a game produces; UMAP pays a numba JIT on its first call.
+"""
+
+from typing import Callable, Dict
+
+import numpy as np
+
+
+def pca_project(embeddings: np.ndarray, similarities: np.ndarray) -> np.ndarray:
+    centred = embeddings - embeddings.mean(axis=0)
+    coords = _principal_coordinates(centred)
+    return coords - coords[0]
+
+
+def polar_project(embeddings: np.ndarray, similarities: np.ndarray) -> np.ndarray:
+    target = embeddings[0]
+    # Keep only what each guess does not share with the target
+    residuals = embeddings - np.outer(embeddings @ target, target)
+    directions = _principal_coordinates(residuals)
+    norms = np.linalg.norm(directions, axis=1, keepdims=True)
+    # A guess with no spread to project on gets a fixed axis
+    directions = np.where(norms > 1e-9, directions / np.maximum(norms, 1e-9), [1.0, 0.0, 0.0])
+    radius = 1.0 - np.clip(similarities, -1.0, 1.0)
+    coords = directions * radius[:, None]
+    coords[0] = 0.0
+    return coords
+
+
+def umap_project(embeddings: np.ndarray, similarities: np.ndarray) -> np.ndarray:
+    import umap  # pip install umap-learn
+
+    reducer = umap.UMAP(
+        n_components=3,
+        n_neighbors=min(5, len(embeddings) - 1),
+        min_dist=0.1,
+        metric='cosine',
+        random_state=42
+    )
+    coords = reducer.fit_transform(embeddings)
+    return coords - coords[0]
+
+
+ENGINES: Dict[str, Callable[[np.ndarray, np.ndarray], np.ndarray]] = {
+    'pca': pca_project,
+    'polar': polar_project,
+    'umap': umap_project,
+}
+
+
+def _principal_coordinates(centred: np.ndarray) -> np.ndarray:
+    """Coordinates of the rows on their first three principal axes, zero-padded."""
+    u, s, vt = np.linalg.svd(centred, full_matrices=False)
+    k = min(3, len(s))
+    # Fix each axis' sign so the same points always give the same layout
+    signs = np.sign(vt[:k][np.arange(k), np.argmax(np.abs(vt[:k]), axis=1)])
+    signs[signs == 0] = 1.0
+    coords = np.zeros((len(centred), 3))
+    coords[:, :k] = u[:, :k] * s[:k] * signs
+    return coords
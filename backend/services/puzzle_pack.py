@@ -0,0 +1,245 @@
+# file location: backend/services/puzzle_pack.py
+"""
+Precomputed puzzle pack for the target words in data/word_list.json.
+
+Built offline, the pack holds for every in-vocabulary target its closest
+neighbours (best first, with similarities) and the slice of those neighbours
+falling in each joker similarity range, so jokers and the win screen are
+lookups instead of scans. Building it also saves every target's similarity
+ranking next to the store (see WordEmbeddingService.prepare_target), so a
+reset loads the ranking instead of scanning and sorting the vocabulary;
+build with the server's EMBEDDING_STORE_DIR and EMBEDDING_DTYPE. Upcoming
+daily puzzles can be scheduled in the pack ahead of time.
+
+A joker range reaching past the last packed neighbour is left out of the
+target's buckets, so that joker is drawn from the full ranking instead of
+a truncated slice. The pack records the store's vocabulary fingerprint and
+is ignored when served with another store.
+
+    data/puzzles/index.json               targets, joker buckets and schedule
+    data/puzzles/words.<build>.txt        neighbour words referenced by the pack
+    data/puzzles/neighbours.<build>.npy   (n_targets, n_neighbours) int32 rows of words
+    data/puzzles/similarities.<build>.npy (n_targets, n_neighbours) float32
+
+Each build writes its arrays under new names and then swaps in the index
+naming them, so a rebuild that dies partway leaves the previous pack whole.
+
+Usage:
+    python -m services.puzzle_pack build data/word_list.json data/puzzles
+    python -m services.puzzle_pack schedule data/puzzles 30
+"""
+
+import datetime
+import json
+import random
+import sys
+import uuid
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+from loguru import logger
+
+from services.embedding_store import atomic_path
+
+INDEX_FILE = 'index.json'
+WORDS_FILE = 'words.txt'
+NEIGHBOURS_FILE = 'neighbours.npy'
+SIMILARITIES_FILE = 'similarities.npy'
+
+
+def _pack_files(build: Optional[str]) -> Dict[str, str]:
+    """Data file names of the pack build `build`; None for packs written before builds were named."""
+    names = {'words': WORDS_FILE, 'neighbours': NEIGHBOURS_FILE, 'similarities': SIMILARITIES_FILE}
+    if build is None:
+        return names
+    return {key: f"{Path(name).stem}.{build}{Path(name).suffix}" for key, name in names.items()}
+
+
+class PuzzlePack:
+    def __init__(self, index: Dict, words: List[str], neighbours: np.ndarray,
+                 similarities: np.ndarray):
+        self.index = index
+        self.words = words
+        self.neighbours = neighbours
+        self.similarities = similarities
+        self.targets = list(index['targets'])
+
+    @property
+    def fingerprint(self) -> Optional[str]:
+        """Vocabulary fingerprint of the store the pack was built against."""
+        return self.index.get('fingerprint')
+
+    def has(self, target: str) -> bool:
+        return target in self.index['targets']
+
+    def top(self, target: str, n: int) -> List[Dict[str, float]]:
+        """The `n` closest words to `target`, best first."""
+        slot = self.index['targets'][target]['slot']
+        return [self._entry(slot, i) for i in range(min(n, self.neighbours.shape[1]))]
+
+    def bucket_words(self, target: str, bucket: str, n: int) -> Optional[List[Dict[str, float]]]:
+        """
+        Up to `n` words sampled from the neighbours of `target` in the joker
+        range `bucket`, best first. None if the pack has no such bucket.
+        """
+        info = self.index['targets'][target]
+        if bucket not in info['buckets']:
+            return None
+        start, end = info['buckets'][bucket]
+        picked = sorted(random.sample(range(start, end), min(n, end - start)))
+        return [self._entry(info['slot'], i) for i in picked]
+
+    def scheduled(self, day: datetime.date) -> Optional[str]:
+        """The target scheduled for `day`, if any."""
+        return self.index.get('schedule', {}).get(day.isoformat())
+
+    def _entry(self, slot: int, i: int) -> Dict[str, float]:
+        return {
+            'word': self.words[self.neighbours[slot, i]],
+            'similarity': float(self.similarities[slot, i]),
+        }
+
+    @classmethod
+    def load(cls, pack_dir: str) -> Optional['PuzzlePack']:
+        """Open the pack in `pack_dir`, or return None if it has not been built."""
+        path = Path(pack_dir)
+        if not (path / INDEX_FILE).exists():
+            return None
+        with open(path / INDEX_FILE, 'r', encoding='utf-8') as f:
+            index = json.load(f)
+        files = _pack_files(index.get('build'))
+        with open(path / files['words'], 'r', encoding='utf-8') as f:
+            words = f.read().split('\n')
+        neighbours = np.load(path / files['neighbours'], mmap_mode='r')
+        similarities = np.load(path / files['similarities'], mmap_mode='r')
+        logger.info(f"Loaded puzzle pack with {len(index['targets'])} targets from {pack_dir}")
+        return cls(index, words, neighbours, similarities)
+
+
+def build_pack(word_service, candidates: List[str], pack_dir: str,
+               n_neighbours: int = 1000) -> None:
+    """
+    Precompute neighbours and joker buckets for every in-vocabulary candidate,
+    and save each one's similarity ranking for resets to load.
+    """
+    from config.game_config import GAME_CONFIG
+    ranges = GAME_CONFIG["jokers"]["similarity_ranges"]
+
+    targets, rows, sims = [], [], []
+    word_slots: Dict[str, int] = {}
+    for candidate in dict.fromkeys(w.lower() for w in candidates):
+        if word_service.prepare_target(candidate) is None:
+            logger.warning(f"Skipping '{candidate}': not in the vocabulary")
+            continue
+        neighbours = word_service.get_most_similar_words(candidate, n=n_neighbours)
+        targets.append(candidate)
+        rows.append([word_slots.setdefault(n['word'], len(word_slots)) for n in neighbours])
+        sims.append([n['similarity'] for n in neighbours])
+    words = list(word_slots)
+
+    width = min(len(r) for r in rows) if rows else 0
+    neighbours_array = np.array([r[:width] for r in rows], dtype=np.int32).reshape(len(rows), width)
+    similarities_array = np.array([s[:width] for s in sims], dtype=np.float32).reshape(len(sims), width)
+
+    index = {'neighbours': width, 'ranges': ranges, 'targets': {}, 'schedule': {},
+             'fingerprint': word_service.store_fingerprint(), 'build': uuid.uuid4().hex[:8]}
+    truncated = 0
+    for slot, target in enumerate(targets):
+        # Similarities are sorted descending; negate them for searchsorted
+        keyed = -similarities_array[slot]
+        buckets = {}
+        for name, bounds in ranges.items():
+            start = int(np.searchsorted(keyed, -bounds['max'], side='left'))
+            end = int(np.searchsorted(keyed, -bounds['min'], side='right'))
+            if end >= width:
+                # The range may go on past the packed neighbours: leave it to the ranking
+                truncated += 1
+            elif end > start:
+                buckets[f"{name}_similarity"] = [start, end]
+        index['targets'][target] = {'slot': slot, 'buckets': buckets}
+
+    path = Path(pack_dir)
+    path.mkdir(parents=True, exist_ok=True)
+    if (path / INDEX_FILE).exists():
+        # Keep already scheduled days that still point at a packed target
+        with open(path / INDEX_FILE, 'r', encoding='utf-8') as f:
+            previous = json.load(f)
+        index['schedule'] = {day: word for day, word in previous.get('schedule', {}).items()
+                             if word in index['targets']}
+
+    # New data files first, then the index naming them: until the index is
+    # replaced, the previous build stays consistent and in use
+    files = _pack_files(index['build'])
+    with atomic_path(path / files['neighbours'], '.npy') as tmp_file:
+        np.save(tmp_file, neighbours_array)
+    with atomic_path(path / files['similarities'], '.npy') as tmp_file:
+        np.save(tmp_file, similarities_array)
+    with atomic_path(path / files['words']) as tmp_file:
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            f.write('\n'.join(words))
+    _write_index(path, index)
+    _remove_stale_files(path, files)
+    if truncated:
+        logger.warning(f"{truncated} joker ranges reach past the {width} packed neighbours "
+                       f"and will be served from the rankings; raise n_neighbours to pack them")
+    logger.info(f"Puzzle pack written to {pack_dir}: {len(targets)} targets, "
+                f"{width} neighbours each")
+
+
+def schedule_days(pack_dir: str, days: int, start: Optional[datetime.date] = None) -> Dict[str, str]:
+    """
+    Assign a target to each of the next `days` days that has none yet,
+    preferring targets that have not been scheduled before.
+    """
+    path = Path(pack_dir)
+    with open(path / INDEX_FILE, 'r', encoding='utf-8') as f:
+        index = json.load(f)
+    schedule = index.setdefault('schedule', {})
+    if not index['targets']:
+        return schedule
+    start = start or datetime.date.today() + datetime.timedelta(days=1)
+
+    unused = [t for t in index['targets'] if t not in set(schedule.values())]
+    random.shuffle(unused)
+    for offset in range(days):
+        day = (start + datetime.timedelta(days=offset)).isoformat()
+        if day in schedule:
+            continue
+        if not unused:
+            unused = list(index['targets'])
+            random.shuffle(unused)
+        schedule[day] = unused.pop()
+
+    _write_index(path, index)
+    return schedule
+
+
+def _remove_stale_files(path: Path, keep: Dict[str, str]) -> None:
+    """Delete the data files of earlier builds; a server still serving one keeps its mmaps."""
+    for key, name in _pack_files(None).items():
+        pattern = f"{Path(name).stem}*{Path(name).suffix}"
+        for stale in path.glob(pattern):
+            if stale.name != keep[key]:
+                stale.unlink(missing_ok=True)
+
+
+def _write_index(path: Path, index: Dict) -> None:
+    with atomic_path(path / INDEX_FILE) as tmp_file:
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump(index, f, ensure_ascii=False)
+
+
+if __name__ == '__main__':
+    if len(sys.argv) == 4 and sys.argv[1] == 'build':
+        from services.word_service import WordEmbeddingService
+        with open(sys.argv[2], 'r', encoding='utf-8') as f:
+            candidate_words = json.load(f)['words']
+        build_pack(WordEmbeddingService(), candidate_words, sys.argv[3])
+    elif len(sys.argv) == 4 and sys.argv[1] == 'schedule':
+        for scheduled_day, word in sorted(schedule_days(sys.argv[2], int(sys.argv[3])).items()):
+            print(scheduled_day, word)
+    else:
+        print("Usage: python -m services.puzzle_pack build <word_list.json> <pack_dir>\n"
+              "       python -m services.puzzle_pack schedule <pack_dir> <days>")
+        sys.exit(1)
@@ -0,0 +1,145 @@
+# file location: backend/services/shared_embeddings.py
+"""
+Share one copy of the embedding arrays between worker processes.
+
+The server's master process publishes the store into a named shared memory
+block before the workers start; every worker then attaches read-only NumPy
+views of that block instead of loading its own copy. The block is
+self-describing: a fixed-size JSON header lists each array's name, dtype,
+shape and offset, followed by the array data.
+
+The vocabulary is Python objects, which cannot live in a shared memory
+block. The master loads it (and the word -> row index) before forking and
+freezes the garbage collector, so workers inherit it copy-on-write.
+
+See gunicorn.conf.py for the publish/unlink hooks.
+"""
+
+import gc
+import json
+import sys
+from multiprocessing import shared_memory
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from loguru import logger
+
+from services import embedding_store
+
+HEADER_SIZE = 4096
+ALIGNMENT = 64
+
+# Keep attached segments referenced so their buffers stay mapped
+_segments: Dict[str, shared_memory.SharedMemory] = {}
+# Store fingerprint -> (vocabulary, word -> row index), loaded before forking
+_vocabularies: Dict[str, Tuple[List[str], Dict[str, int]]] = {}
+
+
+def publish(name: str, arrays: Dict[str, np.ndarray]) -> None:
+    """Copy `arrays` into a new shared memory block called `name`."""
+    layout = {}
+    offset = HEADER_SIZE
+    for key, array in arrays.items():
+        offset = -(-offset // ALIGNMENT) * ALIGNMENT
+        layout[key] = {'dtype': array.dtype.str, 'shape': list(array.shape), 'offset': offset}
+        offset += array.nbytes
+
+    header = json.dumps(layout).encode('utf-8')
+    if len(header) > HEADER_SIZE:
+        raise ValueError("Too many arrays for the shared memory header")
+
+    unlink(name)
+    segment = shared_memory.SharedMemory(name=name, create=True, size=offset)
+    segment.buf[:len(header)] = header
+    for key, array in arrays.items():
+        spec = layout[key]
+        view = np.ndarray(array.shape, dtype=array.dtype, buffer=segment.buf, offset=spec['offset'])
+        # Copy block by block so a memory-mapped source is never fully materialised
+        for start in range(0, len(array), 65536):
+            view[start:start + 65536] = array[start:start + 65536]
+        del view
+
+    _segments[name] = segment
+    logger.info(f"Published {', '.join(layout)} to shared memory '{name}' "
+                f"({offset / 1e6:.1f} MB)")
+
+
+def publish_store(store_dir: str, name: str, dtype: str = 'float32') -> None:
+    """Publish the `dtype` matrix of the embedding store at `store_dir` under `name`."""
+    matrix, scales = embedding_store.load_matrix(store_dir, dtype)
+    arrays = {'vectors': matrix}
+    if scales is not None:
+        arrays['scales'] = scales
+    publish(name, arrays)
+
+
+def preload_vocab(store_dir: str) -> None:
+    """
+    Load the store's vocabulary and word -> row index in this (master)
+    process, for workers forked afterwards to inherit through
+    inherited_vocab(). Objects are frozen out of garbage collection so
+    collections in the workers don't write to, and copy, their pages.
+    """
+    fingerprint = embedding_store.read_meta(store_dir)['fingerprint']
+    words = embedding_store.load_vocab(store_dir)
+    _vocabularies[fingerprint] = (words, {word: row for row, word in enumerate(words)})
+    gc.freeze()
+    logger.info(f"Loaded {len(words)} vocabulary words for the workers to share")
+
+
+def inherited_vocab(store_dir: str) -> Optional[Tuple[List[str], Dict[str, int]]]:
+    """The (vocabulary, word -> row index) preloaded for the store, or None."""
+    if not _vocabularies:
+        return None
+    return _vocabularies.get(embedding_store.read_meta(store_dir)['fingerprint'])
+
+
+def attach(name: str) -> Dict[str, np.ndarray]:
+    """
+    Attach to the block published under `name` and return read-only views
+    of its arrays. Raises FileNotFoundError if nothing was published.
+    """
+    segment = _segments.get(name)
+    if segment is None:
+        segment = _open_untracked(name)
+        _segments[name] = segment
+
+    raw = bytes(segment.buf[:HEADER_SIZE]).rstrip(b'\x00')
+    layout = json.loads(raw.decode('utf-8'))
+
+    arrays = {}
+    for key, spec in layout.items():
+        view = np.ndarray(tuple(spec['shape']), dtype=np.dtype(spec['dtype']),
+                          buffer=segment.buf, offset=spec['offset'])
+        view.flags.writeable = False
+        arrays[key] = view
+    return arrays
+
+
+def unlink(name: str) -> None:
+    """Remove the block called `name`, if it exists."""
+    segment = _segments.pop(name, None)
+    try:
+        if segment is None:
+            segment = shared_memory.SharedMemory(name=name)
+        segment.unlink()
+    except FileNotFoundError:
+        return
+    try:
+        segment.close()
+    except BufferError:
+        # Views handed out by attach() are still alive; the mapping goes with them
+        pass
+
+
+def _open_untracked(name: str) -> shared_memory.SharedMemory:
+    """
+    Open an existing block without letting this process's resource tracker
+    unlink it at exit; only the publishing process owns the block.
+    """
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name=name, track=False)
+    from multiprocessing import resource_tracker
+    segment = shared_memory.SharedMemory(name=name)
+    resource_tracker.unregister(segment._name, 'shared_memory')
+    return segment
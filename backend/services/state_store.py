@@ -0,0 +1,234 @@
+# file location: backend/services/state_store.py
+"""
+Game state backends, keyed by session id.
+
+A state is the dict built by GameService._create_initial_state plus its
+'attempts' list and a 'version' counter bumped by every write. Attempts are
+appended, never rewritten, so a guess does not serialise the whole game.
+
+update() and append_attempts() raise SessionExpired when the session has no
+state any more (evicted from the memory LRU since it was loaded); the caller
+saves the whole state it holds instead. Saving a state that carries the
+version it was loaded with continues from that version, so a re-created
+session does not count from 1 again.
+
+GAME_STATE_BACKEND selects the backend:
+    memory  in-process LRU of the most recent sessions (GAME_STATE_CAPACITY)
+    sqlite  SQLite database in WAL mode at GAME_STATE_DB (default)
+"""
+
+import copy
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from services.metrics import timed
+
+DEFAULT_SESSION = 'default'
+
+
+class SessionExpired(LookupError):
+    """The session has no stored state to update."""
+
+
+class StateStore:
+    """Interface shared by the state backends."""
+
+    def load(self, session_id: str) -> Optional[Dict]:
+        """Return the session's state with its attempts, or None if unknown."""
+        raise NotImplementedError
+
+    def save(self, session_id: str, state: Dict) -> int:
+        """
+        Replace the session's whole state, attempts included. Returns the new
+        version: one more than the stored one, else than the state's own.
+        """
+        raise NotImplementedError
+
+    def update(self, session_id: str, fields: Dict) -> int:
+        """Overwrite top-level fields other than attempts. Returns the new version, or raises SessionExpired."""
+        raise NotImplementedError
+
+    def append_attempts(self, session_id: str, attempts: List[Dict]) -> int:
+        """Append attempts to the session's history. Returns the new version, or raises SessionExpired."""
+        raise NotImplementedError
+
+
+class MemoryStateStore(StateStore):
+    def __init__(self, capacity: int = 10000):
+        self.capacity = capacity
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+
+    @timed('state_load')
+    def load(self, session_id: str) -> Optional[Dict]:
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            if entry is None:
+                return None
+            self._sessions.move_to_end(session_id)
+            state = copy.deepcopy(entry['meta'])
+            state['attempts'] = list(entry['attempts'])
+            return state
+
+    @timed('state_save')
+    def save(self, session_id: str, state: Dict) -> int:
+        meta = copy.deepcopy({k: v for k, v in state.items() if k not in ('attempts', 'version')})
+        with self._lock:
+            previous = self._sessions.get(session_id)
+            meta['version'] = (previous['meta']['version'] if previous else state.get('version', 0)) + 1
+            self._sessions[session_id] = {'meta': meta, 'attempts': list(state.get('attempts', []))}
+            self._sessions.move_to_end(session_id)
+            while len(self._sessions) > self.capacity:
+                self._sessions.popitem(last=False)
+            return meta['version']
+
+    @timed('state_save')
+    def update(self, session_id: str, fields: Dict) -> int:
+        fields = copy.deepcopy({k: v for k, v in fields.items() if k not in ('attempts', 'version')})
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            if entry is None:
+                raise SessionExpired(session_id)
+            meta = entry['meta']
+            meta.update(fields)
+            meta['version'] += 1
+            return meta['version']
+
+    @timed('state_save')
+    def append_attempts(self, session_id: str, attempts: List[Dict]) -> int:
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            if entry is None:
+                raise SessionExpired(session_id)
+            entry['attempts'].extend(attempts)
+            entry['meta']['version'] += 1
+            return entry['meta']['version']
+
+
+class SQLiteStateStore(StateStore):
+    def __init__(self, path: str):
+        self.path = path
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS games (
+                    session_id TEXT PRIMARY KEY,
+                    state TEXT NOT NULL,
+                    version INTEGER NOT NULL,
+                    updated_at REAL NOT NULL
+                )""")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS attempts (
+                    session_id TEXT NOT NULL,
+                    seq INTEGER NOT NULL,
+                    attempt TEXT NOT NULL,
+                    PRIMARY KEY (session_id, seq)
+                )""")
+
+    def _connect(self) -> sqlite3.Connection:
+        """One connection per thread, in WAL mode so readers never block the writer."""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    @timed('state_load')
+    def load(self, session_id: str) -> Optional[Dict]:
+        conn = self._connect()
+        row = conn.execute("SELECT state, version FROM games WHERE session_id = ?",
+                           (session_id,)).fetchone()
+        if row is None:
+            return None
+        state = json.loads(row[0])
+        state['version'] = row[1]
+        state['attempts'] = [
+            json.loads(a) for (a,) in conn.execute(
+                "SELECT attempt FROM attempts WHERE session_id = ? ORDER BY seq", (session_id,))
+        ]
+        return state
+
+    @timed('state_save')
+    def save(self, session_id: str, state: Dict) -> int:
+        meta = {k: v for k, v in state.items() if k not in ('attempts', 'version')}
+        conn = self._connect()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            row = conn.execute("SELECT version FROM games WHERE session_id = ?",
+                               (session_id,)).fetchone()
+            version = (row[0] if row else state.get('version', 0)) + 1
+            conn.execute("INSERT OR REPLACE INTO games VALUES (?, ?, ?, ?)",
+                         (session_id, json.dumps(meta, ensure_ascii=False), version, time.time()))
+            conn.execute("DELETE FROM attempts WHERE session_id = ?", (session_id,))
+            conn.executemany("INSERT INTO attempts VALUES (?, ?, ?)", [
+                (session_id, seq, json.dumps(a, ensure_ascii=False))
+                for seq, a in enumerate(state.get('attempts', []))
+            ])
+            conn.execute('COMMIT')
+            return version
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+
+    @timed('state_save')
+    def update(self, session_id: str, fields: Dict) -> int:
+        conn = self._connect()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            row = conn.execute(
+                "SELECT state, version FROM games WHERE session_id = ?", (session_id,)).fetchone()
+            if row is None:
+                raise SessionExpired(session_id)
+            state_json, version = row
+            meta = json.loads(state_json)
+            meta.update({k: v for k, v in fields.items() if k not in ('attempts', 'version')})
+            conn.execute("UPDATE games SET state = ?, version = ?, updated_at = ? WHERE session_id = ?",
+                         (json.dumps(meta, ensure_ascii=False), version + 1, time.time(), session_id))
+            conn.execute('COMMIT')
+            return version + 1
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+
+    @timed('state_save')
+    def append_attempts(self, session_id: str, attempts: List[Dict]) -> int:
+        conn = self._connect()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            if conn.execute("SELECT 1 FROM games WHERE session_id = ?", (session_id,)).fetchone() is None:
+                raise SessionExpired(session_id)
+            (next_seq,) = conn.execute(
+                "SELECT COALESCE(MAX(seq) + 1, 0) FROM attempts WHERE session_id = ?",
+                (session_id,)).fetchone()
+            conn.executemany("INSERT INTO attempts VALUES (?, ?, ?)", [
+                (session_id, next_seq + i, json.dumps(a, ensure_ascii=False))
+                for i, a in enumerate(attempts)
+            ])
+            conn.execute("UPDATE games SET version = version + 1, updated_at = ? WHERE session_id = ?",
+                         (time.time(), session_id))
+            (version,) = conn.execute("SELECT version FROM games WHERE session_id = ?",
+                                      (session_id,)).fetchone()
+            conn.execute('COMMIT')
+            return version
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+
+
+def create_state_store() -> StateStore:
+    """Build the backend selected by GAME_STATE_BACKEND."""
+    backend = os.getenv('GAME_STATE_BACKEND', 'sqlite')
+    if backend == 'memory':
+        return MemoryStateStore(int(os.getenv('GAME_STATE_CAPACITY', '10000')))
+    if backend == 'sqlite':
+        return SQLiteStateStore(os.getenv('GAME_STATE_DB', 'data/game_state.db'))
+    raise ValueError(f"Unknown GAME_STATE_BACKEND '{backend}'")
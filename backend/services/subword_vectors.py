@@ -0,0 +1,174 @@
+# file location: backend/services/subword_vectors.py
+"""
+Vectors for out-of-vocabulary words, built from fastText character n-grams.
+
+fastText represents a word by the n-grams of '<word>' (minn to maxn
+characters), each hashed into one of `bucket` rows of its input matrix. The
+vector of a word missing from the .vec table is the mean of its n-gram
+rows, so inflected or rare words ("rechargeable", "pommeraies") still get
+a meaningful vector.
+
+Only the n-gram rows of the .bin model are kept. They are extracted once
+into a directory and memory-mapped at run time, so they stay in the page
+cache rather than the Python heap:
+
+    ngrams.npy    (bucket, dim) n-gram vectors, float16 or float32
+    subword.json  dim, minn, maxn, bucket
+
+    python -m services.subword_vectors extract cc.fr.300.bin data/subwords [float16|float32]
+"""
+
+import json
+import mmap
+import os
+import struct
+import sys
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import List, Optional
+
+import numpy as np
+from loguru import logger
+
+NGRAMS_FILE = 'ngrams.npy'
+META_FILE = 'subword.json'
+
+FASTTEXT_MAGIC = 793712314
+
+
+def ngrams(word: str, minn: int, maxn: int) -> List[str]:
+    """Character n-grams of '<word>' as fastText computes them (single '<' and '>' excluded)."""
+    chars = f"<{word}>"
+    grams = []
+    for i in range(len(chars)):
+        for n in range(minn, maxn + 1):
+            if i + n > len(chars):
+                break
+            if n == 1 and (i == 0 or i + n == len(chars)):
+                continue
+            grams.append(chars[i:i + n])
+    return grams
+
+
+def ngram_hash(gram: str) -> int:
+    """fastText's 32-bit FNV-1a hash, which sign-extends each UTF-8 byte."""
+    h = 2166136261
+    for byte in gram.encode('utf-8'):
+        h ^= byte | 0xFFFFFF00 if byte >= 0x80 else byte
+        h = (h * 16777619) & 0xFFFFFFFF
+    return h
+
+
+class SubwordVectors:
+    def __init__(self, matrix: np.ndarray, minn: int, maxn: int, cache_size: int = 10000):
+        # (bucket, dim) n-gram rows, usually memory-mapped
+        self.matrix = matrix
+        self.minn = minn
+        self.maxn = maxn
+        self.cache_size = cache_size
+        # Word -> unit vector, least recently used first
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def dim(self) -> int:
+        return self.matrix.shape[1]
+
+    @classmethod
+    def open(cls, model_dir: str, cache_size: int = 10000) -> Optional['SubwordVectors']:
+        """Map the n-gram matrix extracted into `model_dir`, or None if there is none."""
+        path = Path(model_dir)
+        if not (path / NGRAMS_FILE).exists() or not (path / META_FILE).exists():
+            return None
+        with open(path / META_FILE, 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        matrix = np.load(path / NGRAMS_FILE, mmap_mode='r')
+        return cls(matrix, meta['minn'], meta['maxn'], cache_size)
+
+    def rows(self, word: str) -> np.ndarray:
+        """Matrix rows of the n-grams of `word`."""
+        bucket = len(self.matrix)
+        return np.array([ngram_hash(g) % bucket for g in ngrams(word, self.minn, self.maxn)],
+                        dtype=np.int64)
+
+    def vector(self, word: str) -> Optional[np.ndarray]:
+        """Unit-length vector of `word` (read-only, shared by callers), or None if it has no n-grams."""
+        with self._lock:
+            vector = self._cache.get(word)
+            if vector is not None:
+                self._cache.move_to_end(word)
+                return vector
+
+        rows = self.rows(word)
+        if len(rows) == 0:
+            return None
+        vector = np.asarray(self.matrix[np.sort(rows)], dtype=np.float32).mean(axis=0)
+        norm = np.linalg.norm(vector)
+        if norm == 0:
+            return None
+        vector /= norm
+        vector.flags.writeable = False
+
+        with self._lock:
+            self._cache[word] = vector
+            self._cache.move_to_end(word)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return vector
+
+
+def extract_ngrams(bin_path: str, model_dir: str, dtype: str = 'float16',
+                   chunk_rows: int = 65536) -> None:
+    """
+    Copy the n-gram rows of a fastText .bin model into `model_dir`.
+    The .bin file is memory-mapped and copied in chunks, so the multi-GB
+    input matrix is never loaded as a whole.
+    """
+    path = Path(model_dir)
+    path.mkdir(parents=True, exist_ok=True)
+    with open(bin_path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        magic, version = struct.unpack_from('<ii', data, 0)
+        if magic != FASTTEXT_MAGIC:
+            raise ValueError(f"{bin_path} is not a fastText .bin model")
+        (dim, _ws, _epoch, _min_count, _neg, _word_ngrams, _loss, _model, bucket, minn, maxn,
+         _lr_update_rate) = struct.unpack_from('<12i', data, 8)
+        pos = 8 + 12 * 4 + 8
+
+        size, n_words, _n_labels = struct.unpack_from('<3i', data, pos)
+        _n_tokens, prune_size = struct.unpack_from('<2q', data, pos + 12)
+        pos += 28
+        for _ in range(size):
+            # Null-terminated word, then an int64 count and an int8 entry type
+            pos = data.find(b'\0', pos) + 1 + 9
+        if prune_size > 0:
+            raise ValueError(f"{bin_path} is a pruned model, which has no full n-gram table")
+
+        if data[pos]:
+            raise ValueError(f"{bin_path} is a quantized model, which is not supported")
+        rows, cols = struct.unpack_from('<2q', data, pos + 1)
+        pos += 17
+        if rows != n_words + bucket or cols != dim:
+            raise ValueError(f"Unexpected input matrix shape {rows}x{cols} in {bin_path}")
+
+        source = np.frombuffer(data, dtype='<f4', count=rows * cols, offset=pos).reshape(rows, cols)
+        tmp_file = path / (NGRAMS_FILE + '.tmp')
+        target = np.lib.format.open_memmap(tmp_file, mode='w+', dtype=dtype, shape=(bucket, dim))
+        for start in range(0, bucket, chunk_rows):
+            end = min(start + chunk_rows, bucket)
+            target[start:end] = source[n_words + start:n_words + end]
+        target.flush()
+        del target, source
+
+    os.replace(tmp_file, path / NGRAMS_FILE)
+    with open(path / META_FILE, 'w', encoding='utf-8') as f:
+        json.dump({'dim': dim, 'minn': minn, 'maxn': maxn, 'bucket': bucket,
+                   'version': version, 'source': os.path.basename(bin_path)}, f, indent=2)
+    logger.info(f"Extracted {bucket} n-gram vectors of dimension {dim} ({dtype}) into {model_dir}")
+
+
+if __name__ == '__main__':
+    if len(sys.argv) not in (4, 5) or sys.argv[1] != 'extract':
+        print("Usage: python -m services.subword_vectors extract <model.bin> <model_dir> [float16|float32]")
+        sys.exit(1)
+    extract_ngrams(sys.argv[2], sys.argv[3], *sys.argv[4:])
@@ -0,0 +1,80 @@
+# file location: backend/services/target_ranking.py
+"""
+Similarity ranking of the whole vocabulary against one target word.
+
+Built once per target (when a game is reset) and then answers a guess's
+similarity and rank, the win-screen neighbours and joker ranges by lookup
+or slicing instead of rescanning the embedding matrix.
+"""
+
+import bisect
+from pathlib import Path
+from typing import Optional, Tuple
+
+import numpy as np
+from loguru import logger
+
+from services.embedding_store import atomic_path
+
+
+class TargetRanking:
+    def __init__(self, target_row: int, similarities: np.ndarray, order: np.ndarray):
+        self.target_row = target_row
+        # Similarity of every vocabulary row to the target
+        self.similarities = similarities
+        # Rows sorted by decreasing similarity; order[0] is the target itself
+        self.order = order
+        self.ranks = np.empty(len(order), dtype=np.int32)
+        self.ranks[order] = np.arange(len(order), dtype=np.int32)
+
+    @classmethod
+    def from_scores(cls, target_row: int, scores: np.ndarray) -> 'TargetRanking':
+        similarities = np.asarray(scores, dtype=np.float32)
+        keyed = -similarities
+        keyed[target_row] = -np.inf
+        order = np.argsort(keyed, kind='stable').astype(np.int32)
+        return cls(target_row, similarities, order)
+
+    def similarity(self, row: int) -> float:
+        return float(self.similarities[row])
+
+    def rank(self, row: int) -> int:
+        """1 for the closest word other than the target, 0 for the target itself."""
+        return int(self.ranks[row])
+
+    def rank_of(self, similarity: float) -> int:
+        """Rank a word outside the vocabulary with this similarity would have."""
+        key = lambda row: -self.similarities[row]
+        return bisect.bisect_left(self.order, -similarity, lo=1, key=key)
+
+    def top(self, n: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Rows and similarities of the `n` closest words, excluding the target."""
+        rows = self.order[1:n + 1]
+        return rows, self.similarities[rows]
+
+    def in_range(self, min_similarity: float, max_similarity: float) -> np.ndarray:
+        """Rows whose similarity lies within [min_similarity, max_similarity], best first."""
+        key = lambda row: -self.similarities[row]
+        start = bisect.bisect_left(self.order, -max_similarity, lo=1, key=key)
+        end = bisect.bisect_right(self.order, -min_similarity, lo=1, key=key)
+        return self.order[start:end]
+
+    def save(self, path: Path) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Workers ranking the same target at once each write their own file
+        with atomic_path(path, '.npz') as tmp_file:
+            np.savez(tmp_file, target_row=np.int64(self.target_row),
+                     similarities=self.similarities, order=self.order)
+
+    @classmethod
+    def load(cls, path: Path) -> Optional['TargetRanking']:
+        """Load a saved ranking, or None if there is none; an unreadable file is deleted."""
+        if not path.exists():
+            return None
+        try:
+            with np.load(path) as data:
+                return cls(int(data['target_row']), data['similarities'], data['order'])
+        except Exception as e:
+            logger.warning(f"Deleting unreadable similarity ranking {path}: {e}")
+            path.unlink(missing_ok=True)
+            return None
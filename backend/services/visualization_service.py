@@ -1,12 +1,48 @@
 # file location: backend/services/visualization_service.py
 
+import os
+import threading
+import time
+from collections import OrderedDict
+
 import numpy as np
-import umap  # pip install umap-learn
 from loguru import logger
 
+from services import projection
+from services.metrics import timed
+from services.state_store import DEFAULT_SESSION
+
 class VisualizationService:
+    """
+    3D layouts of a game's guesses around its target.
+
+    VIZ_ENGINE picks the projection (see services/projection.py): 'pca',
+    'polar', 'umap' or 'auto' (default). In auto mode games with fewer than
+    VIZ_UMAP_MIN_POINTS points use PCA (polar below three points), larger
+    ones use UMAP while its measured cost per point keeps a fit within
+    VIZ_LATENCY_BUDGET_MS, and PCA otherwise.
+
+    Layouts are cached per (session, target). A request for the same guesses
+    returns the cached points. UMAP layouts are extended incrementally: new
+    guesses are placed next to their closest already-placed words, and UMAP
+    is only refitted once the projected points outnumber VIZ_REFIT_RATIO
+    times the fitted ones. PCA and polar layouts are cheap enough to refit.
+    """
+
     def __init__(self, word_service):
         self.word_service = word_service
+        self.engine = os.getenv('VIZ_ENGINE', 'auto')
+        if self.engine != 'auto' and self.engine not in projection.ENGINES:
+            raise ValueError(f"Unknown VIZ_ENGINE '{self.engine}'")
+        self.umap_min_points = int(os.getenv('VIZ_UMAP_MIN_POINTS', '30'))
+        self.latency_budget = float(os.getenv('VIZ_LATENCY_BUDGET_MS', '250')) / 1000
+        self.cache_size = int(os.getenv('VIZ_CACHE_SIZE', '256'))
+        self.refit_ratio = float(os.getenv('VIZ_REFIT_RATIO', '1.0'))
+        self.anchors = int(os.getenv('VIZ_ANCHORS', '3'))
+        # Smoothed seconds per point of each engine, measured on every fit
+        self._seconds_per_point = {}
+        self._layouts = OrderedDict()
+        self._lock = threading.Lock()
 
     def _compute_color(self, similarity: float) -> str:
         """
@@ -20,124 +56,132 @@ class VisualizationService:
         b = int((1.0 - sim) * 255)
         return f"rgb({r}, {g}, {b})"
 
-    def prepare_3d_visualization(self, target_word: str, guessed_words: list[str]):
+    def prepare_3d_visualization(self, target_word: str, guessed_words: list[str],
+                                 session_id: str = DEFAULT_SESSION):
         try:
-            embeddings = []
-            valid_words = []
+            key = (session_id, target_word)
+            guessed_words = list(dict.fromkeys(guessed_words))
+
+            with self._lock:
+                layout = self._layouts.get(key)
+                if layout is not None:
+                    self._layouts.move_to_end(key)
+                    if layout['requested'] == frozenset(guessed_words):
+                        return layout['result']
 
             target_embedding = self.word_service.get_vector(target_word)
             if target_embedding is None:
-                return [{
-                    'word': "???",
-                    'coordinates': [0, 0, 0],
-                    'is_target': True,
-                    'similarity': 1.0,
-                    'color': 'rgb(255, 0, 0)'
-                }]
+                return [self._target_point([0, 0, 0])]
 
-            embeddings.append(target_embedding)
-            valid_words.append(target_word)
+            if layout is None or not set(layout['words'][1:]) <= set(guessed_words):
+                # New game, or a reset game that drew the same target again
+                layout = {'words': [target_word], 'embeddings': [target_embedding],
+                          'coords': np.zeros((1, 3)), 'fitted': 1, 'engine': 'polar'}
 
+            placed = set(layout['words'])
+            new_words, new_embeddings = [], []
             for word in guessed_words:
+                if word in placed:
+                    continue
                 vec = self.word_service.get_vector(word)
                 if vec is not None and not np.all(vec == 0):
-                    embeddings.append(vec)
-                    valid_words.append(word)
-
-            # if there's only 1 or 2 embeddings total, no manifold can form
-            if len(embeddings) < 3:
-                return self._simple_fallback(target_word, valid_words, embeddings)
-
-            # Otherwise, do UMAP
-            embeddings_array = np.array(embeddings)
-            neighbors = min(5, len(embeddings) - 1)
-
-            import umap
-            reducer = umap.UMAP(
-                n_components=3,
-                n_neighbors=neighbors,
-                min_dist=0.1,
-                metric='cosine',
-                random_state=42
-            )
-            embedding_3d = reducer.fit_transform(embeddings_array)
-
-            # Re-center target at (0,0,0)
-            target_coords = embedding_3d[0]
-            embedding_3d -= target_coords
-
-            result = []
-            for i, word in enumerate(valid_words):
-                if i == 0:
-                    # target
-                    result.append({
-                        'word': "???",
-                        'coordinates': embedding_3d[i].tolist(),
-                        'is_target': True,
-                        'similarity': 1.0,
-                        'color': 'rgb(255, 0, 0)'
-                    })
-                else:
-                    sim = self.word_service.calculate_similarity(target_word, word)
-                    color = self._compute_color(sim)
-                    result.append({
-                        'word': word,
-                        'coordinates': embedding_3d[i].tolist(),
-                        'is_target': False,
-                        'similarity': sim,
-                        'color': color
-                    })
-            return result
-
-        except Exception:
-            logger.exception("Error preparing 3D visualization with UMAP")
-            return [{
-                'word': "???",
-                'coordinates': [0, 0, 0],
-                'is_target': True,
-                'similarity': 1.0,
-                'color': 'rgb(255, 0, 0)'
-            }]
-
-    def _simple_fallback(self, target_word: str, valid_words: list[str], embeddings: list[np.ndarray]):
-        """
-        Return a minimal 3D layout without UMAP
-        when the dataset is too small to form a manifold.
-        """
-        # If there's only the target, just place it at the origin.
-        if len(embeddings) <= 1:
-            return [{
-                'word': "???",
-                'coordinates': [0, 0, 0],
-                'is_target': True,
-                'similarity': 1.0,
-                'color': 'rgb(255, 0, 0)'
-            }]
-
-        # We have at least 2 points (target + 1 guess)
-        coords = np.random.randn(len(embeddings), 3) * 0.1
-        coords[0] = [0, 0, 0]  # target at origin
-
-        result = []
-        for i, word in enumerate(valid_words):
-            if i == 0:
-                # target
-                result.append({
-                    'word': "???",
-                    'coordinates': coords[i].tolist(),
-                    'is_target': True,
-                    'similarity': 1.0,
-                    'color': 'rgb(255, 0, 0)'
-                })
+                    new_words.append(word)
+                    new_embeddings.append(vec)
+
+            words = layout['words'] + new_words
+            embeddings = layout['embeddings'] + new_embeddings
+            similarities = [1.0] + self.word_service.calculate_similarities(target_word, words[1:])
+
+            engine = self._choose_engine(len(words))
+            if not new_words:
+                coords, fitted, engine = layout['coords'], layout['fitted'], layout['engine']
+            elif (engine == 'umap' and layout['engine'] == 'umap'
+                  and len(words) - layout['fitted'] <= self.refit_ratio * layout['fitted']):
+                coords = np.vstack([layout['coords'],
+                                    self._project(layout, np.array(new_embeddings))])
+                fitted = layout['fitted']
             else:
-                sim = self.word_service.calculate_similarity(target_word, word)
-                color = self._compute_color(sim)
+                coords, engine = self._fit(engine, np.array(embeddings), np.array(similarities))
+                fitted = len(words)
+
+            result = [self._target_point(coords[0].tolist())]
+            for word, point, sim in zip(words[1:], coords[1:], similarities[1:]):
                 result.append({
                     'word': word,
-                    'coordinates': coords[i].tolist(),
+                    'coordinates': point.tolist(),
                     'is_target': False,
                     'similarity': sim,
-                    'color': color
+                    'color': self._compute_color(sim)
                 })
 
-        return result
+            with self._lock:
+                self._layouts[key] = {
+                    'words': words,
+                    'embeddings': embeddings,
+                    'coords': coords,
+                    'fitted': fitted,
+                    'engine': engine,
+                    'requested': frozenset(guessed_words),
+                    'result': result,
+                }
+                self._layouts.move_to_end(key)
+                while len(self._layouts) > self.cache_size:
+                    self._layouts.popitem(last=False)
+            return result
+
+        except Exception:
+            logger.exception("Error preparing 3D visualization")
+            return [self._target_point([0, 0, 0])]
+
+    def _choose_engine(self, n_points: int) -> str:
+        if self.engine != 'auto':
+            return self.engine
+        if n_points < 3:
+            return 'polar'
+        if n_points < self.umap_min_points:
+            return 'pca'
+        rate = self._seconds_per_point.get('umap')
+        if rate is None or rate * n_points <= self.latency_budget:
+            return 'umap'
+        return 'pca'
+
+    def _fit(self, engine: str, embeddings: np.ndarray, similarities: np.ndarray):
+        """Lay out every point with `engine`, falling back to PCA if UMAP fails."""
+        start = time.perf_counter()
+        try:
+            with timed(f"layout_{engine}"):
+                coords = projection.ENGINES[engine](embeddings, similarities)
+        except Exception:
+            if engine == 'pca':
+                raise
+            logger.exception(f"{engine} projection failed, using PCA")
+            # Keep auto mode off the failing engine
+            self._seconds_per_point[engine] = float('inf')
+            return self._fit('pca', embeddings, similarities)
+        rate = (time.perf_counter() - start) / len(embeddings)
+        previous = self._seconds_per_point.get(engine, rate)
+        self._seconds_per_point[engine] = 0.8 * previous + 0.2 * rate
+        logger.debug(f"Fitted {engine} layout on {len(embeddings)} words")
+        return coords, engine
+
+    def _project(self, layout: dict, new_embeddings: np.ndarray) -> np.ndarray:
+        """
+        Place new points at the similarity-weighted mean of the coordinates of
+        their closest already-placed words.
+        """
+        placed = np.array(layout['embeddings'])
+        scores = new_embeddings @ placed.T
+        k = min(self.anchors, len(placed))
+        nearest = np.argsort(-scores, axis=1)[:, :k]
+        weights = np.clip(np.take_along_axis(scores, nearest, axis=1), 1e-3, None)
+        weights /= weights.sum(axis=1, keepdims=True)
+        return np.einsum('nk,nkd->nd', weights, layout['coords'][nearest])
+
+    def _target_point(self, coordinates: list) -> dict:
+        return {
+            'word': "???",
+            'coordinates': coordinates,
+            'is_target': True,
+            'similarity': 1.0,
+            'color': 'rgb(255, 0, 0)'
+        }
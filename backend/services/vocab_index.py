@@ -0,0 +1,208 @@
+# file location: backend/services/vocab_index.py
+"""
+Lookup index over the vocabulary for guesses that are not exact matches.
+
+Guesses and vocabulary words are compared through a folded key: lowercase,
+accents and ligatures removed, typographic apostrophes straightened. A
+guess whose folded key matches a word ("ecole", "ÉCOLE", "écolé") resolves
+to that word; when several words share the key, the most frequent one
+(lowest row, since fastText files are sorted by frequency) wins.
+
+Misspelt guesses get suggestions by symmetric deletion: every word is
+indexed under its folded key with up to `max_distance` characters deleted,
+and a guess looks up its own deletions. Shared deletions give the
+candidates, which are then filtered by their true edit distance
+(insertions, deletions, substitutions and adjacent transpositions). A
+query only hashes a few dozen strings and runs a binary search per string,
+without walking the vocabulary.
+
+Both tables hold CRC-32 hashes sorted next to their rows, so they are
+compact numpy arrays rather than Python dicts; hash collisions are
+harmless since every candidate is checked against its word. The index is
+built on first load and saved next to the store as lookup.npz, tagged with
+the vocabulary fingerprint, or offline:
+
+    python -m services.vocab_index build data/embeddings
+"""
+
+import sys
+import unicodedata
+import zlib
+from pathlib import Path
+from typing import List, Optional, Set
+
+import numpy as np
+from loguru import logger
+
+from services import embedding_store
+
+INDEX_FILE = 'lookup.npz'
+
+_LIGATURES = str.maketrans({'œ': 'oe', 'æ': 'ae', 'ß': 'ss', '’': "'", 'ʼ': "'", '‘': "'"})
+
+
+def fold(word: str) -> str:
+    """Lowercase `word` and strip its accents: 'Écœurée' -> 'ecoeuree'."""
+    decomposed = unicodedata.normalize('NFKD', word.strip().lower().translate(_LIGATURES))
+    return ''.join(c for c in decomposed if not unicodedata.combining(c))
+
+
+def is_guessable(word: str) -> bool:
+    """Lowercase words made of letters, hyphens and apostrophes; other tokens are never guessed."""
+    return word == word.lower() and word.replace('-', '').replace("'", '').isalpha()
+
+
+def deletions(key: str, max_distance: int) -> Set[str]:
+    """`key` and every string obtained by deleting up to `max_distance` of its characters."""
+    variants = frontier = {key}
+    for _ in range(max_distance):
+        frontier = {v[:i] + v[i + 1:] for v in frontier if len(v) > 1 for i in range(len(v))}
+        variants = variants | frontier
+    return variants
+
+
+def edit_distance(a: str, b: str, limit: int) -> int:
+    """Edit distance with adjacent transpositions, or limit + 1 once it exceeds `limit`."""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous, current = None, list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        before, previous, current = previous, current, [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = a[i - 1] != b[j - 1]
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                current[j] = min(current[j], before[j - 2] + 1)
+        if min(current) > limit:
+            return limit + 1
+    return current[-1]
+
+
+def _hash(key: str) -> int:
+    return zlib.crc32(key.encode('utf-8'))
+
+
+class VocabIndex:
+    def __init__(self, vocab: List[str], fold_hashes: np.ndarray, fold_rows: np.ndarray,
+                 delete_hashes: np.ndarray, delete_rows: np.ndarray, max_distance: int):
+        self.vocab = vocab
+        # Folded key hash -> rows, sorted by hash then row
+        self.fold_hashes = fold_hashes
+        self.fold_rows = fold_rows
+        # Deletion hash -> rows, sorted by hash then row
+        self.delete_hashes = delete_hashes
+        self.delete_rows = delete_rows
+        self.max_distance = max_distance
+
+    @classmethod
+    def build(cls, vocab: List[str], max_distance: int = 1) -> 'VocabIndex':
+        """Index the guessable words of `vocab` by folded key and by deletions."""
+        fold_pairs, delete_pairs = [], []
+        for row, word in enumerate(vocab):
+            if not is_guessable(word):
+                continue
+            key = fold(word)
+            fold_pairs.append((_hash(key), row))
+            delete_pairs.extend((_hash(variant), row) for variant in deletions(key, max_distance))
+
+        fold_hashes, fold_rows = _sorted_table(fold_pairs)
+        delete_hashes, delete_rows = _sorted_table(delete_pairs)
+        logger.info(f"Built vocabulary lookup index over {len(fold_rows)} words "
+                    f"({len(delete_rows)} deletion entries, distance {max_distance})")
+        return cls(vocab, fold_hashes, fold_rows, delete_hashes, delete_rows, max_distance)
+
+    def resolve(self, word: str) -> Optional[int]:
+        """Row of the most frequent word with the same folded key as `word`, or None."""
+        key = fold(word)
+        start = int(np.searchsorted(self.fold_hashes, _hash(key), side='left'))
+        end = int(np.searchsorted(self.fold_hashes, _hash(key), side='right'))
+        for row in self.fold_rows[start:end]:
+            if fold(self.vocab[row]) == key:
+                return int(row)
+        return None
+
+    def suggest(self, word: str, n: int = 5) -> List[int]:
+        """
+        Rows of up to `n` words within `max_distance` edits of `word` (compared
+        folded), closest first, then most frequent first.
+        """
+        key = fold(word)
+        if not key:
+            return []
+        hashes = np.array(sorted({_hash(v) for v in deletions(key, self.max_distance)}),
+                          dtype=np.uint32)
+        starts = np.searchsorted(self.delete_hashes, hashes, side='left')
+        ends = np.searchsorted(self.delete_hashes, hashes, side='right')
+        if not (ends > starts).any():
+            return []
+        candidates = np.unique(np.concatenate([self.delete_rows[s:e] for s, e in zip(starts, ends)]))
+
+        scored = {}
+        for row in candidates:
+            candidate = fold(self.vocab[row])
+            # Rows come in increasing order, so the first word of a folded key is the most frequent
+            if candidate in scored:
+                continue
+            distance = edit_distance(key, candidate, self.max_distance)
+            if distance <= self.max_distance:
+                scored[candidate] = (distance, int(row))
+        return [row for _, row in sorted(scored.values())[:n]]
+
+    def save(self, store_dir: str) -> None:
+        fingerprint = embedding_store.read_meta(store_dir)['fingerprint']
+        with embedding_store.atomic_path(Path(store_dir) / INDEX_FILE, '.npz') as tmp_file:
+            np.savez(tmp_file, fold_hashes=self.fold_hashes, fold_rows=self.fold_rows,
+                     delete_hashes=self.delete_hashes, delete_rows=self.delete_rows,
+                     max_distance=np.array(self.max_distance), fingerprint=np.array(fingerprint))
+
+    @classmethod
+    def load(cls, store_dir: str, vocab: List[str], max_distance: int = 1) -> Optional['VocabIndex']:
+        """
+        Load the store's index, or None if it is missing, was built for another
+        vocabulary or with another `max_distance`. An unreadable file is
+        deleted, so it gets rebuilt.
+        """
+        path = Path(store_dir) / INDEX_FILE
+        if not path.exists():
+            return None
+        fingerprint = embedding_store.read_meta(store_dir)['fingerprint']
+        try:
+            with np.load(path) as data:
+                if str(data['fingerprint']) != fingerprint:
+                    logger.warning(f"Ignoring stale vocabulary lookup index at {path}")
+                    return None
+                if int(data['max_distance']) != max_distance:
+                    return None
+                return cls(vocab, data['fold_hashes'], data['fold_rows'],
+                           data['delete_hashes'], data['delete_rows'], max_distance)
+        except Exception as e:
+            logger.warning(f"Deleting unreadable vocabulary lookup index {path}: {e}")
+            path.unlink(missing_ok=True)
+            return None
+
+    @classmethod
+    def open(cls, store_dir: str, vocab: List[str], max_distance: int = 1) -> 'VocabIndex':
+        """Load the store's index, building and saving it first if needed."""
+        index = cls.load(store_dir, vocab, max_distance)
+        if index is None:
+            index = cls.build(vocab, max_distance)
+            try:
+                index.save(store_dir)
+            except OSError:
+                logger.exception(f"Could not save the vocabulary lookup index in {store_dir}")
+        return index
+
+
+def _sorted_table(pairs):
+    table = np.array(pairs, dtype=np.int64).reshape(-1, 2)
+    order = np.lexsort((table[:, 1], table[:, 0]))
+    return table[order, 0].astype(np.uint32), table[order, 1].astype(np.int32)
+
+
+if __name__ == '__main__':
+    if len(sys.argv) not in (3, 4) or sys.argv[1] != 'build':
+        print("Usage: python -m services.vocab_index build <store_dir> [max_distance]")
+        sys.exit(1)
+    store = sys.argv[2]
+    distance = int(sys.argv[3]) if len(sys.argv) == 4 else 1
+    VocabIndex.build(embedding_store.load_vocab(store), distance).save(store)
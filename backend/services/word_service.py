@@ -1,75 +1,595 @@
 from loguru import logger
 import numpy as np
-from typing import List, Dict
+from typing import List, Dict, Optional, Iterable, Tuple
 import random
-from gensim.models import KeyedVectors
+import hashlib
 import os
-import tempfile
-import requests
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from urllib.parse import urlparse
+
+from services import ann_index, embedding_store, model_downloader, shared_embeddings
+from services.subword_vectors import SubwordVectors
+from services.metrics import timed
+from services.target_ranking import TargetRanking
+from services.vocab_index import VocabIndex, is_guessable
 
 class WordEmbeddingService:
     _instance = None
-    _model = None
-    
-    def __new__(cls):
+    # Row-normalised embedding matrix (memory-mapped), one row per word, stored
+    # as float32, float16 or int8 depending on EMBEDDING_DTYPE
+    _matrix = None
+    # Per-row float32 scales, only set for int8 storage
+    _scales = None
+    # Row index -> word, and word -> row index
+    _vocab = None
+    _word_index = None
+    # Optional IVF index for top-k queries, and how many lists each query probes
+    _ann_index = None
+    _ann_probes = 16
+    # Most (queries x vocabulary) scores combine() holds at once, 8 MB of float32
+    _combine_block_scores = 1 << 21
+    # Accent-folded and misspelling lookup over the vocabulary
+    _lookup = None
+    # Optional fastText n-gram vectors for out-of-vocabulary guesses
+    _subwords = None
+    # Per-target similarity rankings, least recently used first
+    _rankings = OrderedDict()
+    _rankings_lock = threading.Lock()
+    _ranking_dir = None
+    # Vocabulary fingerprint of the open store
+    _fingerprint = None
+    # Set once everything above is in place, not just the matrix
+    _ready = False
+    # Background loading thread, and the progress reported by /api/health
+    _load_thread = None
+    _load_lock = threading.Lock()
+    _load_status = {'stage': 'idle', 'progress': 0.0, 'error': None,
+                    'started_at': None, 'finished_at': None}
+
+    def __new__(cls, *args, **kwargs):
         if cls._instance is None:
             cls._instance = super(WordEmbeddingService, cls).__new__(cls)
         return cls._instance
 
-    def __init__(self):
-        if not WordEmbeddingService._model:
+    def __init__(self, background: Optional[bool] = None):
+        """
+        Load the model, in a background thread when `background` (default:
+        MODEL_BACKGROUND_LOAD, on unless set to 0) so the server can answer
+        health checks meanwhile. Queries made before it is ready wait for it.
+        """
+        if background is None:
+            background = os.getenv('MODEL_BACKGROUND_LOAD', '1') == '1'
+        if not WordEmbeddingService._ready:
+            if background:
+                self.start_loading()
+            else:
+                self._initialize_model()
+
+    def start_loading(self) -> None:
+        """Start loading the model in a background thread, unless it is loaded or loading."""
+        with WordEmbeddingService._load_lock:
+            thread = WordEmbeddingService._load_thread
+            if WordEmbeddingService._ready or (thread is not None and thread.is_alive()):
+                return
+            thread = threading.Thread(target=self._load_in_background,
+                                      name='model-loader', daemon=True)
+            WordEmbeddingService._load_thread = thread
+            thread.start()
+
+    def _load_in_background(self) -> None:
+        try:
             self._initialize_model()
-    
+        except Exception:
+            # Already logged, and reported through loading_status()
+            pass
+
+    def is_ready(self) -> bool:
+        """
+        True once the model and its indexes (lookup, subwords, ranking
+        directory) are all loaded and queries no longer block.
+        """
+        return WordEmbeddingService._ready
+
+    def store_fingerprint(self) -> Optional[str]:
+        """Vocabulary fingerprint of the loaded store, waiting for it to load."""
+        self._ensure_model_loaded()
+        return WordEmbeddingService._fingerprint
+
+    def loading_status(self) -> Dict:
+        """Loading stage ('idle', 'downloading', 'converting', 'opening', 'ready' or 'failed'), progress and timings."""
+        status = dict(WordEmbeddingService._load_status)
+        status['model_loaded'] = self.is_ready()
+        if status['started_at'] is not None:
+            end = status['finished_at'] or time.time()
+            status['elapsed_seconds'] = round(end - status['started_at'], 1)
+        return status
+
+    @staticmethod
+    def _set_load_status(stage: str, progress: float = 0.0, error: Optional[str] = None) -> None:
+        status = WordEmbeddingService._load_status
+        if stage != status['stage'] and stage not in ('ready', 'failed'):
+            logger.info(f"Model loading: {stage}")
+        status.update(stage=stage, progress=round(progress, 3), error=error)
+        if stage in ('ready', 'failed'):
+            status['finished_at'] = time.time()
+
+    @timed('model_load')
     def _initialize_model(self):
         """Initialize the model only when needed"""
+        WordEmbeddingService._load_status.update(started_at=time.time(), finished_at=None)
         try:
-            # Get model URL from environment variable
-            model_url = os.getenv('MODEL_URL', 'https://huggingface.co/Miroir/cc.fr.300.reduced/resolve/main/cc.fr.300.reduced.vec')
-            
-            logger.info("Loading FastText embeddings from URL...")
-            
-            # Create a temporary file to store the model
-            with tempfile.NamedTemporaryFile(delete=False) as temp_file:
-                # Download the file
-                response = requests.get(model_url, stream=True)
-                response.raise_for_status()
-                
-                # Write the content to the temporary file
-                for chunk in response.iter_content(chunk_size=8192):
-                    if chunk:
-                        temp_file.write(chunk)
-                
-                temp_file.flush()
-                
-                # Load the model from the temporary file
-                WordEmbeddingService._model = KeyedVectors.load_word2vec_format(temp_file.name)
-            
-            # Build vocabulary vectors
-            self.vocab_vectors = {
-                word: WordEmbeddingService._model[word]
-                for word in WordEmbeddingService._model.index_to_key
-            }
-            
+            store_dir = os.getenv('EMBEDDING_STORE_DIR', 'data/embeddings')
+            dtype = os.getenv('EMBEDDING_DTYPE', 'float32')
+
+            self.ensure_store(store_dir)
+
+            self._set_load_status('opening')
+            matrix, scales = self._attach_shared()
+            if matrix is None:
+                logger.info(f"Opening {dtype} embedding store at {store_dir}...")
+                matrix, scales = embedding_store.load_matrix(store_dir, dtype)
+            vocab, word_index = shared_embeddings.inherited_vocab(store_dir) or (
+                embedding_store.load_vocab(store_dir), None)
+            if len(vocab) != matrix.shape[0]:
+                raise ValueError(f"Corrupt embedding store {store_dir}: "
+                                 f"{len(vocab)} words for {matrix.shape[0]} vectors")
+            self._set_matrix(vocab, matrix, scales, word_index)
+            self._load_ann_index(store_dir)
+            self._load_vocab_index(store_dir)
+            self._load_subwords(matrix.shape[1])
+
+            fingerprint = embedding_store.read_meta(store_dir)['fingerprint']
+            WordEmbeddingService._fingerprint = fingerprint
+            WordEmbeddingService._ranking_dir = (
+                Path(store_dir) / 'rankings' / f"{fingerprint[:12]}-{matrix.dtype}"
+            )
+
+            WordEmbeddingService._ready = True
+            self._set_load_status('ready', 1.0)
             logger.info(f"FastText model loaded successfully with "
-                       f"{len(self.vocab_vectors)} words in the vocabulary.")
-                       
+                       f"{len(WordEmbeddingService._vocab)} words in the vocabulary "
+                       f"({matrix.dtype} storage).")
+
         except Exception as e:
+            self._set_load_status('failed', error=str(e))
             logger.exception(f"Failed to load FastText model: {str(e)}")
             raise
 
+    def _attach_shared(self):
+        """
+        Attach to the matrix published in shared memory by the server's master
+        process (EMBEDDING_SHARED_MEMORY), so workers don't each hold a copy.
+        Returns (None, None) when shared memory is not configured or not published.
+        """
+        shm_name = os.getenv('EMBEDDING_SHARED_MEMORY')
+        if not shm_name:
+            return None, None
+        try:
+            arrays = shared_embeddings.attach(shm_name)
+        except FileNotFoundError:
+            logger.warning(f"Shared memory '{shm_name}' not found, falling back to the store file")
+            return None, None
+        logger.info(f"Attached embedding matrix from shared memory '{shm_name}'")
+        return arrays['vectors'], arrays.get('scales')
+
+    def _load_ann_index(self, store_dir: str) -> None:
+        """
+        Load the IVF index built offline for this store when ANN_INDEX=1.
+        ANN_NPROBE sets the recall/latency trade-off; without an index,
+        top-k queries fall back to an exact scan.
+        """
+        if os.getenv('ANN_INDEX', '0') != '1':
+            return
+        index = ann_index.IVFIndex.load(store_dir)
+        if index is None:
+            logger.warning(f"ANN_INDEX is set but {store_dir} has no usable index, "
+                           f"using exact search")
+            return
+        WordEmbeddingService._ann_index = index
+        WordEmbeddingService._ann_probes = int(os.getenv('ANN_NPROBE', '16'))
+        logger.info(f"Loaded IVF index with {index.n_lists} lists "
+                    f"(probing {WordEmbeddingService._ann_probes})")
+
+    def _load_vocab_index(self, store_dir: str) -> None:
+        """
+        Open the lookup index used to resolve accent variants and suggest
+        corrections, building it on first use. VOCAB_SUGGEST_DISTANCE is the
+        largest edit distance of a suggestion (1 by default; 2 multiplies the
+        index size). Without an index, guesses must match exactly.
+        """
+        try:
+            WordEmbeddingService._lookup = VocabIndex.open(
+                store_dir, WordEmbeddingService._vocab,
+                int(os.getenv('VOCAB_SUGGEST_DISTANCE', '1')))
+        except Exception:
+            logger.exception(f"Could not open the vocabulary lookup index of {store_dir}")
+
+    def _load_subwords(self, dim: int) -> None:
+        """
+        Map the fastText n-gram matrix extracted into SUBWORD_MODEL_DIR, if
+        set, so out-of-vocabulary guesses get a vector built from their
+        n-grams. The SUBWORD_CACHE_SIZE most recent ones are kept.
+        """
+        model_dir = os.getenv('SUBWORD_MODEL_DIR')
+        if not model_dir:
+            return
+        try:
+            subwords = SubwordVectors.open(model_dir, int(os.getenv('SUBWORD_CACHE_SIZE', '10000')))
+        except Exception:
+            logger.exception(f"Could not open the subword vectors in {model_dir}")
+            return
+        if subwords is None:
+            logger.warning(f"SUBWORD_MODEL_DIR is set but {model_dir} holds no n-gram vectors")
+        elif subwords.dim != dim:
+            logger.warning(f"Ignoring subword vectors of dimension {subwords.dim} "
+                           f"for a store of dimension {dim}")
+        else:
+            WordEmbeddingService._subwords = subwords
+            logger.info(f"Mapped {len(subwords.matrix)} subword n-gram vectors from {model_dir}")
+
+    @classmethod
+    def ensure_store(cls, store_dir: str) -> None:
+        """
+        Build the store at `store_dir` unless it exists. The build holds the
+        store's lock, so when several processes start on an empty disk one
+        downloads and converts while the others wait for it.
+        """
+        if embedding_store.store_exists(store_dir):
+            return
+        with embedding_store.build_lock(store_dir):
+            if not embedding_store.store_exists(store_dir):
+                cls._build_store(store_dir)
+
+    @classmethod
+    def _build_store(cls, store_dir: str) -> None:
+        """
+        Download the word2vec text model into MODEL_CACHE_DIR (kept across
+        restarts, verified against MODEL_SHA256 when set) and convert it into
+        a binary store.
+        """
+        # Get model URL from environment variable
+        model_url = os.getenv('MODEL_URL', 'https://huggingface.co/Miroir/cc.fr.300.reduced/resolve/main/cc.fr.300.reduced.vec')
+        cache_dir = os.getenv('MODEL_CACHE_DIR', 'data/models')
+        model_path = os.path.join(cache_dir, os.path.basename(urlparse(model_url).path) or 'model.vec')
+
+        logger.info("Downloading FastText embeddings from URL...")
+        cls._set_load_status('downloading')
+        model_downloader.download_model(
+            model_url, model_path, sha256=os.getenv('MODEL_SHA256'),
+            progress=lambda done, total: cls._set_load_status('downloading', done / total if total else 0.0))
+
+        cls._set_load_status('converting')
+        embedding_store.convert_word2vec(
+            model_path, store_dir,
+            progress=lambda read, announced: cls._set_load_status('converting', read / announced))
+
+    @staticmethod
+    def _set_matrix(words: List[str], matrix: np.ndarray,
+                    scales: Optional[np.ndarray] = None,
+                    word_index: Optional[Dict[str, int]] = None) -> None:
+        """
+        Install the L2-normalised matrix used by every query, along with
+        the word -> row index (built from `words` unless given). Cosine
+        similarity against the whole vocabulary then reduces to a single
+        matrix-vector product.
+        """
+        WordEmbeddingService._vocab = words
+        WordEmbeddingService._word_index = word_index if word_index is not None else {
+            word: row for row, word in enumerate(words)
+        }
+        WordEmbeddingService._scales = scales
+        WordEmbeddingService._matrix = matrix
+
     def _ensure_model_loaded(self):
-        """Ensure the model is loaded before any operation"""
-        if not WordEmbeddingService._model:
-            self._initialize_model()
+        """Ensure the model is loaded before any operation, waiting for a background load"""
+        if not WordEmbeddingService._ready:
+            thread = WordEmbeddingService._load_thread
+            if thread is not None and thread.is_alive():
+                thread.join()
+            if not WordEmbeddingService._ready:
+                self._initialize_model()
+
+    def _row(self, word: str) -> Optional[int]:
+        """Return the matrix row of `word`, or None if it is out of vocabulary."""
+        return WordEmbeddingService._word_index.get(word.lower())
+
+    @timed('subword')
+    def _oov_vector(self, word: str) -> Optional[np.ndarray]:
+        """Unit vector built from the n-grams of an out-of-vocabulary word, if subwords are loaded."""
+        subwords = WordEmbeddingService._subwords
+        word = word.lower()
+        if subwords is None or not is_guessable(word):
+            return None
+        return subwords.vector(word)
+
+    def _row_vector(self, row: int) -> np.ndarray:
+        """Decode one matrix row to a float32 vector."""
+        vector = np.asarray(WordEmbeddingService._matrix[row], dtype=np.float32)
+        if WordEmbeddingService._scales is not None:
+            vector = vector * WordEmbeddingService._scales[row]
+        return vector
+
+    def _scores(self, query: np.ndarray) -> np.ndarray:
+        """Cosine similarity of a unit-length `query` (or of each row of a query matrix) against every vocabulary word."""
+        return embedding_store.score_rows(WordEmbeddingService._matrix,
+                                          WordEmbeddingService._scales,
+                                          np.asarray(query, dtype=np.float32))
+
+    def _score_rows(self, rows: np.ndarray, query: np.ndarray) -> np.ndarray:
+        """Cosine similarity of a unit-length `query` against the given rows only."""
+        scales = WordEmbeddingService._scales
+        return embedding_store.score_rows(WordEmbeddingService._matrix[rows],
+                                          scales[rows] if scales is not None else None,
+                                          np.asarray(query, dtype=np.float32))
+
+    def _nearest(self, query: np.ndarray, k: int,
+                 exclude: Iterable[int] = ()) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Rows of the `k` words closest to `query`, best first, and their similarities.
+        Uses the IVF index when one is loaded, and falls back to an exact scan
+        when there is none or the probed lists hold too few candidates.
+        """
+        exclude = list(exclude)
+        index = WordEmbeddingService._ann_index
+        if index is not None and WordEmbeddingService._ann_probes < index.n_lists:
+            rows = np.sort(index.candidates(query, WordEmbeddingService._ann_probes))
+            if len(rows) >= k + len(exclude):
+                scores = self._score_rows(rows, query)
+                if exclude:
+                    scores[np.isin(rows, exclude)] = -np.inf
+                top = self._top_k(scores, k)
+                return rows[top], scores[top]
+
+        scores = self._scores(query)
+        scores[exclude] = -np.inf
+        top = self._top_k(scores, k)
+        return top, scores[top]
+
+    @staticmethod
+    def _top_k(scores: np.ndarray, k: int) -> np.ndarray:
+        """Indices of the `k` highest scores, best first."""
+        k = min(k, len(scores))
+        if k <= 0:
+            return np.empty(0, dtype=np.int64)
+        top = np.argpartition(-scores, k - 1)[:k]
+        return top[np.argsort(-scores[top], kind='stable')]
+
+    @staticmethod
+    def _top_k_rows(scores: np.ndarray, k: int) -> np.ndarray:
+        """Indices of the `k` highest scores of each row of `scores`, best first."""
+        k = min(k, scores.shape[1])
+        if k <= 0:
+            return np.empty((len(scores), 0), dtype=np.int64)
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        order = np.argsort(-np.take_along_axis(scores, top, axis=1), axis=1, kind='stable')
+        return np.take_along_axis(top, order, axis=1)
+
+    @timed('ranking')
+    def prepare_target(self, target_word: str) -> Optional[TargetRanking]:
+        """
+        Build (or load from disk) the similarity ranking of the whole vocabulary
+        against `target_word`, and keep it in memory so later similarity, rank,
+        neighbour and joker queries for this target are lookups.
+        """
+        self._ensure_model_loaded()
+        row = self._row(target_word)
+        if row is None:
+            logger.warning(f"Target word not found in vocab: {target_word}")
+            return None
+
+        key = WordEmbeddingService._vocab[row]
+        ranking = self._stored_ranking(key)
+        if ranking is not None:
+            return ranking
 
+        ranking = TargetRanking.from_scores(row, self._scores(self._row_vector(row)))
+        logger.info(f"Built similarity ranking for '{key}'")
+        path = self._ranking_path(key)
+        if path:
+            try:
+                ranking.save(path)
+            except OSError:
+                logger.exception(f"Could not cache similarity ranking for '{key}'")
+        self._keep_ranking(key, ranking)
+        return ranking
+
+    def _cached_ranking(self, target_word: str) -> Optional[TargetRanking]:
+        """The in-memory ranking for `target_word`, without building one."""
+        with WordEmbeddingService._rankings_lock:
+            ranking = WordEmbeddingService._rankings.get(target_word.lower())
+            if ranking is not None:
+                WordEmbeddingService._rankings.move_to_end(target_word.lower())
+            return ranking
+
+    def _stored_ranking(self, target_word: str) -> Optional[TargetRanking]:
+        """The ranking for `target_word` from memory, else from disk (then kept in memory), without building one."""
+        ranking = self._cached_ranking(target_word)
+        if ranking is not None:
+            return ranking
+        path = self._ranking_path(target_word.lower())
+        ranking = TargetRanking.load(path) if path else None
+        if ranking is not None:
+            self._keep_ranking(target_word.lower(), ranking)
+        return ranking
+
+    def _keep_ranking(self, key: str, ranking: TargetRanking) -> None:
+        """
+        Keep `ranking` in memory, evicting the least recently used ones beyond
+        the cache size. RANKING_CACHE_SIZE sets it; by default it holds as
+        many rankings as fit in RANKING_CACHE_MB (512), so every target being
+        played at once stays in memory: a ranking takes 12 bytes per word,
+        2.4 MB for 200k words.
+        """
+        cache_size = os.getenv('RANKING_CACHE_SIZE')
+        if cache_size is not None:
+            cache_size = int(cache_size)
+        else:
+            budget = float(os.getenv('RANKING_CACHE_MB', '512')) * 1e6
+            cache_size = max(4, int(budget // (12 * len(ranking.order))))
+        with WordEmbeddingService._rankings_lock:
+            WordEmbeddingService._rankings[key] = ranking
+            WordEmbeddingService._rankings.move_to_end(key)
+            while len(WordEmbeddingService._rankings) > cache_size:
+                WordEmbeddingService._rankings.popitem(last=False)
+
+    @staticmethod
+    def _rank_in_scores(scores: np.ndarray, target_row: int, similarity: float,
+                        row: Optional[int] = None) -> int:
+        """
+        Rank of a word (vocabulary `row`, or None outside it) with `similarity`
+        among the target's `scores`, counted the way TargetRanking ranks it:
+        better scores first, then lower rows among equal ones.
+        """
+        if row == target_row:
+            return 0
+        ahead = scores > similarity
+        if row is not None:
+            ahead[:row] |= scores[:row] == similarity
+        ahead[target_row] = False
+        return int(np.count_nonzero(ahead)) + 1
+
+    def _ranking_path(self, word: str) -> Optional[Path]:
+        if WordEmbeddingService._ranking_dir is None:
+            return None
+        digest = hashlib.sha1(word.encode('utf-8')).hexdigest()[:16]
+        return WordEmbeddingService._ranking_dir / f"{digest}.npz"
+
+    @timed('lookup')
+    def resolve_word(self, word: str) -> Optional[str]:
+        """
+        The vocabulary form of a guess: the word itself when it is in the
+        vocabulary, else the most frequent word that differs from it only by
+        case or accents ('ecole' -> 'école'). None if there is none.
+        """
+        self._ensure_model_loaded()
+        row = self._row(word)
+        if row is None and WordEmbeddingService._lookup is not None:
+            row = WordEmbeddingService._lookup.resolve(word)
+        return WordEmbeddingService._vocab[row] if row is not None else None
+
+    @timed('lookup')
+    def suggest_words(self, word: str, n: int = 5) -> List[str]:
+        """Vocabulary words a few edits away from a guess that is not in the vocabulary."""
+        self._ensure_model_loaded()
+        if WordEmbeddingService._lookup is None:
+            return []
+        try:
+            vocab = WordEmbeddingService._vocab
+            return [vocab[row] for row in WordEmbeddingService._lookup.suggest(word, n)]
+        except Exception:
+            logger.exception(f"Error suggesting words for: {word}")
+            return []
+
+    @timed('similarity')
+    def get_rank(self, target_word: str, word: str) -> Optional[int]:
+        """
+        Rank of `word` among all vocabulary words by similarity to `target_word`
+        (1 = closest). Returns None if either word is out of vocabulary.
+        Uses the target's ranking when it is in memory or on disk, else counts
+        the better words in one scan rather than building the ranking.
+        """
+        self._ensure_model_loaded()
+        try:
+            return self._ranks(target_word, [word])[0]
+        except Exception:
+            logger.exception(f"Error ranking '{word}' against '{target_word}'")
+            return None
+
+    @timed('similarity')
+    def get_ranks(self, target_word: str, words: List[str]) -> List[Optional[int]]:
+        """Ranks of several `words` against `target_word`, None for out-of-vocabulary words."""
+        self._ensure_model_loaded()
+        try:
+            return self._ranks(target_word, words)
+        except Exception:
+            logger.exception(f"Error ranking words against '{target_word}'")
+            return [None] * len(words)
+
+    def _ranks(self, target_word: str, words: List[str]) -> List[Optional[int]]:
+        target_row = self._row(target_word)
+        if target_row is None:
+            return [None] * len(words)
+        rows = [self._row(w) for w in words]
+        similarities = {}
+        if WordEmbeddingService._subwords is not None:
+            similarities = self._oov_similarities(self._row_vector(target_row), words, rows)
+
+        ranking = self._stored_ranking(target_word)
+        if ranking is not None:
+            ranks = [ranking.rank(r) if r is not None else None for r in rows]
+            for i, similarity in similarities.items():
+                ranks[i] = ranking.rank_of(similarity)
+            return ranks
+
+        scores = self._scores(self._row_vector(target_row))
+        ranks = [self._rank_in_scores(scores, target_row, scores[r], r) if r is not None else None
+                 for r in rows]
+        for i, similarity in similarities.items():
+            ranks[i] = self._rank_in_scores(scores, target_row, similarity)
+        return ranks
+
+    @timed('similarity')
+    def calculate_similarities(self, target_word: str, words: List[str]) -> List[float]:
+        """
+        Similarity of each of `words` to `target_word`, scored in one matrix
+        operation. Out-of-vocabulary words get 0.0, like calculate_similarity.
+        """
+        self._ensure_model_loaded()
+        try:
+            target_row = self._row(target_word)
+            rows = [self._row(w) for w in words]
+            known = [i for i, r in enumerate(rows) if r is not None]
+            similarities = np.zeros(len(words), dtype=np.float32)
+            if target_row is None:
+                return similarities.tolist()
+
+            if known:
+                known_rows = np.array([rows[i] for i in known])
+                ranking = self._cached_ranking(target_word)
+                if ranking is not None:
+                    similarities[known] = ranking.similarities[known_rows]
+                else:
+                    similarities[known] = self._score_rows(known_rows, self._row_vector(target_row))
+            if WordEmbeddingService._subwords is not None:
+                for i, similarity in self._oov_similarities(self._row_vector(target_row),
+                                                            words, rows).items():
+                    similarities[i] = similarity
+            return similarities.tolist()
+        except Exception:
+            logger.exception(f"Error calculating similarities against '{target_word}'")
+            return [0.0] * len(words)
+
+    def _oov_similarities(self, target_vector: np.ndarray, words: List[str],
+                          rows: List[Optional[int]]) -> Dict[int, float]:
+        """Similarity to the target of the out-of-vocabulary `words` that have subword vectors, by position."""
+        similarities = {}
+        for i, (word, row) in enumerate(zip(words, rows)):
+            if row is None:
+                vector = self._oov_vector(word)
+                if vector is not None:
+                    similarities[i] = float(np.dot(target_vector, vector))
+        return similarities
+
+    @timed('similarity')
     def calculate_similarity(self, word1: str, word2: str) -> float:
         self._ensure_model_loaded()
         try:
-            w1, w2 = word1.lower(), word2.lower()
-            if w1 not in WordEmbeddingService._model or w2 not in WordEmbeddingService._model:
-                logger.warning(f"One or both words not in FastText vocab: '{word1}', '{word2}'")
+            r1, r2 = self._row(word1), self._row(word2)
+            if r1 is not None and r2 is None:
+                vector = self._oov_vector(word2)
+                if vector is not None:
+                    return float(np.dot(self._row_vector(r1), vector))
+            if r1 is None or r2 is None:
+                # Routine for misspelt guesses, not worth a warning each time
+                logger.debug(f"One or both words not in FastText vocab: '{word1}', '{word2}'")
                 return 0.0
-            return float(WordEmbeddingService._model.similarity(w1, w2))
+            ranking = self._cached_ranking(word1)
+            if ranking is not None:
+                return ranking.similarity(r2)
+            return float(np.dot(self._row_vector(r1), self._row_vector(r2)))
         except Exception:
             logger.exception(f"Error calculating similarity between '{word1}' and '{word2}'")
             return 0.0
@@ -77,129 +597,177 @@ class WordEmbeddingService:
 
     def get_vector(self, word: str) -> np.ndarray:
         """
-        Retrieve the vector representation of a word.
-        Returns None if the word is not found in the FastText vocabulary.
+        Retrieve the (L2-normalised) vector representation of a word, built
+        from its subwords when it is out of vocabulary and they are loaded.
+        Returns None if the word has no vector.
         """
+        self._ensure_model_loaded()
         try:
-            w = word.lower()
-            if w not in self.model:
-                logger.warning(f"No vector found for word: {word}")
-                return None
-            return self.model[w]
+            row = self._row(word)
+            if row is None:
+                vector = self._oov_vector(word)
+                if vector is None:
+                    logger.warning(f"No vector found for word: {word}")
+                return vector
+            return self._row_vector(row)
         except Exception:
             logger.exception(f"Error getting vector for word: {word}")
             return None
 
+    @timed('nearest')
     def get_most_similar_words(self, target_word: str, n: int = 100) -> List[Dict[str, float]]:
         """
         Return the `n` most similar words to `target_word`.
         An empty list is returned if `target_word` is out of vocabulary.
         """
+        self._ensure_model_loaded()
         try:
-            w = target_word.lower()
-            if w not in self.model:
+            row = self._row(target_word)
+            if row is None:
                 logger.warning(f"Target word not found in vocab: {target_word}")
                 return []
-            similar = self.model.most_similar(w, topn=n)
-            return [{'word': word, 'similarity': float(sim)} for word, sim in similar]
+            ranking = self._cached_ranking(target_word)
+            if ranking is not None:
+                rows, scores = ranking.top(n)
+            else:
+                rows, scores = self._nearest(self._row_vector(row), n, exclude=[row])
+            vocab = WordEmbeddingService._vocab
+            return [{'word': vocab[i], 'similarity': float(sim)}
+                    for i, sim in zip(rows, scores)]
         except Exception:
             logger.exception(f"Error finding similar words for: {target_word}")
             return []
 
+    @timed('range_scan')
     def get_words_in_range(self, target_word: str, min_similarity: float,
                           max_similarity: float, n: int = 5) -> List[Dict[str, float]]:
         """
-        Retrieve up to `n` words whose similarity to `target_word` 
+        Retrieve up to `n` words whose similarity to `target_word`
         lies within [min_similarity, max_similarity].
         The results are randomly sampled from all words meeting the criterion.
         """
+        self._ensure_model_loaded()
         try:
-            logger.info(f"Finding words for '{target_word}' in range "
-                       f"[{min_similarity}, {max_similarity}]")
-            target_vec = self.get_vector(target_word)
-            if target_vec is None:
+            row = self._row(target_word)
+            if row is None:
                 logger.warning(f"No vector for target word: {target_word}")
                 return []
 
-            similarities = []
-            norm_target = np.linalg.norm(target_vec)
-
-            # Sample from vocabulary to improve performance
-            sample_size = min(100000, len(self.vocab_vectors))
-            sampled_words = random.sample(list(self.vocab_vectors.keys()), sample_size)
+            ranking = self._cached_ranking(target_word)
+            if ranking is not None:
+                scores = ranking.similarities
+                candidates = ranking.in_range(min_similarity, max_similarity)
+            else:
+                scores = self._scores(self._row_vector(row))
+                scores[row] = -np.inf
+                candidates = np.flatnonzero((scores >= min_similarity) & (scores <= max_similarity))
 
-            for vocab_word in sampled_words:
-                if vocab_word == target_word.lower():
-                    continue
-                
-                vector = self.vocab_vectors[vocab_word]
-                sim = float(np.dot(vector, target_vec) /
-                          (np.linalg.norm(vector) * norm_target))
-                
-                if min_similarity <= sim <= max_similarity:
-                    similarities.append({'word': vocab_word, 'similarity': sim})
-
-            logger.info(f"Found {len(similarities)} words in the range.")
-            if not similarities:
+            logger.debug(f"Found {len(candidates)} words in [{min_similarity}, {max_similarity}] "
+                         f"for '{target_word}'")
+            if len(candidates) == 0:
                 return []
 
-            similarities.sort(key=lambda x: x['similarity'], reverse=True)
-            selected_words = random.sample(similarities, min(n, len(similarities)))
-            
-            for w in selected_words:
-                logger.debug(f"Selected: {w['word']} (sim={w['similarity']:.3f})")
+            picked = random.sample(range(len(candidates)), min(n, len(candidates)))
+            selected_rows = candidates[picked]
+            selected_rows = selected_rows[np.argsort(-scores[selected_rows], kind='stable')]
+
+            vocab = WordEmbeddingService._vocab
+            selected_words = [{'word': vocab[i], 'similarity': float(scores[i])}
+                              for i in selected_rows]
             return selected_words
 
         except Exception:
             logger.exception(f"Error finding words in range for: {target_word}")
             return []
 
-    def get_center_word(self, chosen_words: List[str], target_word: str) -> Dict[str, float]:
+    @timed('combine')
+    def combine(self, combinations: List[Dict[str, float]], k: int = 10,
+                exclude: Optional[List[List[str]]] = None) -> List[List[Dict[str, float]]]:
         """
-        Compute the centroid of (chosen_words + target_word) vectors, 
-        then find the single word in the vocabulary whose vector is closest 
-        to that centroid (in cosine similarity).
+        Words closest to weighted sums of word vectors, for many sums at once:
+        midpoints ({a: 0.5, b: 0.5}), centroids, analogies ({a: 1, b: -1, c: 1}).
+        With an IVF index loaded, each query is scored against the lists it
+        probes, like _nearest. Otherwise the queries are scored in blocks of
+        matrix-matrix products over the vocabulary, sized so a block's score
+        matrix stays under _combine_block_scores. Each query's own words (and
+        `exclude[i]`) are left out of its results. Returns up to `k`
+        {'word', 'similarity'} per combination, best first; [] for a
+        combination without any known word.
         """
-        if not chosen_words:
-            logger.warning("No chosen words provided.")
-            return {}
-
-        vectors = []
-        for w in chosen_words:
-            vec = self.get_vector(w)
-            if vec is not None:
-                vectors.append(vec)
+        self._ensure_model_loaded()
+        try:
+            queries, positions = [], []
+            # Rows excluded from the results of each query
+            excluded = []
+            for i, weights in enumerate(combinations):
+                query = np.zeros(WordEmbeddingService._matrix.shape[1], dtype=np.float32)
+                rows = []
+                for word, weight in weights.items():
+                    row = self._row(word)
+                    vector = self._row_vector(row) if row is not None else self._oov_vector(word)
+                    if vector is not None and weight:
+                        query += np.float32(weight) * vector
+                    if row is not None:
+                        rows.append(row)
+                norm = np.linalg.norm(query)
+                if norm == 0:
+                    continue
+                rows += [r for r in (self._row(w) for w in (exclude[i] if exclude else ()))
+                         if r is not None]
+                excluded.append(rows)
+                queries.append(query / norm)
+                positions.append(i)
 
-        target_vec = self.get_vector(target_word)
-        if target_vec is not None:
-            vectors.append(target_vec)
+            results = [[] for _ in combinations]
+            vocab = WordEmbeddingService._vocab
+            index = WordEmbeddingService._ann_index
+            if index is not None and WordEmbeddingService._ann_probes < index.n_lists:
+                for i, query, rows in zip(positions, queries, excluded):
+                    top, scores = self._nearest(query, k, exclude=rows)
+                    results[i] = [{'word': vocab[row], 'similarity': float(score)}
+                                  for row, score in zip(top, scores) if np.isfinite(score)]
+                return results
 
-        if not vectors:
-            logger.warning("No valid vectors found among chosen or target words.")
-            return {}
+            block = max(1, WordEmbeddingService._combine_block_scores // len(vocab))
+            for start in range(0, len(queries), block):
+                # One (block, n_words) score matrix for these queries
+                scores = self._scores(np.stack(queries[start:start + block]))
+                for query_scores, rows in zip(scores, excluded[start:start + block]):
+                    query_scores[rows] = -np.inf
+                for i, query_scores, top in zip(positions[start:start + block], scores,
+                                                self._top_k_rows(scores, k)):
+                    results[i] = [{'word': vocab[row], 'similarity': float(query_scores[row])}
+                                  for row in top if np.isfinite(query_scores[row])]
+            return results
+        except Exception:
+            logger.exception("Error combining word vectors")
+            return [[] for _ in combinations]
 
-        centroid = np.mean(vectors, axis=0)
-        best_word = None
-        best_similarity = -1.0
+    def midpoint(self, word_a: str, word_b: str, k: int = 1) -> List[Dict[str, float]]:
+        """Words closest to the middle of `word_a` and `word_b`."""
+        return self.combine([{word_a: 0.5, word_b: 0.5}], k)[0]
 
-        # Sample from vocabulary to improve performance
-        sample_size = min(100000, len(self.vocab_vectors))
-        sampled_words = random.sample(list(self.vocab_vectors.keys()), sample_size)
+    def analogy(self, a: str, b: str, c: str, k: int = 1) -> List[Dict[str, float]]:
+        """Words closest to a - b + c ('roi' - 'homme' + 'femme' -> 'reine')."""
+        return self.combine([{a: 1.0, b: -1.0, c: 1.0}], k)[0]
 
-        for vocab_word in sampled_words:
-            if vocab_word == target_word.lower() or vocab_word in [cw.lower() for cw in chosen_words]:
-                continue
+    @timed('center_word')
+    def get_center_word(self, chosen_words: List[str], target_word: str) -> Dict[str, float]:
+        """
+        Compute the centroid of (chosen_words + target_word) vectors,
+        then find the single word in the vocabulary whose vector is closest
+        to that centroid (in cosine similarity).
+        """
+        if not chosen_words:
+            logger.warning("No chosen words provided.")
+            return {}
 
-            vector = self.vocab_vectors[vocab_word]
-            sim = float(np.dot(vector, centroid) / 
-                       (np.linalg.norm(vector) * np.linalg.norm(centroid)))
-            
-            if sim > best_similarity:
-                best_similarity = sim
-                best_word = vocab_word
+        weights = {}
+        for word in chosen_words + [target_word]:
+            weights[word] = weights.get(word, 0.0) + 1.0
+        best = self.combine([weights], k=1)[0]
 
-        if best_word is None:
+        if not best:
             logger.warning("Could not find a center word.")
             return {}
-
-        return {"word": best_word, "similarity": best_similarity}
\ No newline at end of file
+        return best[0]
\ No newline at end of file
@@ -0,0 +1,172 @@
+# file location: backend/services/work_pool.py
+"""
+Bounded pool for the heavy work behind some routes (layouts, range scans,
+nearest-neighbour searches), so it runs off the request threads and cannot
+pile up behind them.
+
+At most `max_workers` tasks run at once and at most `max_queue` more wait
+for a worker; past that, submit() fails fast with PoolSaturated, which the
+routes turn into a 503 with a Retry-After estimate. A caller waiting past
+its deadline gets DeadlineExceeded. The task itself cannot be interrupted:
+a queued task is cancelled, a running one finishes in the background and
+still holds its slot until then.
+
+A task that writes state calls commit_point() just before its first write.
+Past the deadline it raises DeadlineExceeded, so the write is skipped and
+the caller's retry is not applied twice; before it, the task is committed
+and its caller waits for the result even if the deadline passes meanwhile.
+
+    WORK_POOL_WORKERS       threads running heavy tasks (default 2)
+    WORK_POOL_QUEUE         tasks allowed to wait for a thread (default 8)
+    WORK_DEADLINE_SECONDS   default wait for a task's result (default 10)
+"""
+
+import contextvars
+import math
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from typing import Callable, Optional
+
+from loguru import logger
+
+# Deadline of the pool task running in the current context, if any
+_current_task = contextvars.ContextVar('work_pool_task', default=None)
+
+
+class PoolSaturated(Exception):
+    """Every worker is busy and the queue is full."""
+
+    def __init__(self, retry_after: int):
+        super().__init__(f"Server busy, retry in {retry_after}s")
+        self.retry_after = retry_after
+
+
+class DeadlineExceeded(Exception):
+    """A task did not finish before the caller's deadline."""
+
+    def __init__(self, deadline: float, retry_after: int):
+        super().__init__(f"Computation did not finish within {deadline:g}s")
+        self.retry_after = retry_after
+
+
+class _Deadline:
+    """Whether a task committed to its writes first, or its caller gave up first."""
+
+    def __init__(self, deadline: float):
+        self.deadline = deadline
+        self.expires_at = time.monotonic() + deadline
+        self.committed = False
+        self.abandoned = False
+        self.lock = threading.Lock()
+
+    def commit(self) -> bool:
+        with self.lock:
+            if not self.abandoned and time.monotonic() < self.expires_at:
+                self.committed = True
+            else:
+                self.abandoned = True
+            return self.committed
+
+    def abandon(self) -> bool:
+        """Give up on the task unless it already committed; returns whether it did."""
+        with self.lock:
+            if not self.committed:
+                self.abandoned = True
+            return self.committed
+
+
+def commit_point() -> None:
+    """
+    Mark the point where a pool task starts writing state. Raises
+    DeadlineExceeded if its caller's deadline has passed; does nothing
+    outside a pool task.
+    """
+    task = _current_task.get()
+    if task is not None and not task.commit():
+        logger.warning(f"Skipping a write: its caller gave up after {task.deadline:g}s")
+        raise DeadlineExceeded(task.deadline, 1)
+
+
+class WorkPool:
+    def __init__(self, max_workers: int = 2, max_queue: int = 8, deadline: float = 10.0):
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.deadline = deadline
+        self._executor = ThreadPoolExecutor(max_workers=max_workers,
+                                            thread_name_prefix='work-pool')
+        self._pending = 0
+        # Smoothed task duration in seconds, used for Retry-After
+        self._avg_duration = 1.0
+        self._lock = threading.Lock()
+
+    @property
+    def pending(self) -> int:
+        """Tasks running or waiting for a worker."""
+        return self._pending
+
+    def retry_after(self) -> int:
+        """Seconds until the current backlog should have drained."""
+        waves = (self._pending + 1) / self.max_workers
+        return max(1, math.ceil(waves * self._avg_duration))
+
+    def submit(self, fn: Callable, *args, _deadline: Optional[_Deadline] = None,
+               **kwargs) -> Future:
+        """Schedule fn(*args, **kwargs), or raise PoolSaturated if the queue is full."""
+        with self._lock:
+            if self._pending >= self.max_workers + self.max_queue:
+                raise PoolSaturated(self.retry_after())
+            self._pending += 1
+        try:
+            # Run in the caller's context, so metrics are attributed to its request
+            context = contextvars.copy_context()
+            context.run(_current_task.set, _deadline)
+            future = self._executor.submit(context.run, self._timed, fn, *args, **kwargs)
+        except Exception:
+            self._release()
+            raise
+        future.add_done_callback(lambda _: self._release())
+        return future
+
+    def run(self, fn: Callable, *args, deadline: Optional[float] = None, **kwargs):
+        """Run fn in the pool and wait for its result for at most `deadline` seconds."""
+        deadline = self.deadline if deadline is None else deadline
+        task = _Deadline(deadline)
+        future = self.submit(fn, *args, _deadline=task, **kwargs)
+        try:
+            return future.result(timeout=deadline)
+        except FutureTimeoutError:
+            if task.abandon():
+                # Past its commit point: the write is happening, report its outcome
+                return future.result()
+            future.cancel()
+            logger.warning(f"{getattr(fn, '__name__', fn)} missed its {deadline:g}s deadline "
+                           f"({self._pending} tasks pending)")
+            raise DeadlineExceeded(deadline, self.retry_after())
+
+    def _timed(self, fn: Callable, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                self._avg_duration = 0.8 * self._avg_duration + 0.2 * elapsed
+
+    def _release(self) -> None:
+        with self._lock:
+            self._pending -= 1
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+def create_work_pool() -> WorkPool:
+    """Build the pool from the WORK_POOL_* environment variables."""
+    return WorkPool(
+        max_workers=int(os.getenv('WORK_POOL_WORKERS', '2')),
+        max_queue=int(os.getenv('WORK_POOL_QUEUE', '8')),
+        deadline=float(os.getenv('WORK_DEADLINE_SECONDS', '10')),
+    )
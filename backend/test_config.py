@@ -4,6 +4,9 @@
 class DummyWordService:
     def calculate_similarity(self, word1, word2):
         return 0.5
+
+    def calculate_similarities(self, target_word, words):
+        return [0.5 for _ in words]
         
     def get_most_similar_words(self, target_word, n=100):
         return [{'word': f'similar_{i}', 'similarity': 0.9 - (i * 0.1)} for i in range(n)]
@@ -11,8 +14,32 @@ class DummyWordService:
     def get_words_in_range(self, target_word, min_sim, max_sim, n=5):
         return [{'word': f'range_{i}', 'similarity': (min_sim + max_sim)/2} for i in range(n)]
 
+    def prepare_target(self, target_word):
+        return None
+
+    def get_rank(self, target_word, word):
+        return 1
+
+    def get_ranks(self, target_word, words):
+        return [1 for _ in words]
+
+    def resolve_word(self, word):
+        return word
+
+    def suggest_words(self, word, n=5):
+        return []
+
+    def is_ready(self):
+        return True
+
+    def start_loading(self):
+        return None
+
+    def loading_status(self):
+        return {'stage': 'ready', 'progress': 1.0, 'error': None, 'model_loaded': True}
+
 class DummyGameService:
-    def get_state(self):
+    def get_state(self, session_id='default'):
         return {
             'target_word': 'test',
             'attempts': [],
@@ -24,15 +51,20 @@ class DummyGameService:
             }
         }
         
-    def reset_game(self):
+    def reset_game(self, daily=False, session_id='default'):
         return self.get_state()
         
-    def save_attempt(self, word, similarity):
+    def save_attempt(self, word, similarity, rank=None, session_id='default'):
         state = self.get_state()
-        state['attempts'].append({'word': word, 'similarity': similarity})
+        state['attempts'].append({'word': word, 'similarity': similarity, 'rank': rank})
         return state
         
-    def use_joker(self, joker_type):
+    def save_attempts(self, attempts, session_id='default'):
+        state = self.get_state()
+        state['attempts'].extend(attempts)
+        return state
+
+    def use_joker(self, joker_type, session_id='default'):
         return {
             'joker_words': [{'word': f'joker_{i}', 'similarity': 0.75} for i in range(5)],
             'jokers': {
@@ -41,8 +73,14 @@ class DummyGameService:
             }
         }
 
+    def get_center_word_power(self, chosen_words, session_id='default'):
+        return {'word': 'center', 'similarity': 0.5}
+
+    def get_midpoint_word_power(self, chosen_word, session_id='default'):
+        return {'word': 'midpoint', 'similarity': 0.5}
+
 class DummyVisualizationService:
-    def prepare_3d_visualization(self, target_word, guessed_words):
+    def prepare_3d_visualization(self, target_word, guessed_words, session_id='default'):
         return [{
             'word': word,
             'coordinates': [0.0, 0.0, 0.0],
@@ -0,0 +1,105 @@
+# backend/test_model_downloader.py
+"""
+Tests for services/model_downloader.py against a local HTTP server that
+honours Range requests and can cut responses short.
+
+    python -m pytest test_model_downloader.py
+"""
+import hashlib
+import os
+import re
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from services import model_downloader
+from services.model_downloader import DownloadError, download_model
+
+DATA = os.urandom(300 * 1024)
+
+
+class RangeHandler(BaseHTTPRequestHandler):
+    # Set by the tests: bytes sent before a response is cut, and the ranges asked for
+    cut_after = None
+    requested = []
+
+    def do_HEAD(self):
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(DATA)))
+        self.send_header('Accept-Ranges', 'bytes')
+        self.end_headers()
+
+    def do_GET(self):
+        match = re.fullmatch(r'bytes=(\d+)-(\d+)', self.headers.get('Range', ''))
+        start, end = (int(match[1]), int(match[2]) + 1) if match else (0, len(DATA))
+        RangeHandler.requested.append((start, end))
+        self.send_response(206 if match else 200)
+        self.send_header('Content-Length', str(end - start))
+        if match:
+            self.send_header('Content-Range', f"bytes {start}-{end - 1}/{len(DATA)}")
+        self.end_headers()
+        body = DATA[start:end]
+        if self.cut_after is not None:
+            # Announce the whole range but drop the connection part way through
+            body = body[:self.cut_after]
+        self.wfile.write(body)
+        self.wfile.flush()
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server(monkeypatch):
+    monkeypatch.setattr(model_downloader, 'CHUNK_SIZE', 4 * 1024)
+    monkeypatch.setattr(model_downloader, 'MIN_SEGMENT_SIZE', 64 * 1024)
+    monkeypatch.setattr(model_downloader, 'STATE_SAVE_INTERVAL', 8 * 1024)
+    RangeHandler.cut_after = None
+    RangeHandler.requested = []
+    httpd = ThreadingHTTPServer(('127.0.0.1', 0), RangeHandler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{httpd.server_address[1]}/model.vec"
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def test_download_resumes_after_interruption(server, tmp_path):
+    model_path = tmp_path / 'model.vec'
+    RangeHandler.cut_after = 20 * 1024
+    with pytest.raises(DownloadError):
+        download_model(server, str(model_path), segments=4)
+    assert not model_path.exists()
+    assert (tmp_path / 'model.vec.part.json').exists()
+    first_ranges = list(RangeHandler.requested)
+
+    RangeHandler.cut_after = None
+    RangeHandler.requested = []
+    digest = hashlib.sha256(DATA).hexdigest()
+    download_model(server, str(model_path), sha256=digest, segments=4)
+
+    assert model_path.read_bytes() == DATA
+    assert not (tmp_path / 'model.vec.part.json').exists()
+    # Every segment picked up after the bytes it had already written
+    for (start, end), (resumed_start, resumed_end) in zip(sorted(first_ranges),
+                                                          sorted(RangeHandler.requested)):
+        assert start < resumed_start < end and resumed_end == end
+
+
+def test_checksum_mismatch_discards_download(server, tmp_path):
+    model_path = tmp_path / 'model.vec'
+    with pytest.raises(DownloadError, match='Checksum mismatch'):
+        download_model(server, str(model_path), sha256='0' * 64, segments=4)
+    assert not model_path.exists()
+    assert not (tmp_path / 'model.vec.part').exists()
+    assert not (tmp_path / 'model.vec.part.json').exists()
+
+
+def test_verified_copy_is_not_downloaded_again(server, tmp_path):
+    model_path = tmp_path / 'model.vec'
+    digest = hashlib.sha256(DATA).hexdigest()
+    download_model(server, str(model_path), sha256=digest, segments=4)
+    RangeHandler.requested = []
+    download_model(server, str(model_path), sha256=digest, segments=4)
+    assert RangeHandler.requested == []
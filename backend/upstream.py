@@ -0,0 +1,334 @@
+# backend/upstream.py
+"""
+Pooled HTTP client used by the proxy to reach the model API.
+
+A single client is shared by every request so connections (and their TLS
+sessions) to MODEL_API_URL are kept alive and reused instead of being
+re-established per call.
+
+A circuit breaker stops forwarding once the model API has failed several
+times in a row (a sleeping Space, a crash): requests then fail at once
+with CircuitOpen instead of each holding a worker for the full timeout.
+After a cool-down, one trial request (or probe) is let through and its
+outcome closes or re-opens the circuit. Idempotent requests that fail are
+retried a bounded number of times with jittered exponential backoff, as
+long as the circuit stays closed.
+
+HealthProber polls /api/health in a background thread and keeps the last
+result, so health checks read a snapshot, and feeds the breaker, so the
+circuit closes as soon as the Space is back (probing is also what wakes
+it up). Settings come from the environment:
+
+    PROXY_CONNECT_TIMEOUT   seconds to establish a connection (default 3.05)
+    PROXY_READ_TIMEOUT      seconds to wait for a response (default 30)
+    PROXY_POOL_SIZE         keep-alive connections kept in the pool (default 20)
+    PROXY_HTTP2             "1" to use HTTP/2 through httpx, if installed
+    PROXY_RETRIES           extra tries of a failed idempotent request (default 2)
+    PROXY_RETRY_BACKOFF     base backoff between tries, in seconds (default 0.2)
+    PROXY_BREAKER_FAILURES  consecutive failures that open the circuit (default 5)
+    PROXY_BREAKER_RESET     seconds before a trial request once open (default 15)
+    PROXY_PROBE_INTERVAL    seconds between health probes, 0 to probe only
+                            when a health check finds the snapshot stale
+                            (default 10, 0 on Vercel)
+    PROXY_PROBE_TIMEOUT     timeout of one probe, in seconds (default 5)
+"""
+import os
+import random
+import threading
+import time
+from typing import Dict, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+from loguru import logger
+
+from services.metrics import timed
+
+
+IDEMPOTENT_METHODS = ('GET', 'HEAD', 'OPTIONS')
+# Statuses meaning the model API itself is down; its own 503s carry a Retry-After
+UNAVAILABLE_STATUSES = (502, 503, 504)
+
+
+class UpstreamError(Exception):
+    """The model API could not be reached or did not answer in time."""
+
+
+class CircuitOpen(UpstreamError):
+    """The model API is known to be down; the request was not sent."""
+
+    def __init__(self, retry_after: int):
+        super().__init__(f"Model API unavailable, retry in {retry_after}s")
+        self.retry_after = retry_after
+
+
+def is_unavailable(response) -> bool:
+    """True for gateway errors and for 503s not sent by the model API (which set Retry-After)."""
+    return (response.status_code in UNAVAILABLE_STATUSES
+            and not (response.status_code == 503 and 'Retry-After' in response.headers))
+
+
+class CircuitBreaker:
+    """Closed while the model API answers, open after `failure_threshold` consecutive failures."""
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 15.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = 'closed'
+        self.failures = 0
+        self.opened_at = 0.0
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        """Whether a request may be sent; once the cool-down is over, lets a single trial through."""
+        with self._lock:
+            if self.state == 'closed':
+                return True
+            if self.state == 'open' and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = 'half_open'
+            if self.state == 'half_open' and not self._trial_running:
+                self._trial_running = True
+                return True
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            if self.state != 'closed':
+                logger.info("Model API reachable again, closing the circuit")
+            self.state = 'closed'
+            self.failures = 0
+            self._trial_running = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            self._trial_running = False
+            if self.state == 'half_open' or (self.state == 'closed'
+                                             and self.failures >= self.failure_threshold):
+                if self.state == 'closed':
+                    logger.warning(f"Model API failed {self.failures} times in a row, opening the circuit")
+                self.state = 'open'
+                self.opened_at = time.monotonic()
+
+    def retry_after(self) -> int:
+        """Seconds until the next trial, for the Retry-After header."""
+        with self._lock:
+            if self.state == 'closed':
+                return 1
+            remaining = self.reset_timeout - (time.monotonic() - self.opened_at)
+            return max(1, int(remaining + 0.999))
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            return {'state': self.state, 'consecutive_failures': self.failures}
+
+
+class UpstreamClient:
+    def __init__(self, base_url: str, connect_timeout: float = 3.05,
+                 read_timeout: float = 30.0, pool_size: int = 20, http2: bool = False,
+                 breaker: Optional[CircuitBreaker] = None, retries: int = 0,
+                 retry_backoff: float = 0.2):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = (connect_timeout, read_timeout)
+        self.breaker = breaker
+        self.retries = retries
+        self.retry_backoff = retry_backoff
+        self._httpx = None
+        self._session = None
+
+        if http2:
+            try:
+                import httpx
+                self._httpx = httpx.Client(
+                    http2=True,
+                    timeout=httpx.Timeout(read_timeout, connect=connect_timeout),
+                    limits=httpx.Limits(max_connections=pool_size,
+                                        max_keepalive_connections=pool_size),
+                )
+                logger.info("Proxy upstream client using HTTP/2")
+            except ImportError:
+                logger.warning("PROXY_HTTP2 is set but httpx[http2] is not installed, using HTTP/1.1")
+
+        if self._httpx is None:
+            self._session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+            self._session.mount('http://', adapter)
+            self._session.mount('https://', adapter)
+
+    def request(self, method: str, path: str, json: Optional[Dict] = None,
+                headers: Optional[Dict[str, str]] = None, timeout: Optional[float] = None):
+        """
+        Send a request to the model API and return the response, whatever its
+        status. Raises CircuitOpen without sending it while the circuit is
+        open, and UpstreamError on connection failures and timeouts. The
+        breaker counts one success or failure per call, however many tries
+        it took; the trial request of a half-open circuit is not retried.
+        """
+        breaker = self.breaker
+        if breaker is not None and not breaker.allow():
+            raise CircuitOpen(breaker.retry_after())
+
+        trial = breaker is not None and breaker.state == 'half_open'
+        tries = 1 + (self.retries if method in IDEMPOTENT_METHODS and not trial else 0)
+        for attempt in range(tries):
+            if attempt:
+                if breaker is not None and breaker.state == 'open':
+                    # Other requests found the model API down meanwhile
+                    break
+                # Full jitter, so clients retrying together don't hit a recovering Space at once
+                time.sleep(random.uniform(0, self.retry_backoff * 2 ** (attempt - 1)))
+            response, error = None, None
+            try:
+                response = self.send(method, path, json, headers, timeout)
+            except UpstreamError as e:
+                error = e
+            if response is not None and not is_unavailable(response):
+                break
+
+        if breaker is not None:
+            if response is not None and not is_unavailable(response):
+                breaker.record_success()
+            else:
+                breaker.record_failure()
+        if error is not None:
+            raise error
+        return response
+
+    def send(self, method: str, path: str, json: Optional[Dict] = None,
+             headers: Optional[Dict[str, str]] = None, timeout: Optional[float] = None):
+        """Send one request, bypassing the circuit breaker and retries."""
+        url = f"{self.base_url}{path}"
+        try:
+            with timed('upstream'):
+                return self._send(method, url, json, headers, timeout)
+        except requests.RequestException as e:
+            raise UpstreamError(str(e)) from e
+        except Exception as e:
+            if self._httpx is not None and e.__class__.__module__.startswith('httpx'):
+                raise UpstreamError(str(e)) from e
+            raise
+
+    def _send(self, method: str, url: str, json: Optional[Dict],
+              headers: Optional[Dict[str, str]], timeout: Optional[float]):
+        if self._httpx is not None:
+            return self._httpx.request(method, url, json=json, headers=headers,
+                                       timeout=timeout or self._httpx.timeout)
+        return self._session.request(method, url, json=json, headers=headers,
+                                     timeout=timeout or self.timeout)
+
+    def get(self, path: str, **kwargs):
+        return self.request('GET', path, **kwargs)
+
+    def post(self, path: str, **kwargs):
+        return self.request('POST', path, **kwargs)
+
+
+class HealthProber:
+    """Keeps a snapshot of the model API's health, refreshed in the background."""
+
+    def __init__(self, client: UpstreamClient, interval: float = 10.0, timeout: float = 5.0):
+        self.client = client
+        self.interval = interval
+        self.timeout = timeout
+        self._snapshot = None
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stop = threading.Event()
+
+    def start(self) -> None:
+        """Start the probing thread, unless probing is on demand (interval 0) or it runs already."""
+        if self.interval <= 0 or (self._thread is not None and self._thread.is_alive()):
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='upstream-prober', daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            snapshot = self.probe()
+            # Probe faster while the Space is down, to notice (and help) its wake-up
+            self._stop.wait(self.interval if snapshot['healthy'] else min(self.interval, 3.0))
+
+    def probe(self) -> Dict:
+        """Check /api/health once, record the outcome in the breaker and return the new snapshot."""
+        start = time.time()
+        healthy, model_loaded, message = False, False, None
+        try:
+            response = self.client.send('GET', '/api/health', timeout=self.timeout)
+            if is_unavailable(response):
+                message = f"Model API answered {response.status_code}"
+            else:
+                data = response.json() if response.status_code in (200, 503) else {}
+                healthy = True
+                model_loaded = bool(data.get('model_loaded', response.status_code == 200))
+                message = ("Service healthy and model loaded" if model_loaded
+                           else "Service running but model not loaded")
+        except (UpstreamError, ValueError) as e:
+            message = f"Failed to connect to service: {e}"
+
+        breaker = self.client.breaker
+        if breaker is not None:
+            if healthy:
+                breaker.record_success()
+            else:
+                breaker.record_failure()
+        snapshot = {
+            'healthy': healthy and model_loaded,
+            'reachable': healthy,
+            'message': message,
+            'response_time': time.time() - start,
+            'checked_at': time.time(),
+        }
+        with self._lock:
+            self._snapshot = snapshot
+        if not healthy:
+            logger.debug(f"Model API probe failed: {message}")
+        return snapshot
+
+    def snapshot(self, max_age: Optional[float] = None) -> Dict:
+        """
+        The last probe's result, probing now if there is none or it is older
+        than `max_age` seconds (default: twice the interval, or 10s on demand;
+        at most 3s while the model API is down, to report its recovery soon).
+        """
+        if max_age is None:
+            max_age = 2 * self.interval if self.interval > 0 else 10.0
+        with self._lock:
+            snapshot = self._snapshot
+        if snapshot is not None and not snapshot['healthy']:
+            max_age = min(max_age, 3.0)
+        if snapshot is None or time.time() - snapshot['checked_at'] > max_age:
+            snapshot = self.probe()
+        return dict(snapshot)
+
+
+def create_upstream_client(base_url: str) -> UpstreamClient:
+    """Build the shared client from the PROXY_* environment variables."""
+    return UpstreamClient(
+        base_url,
+        connect_timeout=float(os.getenv('PROXY_CONNECT_TIMEOUT', '3.05')),
+        read_timeout=float(os.getenv('PROXY_READ_TIMEOUT', '30')),
+        pool_size=int(os.getenv('PROXY_POOL_SIZE', '20')),
+        http2=os.getenv('PROXY_HTTP2', '0') == '1',
+        breaker=CircuitBreaker(
+            failure_threshold=int(os.getenv('PROXY_BREAKER_FAILURES', '5')),
+            reset_timeout=float(os.getenv('PROXY_BREAKER_RESET', '15')),
+        ),
+        retries=int(os.getenv('PROXY_RETRIES', '2')),
+        retry_backoff=float(os.getenv('PROXY_RETRY_BACKOFF', '0.2')),
+    )
+
+
+def create_health_prober(client: UpstreamClient) -> HealthProber:
+    """Build the prober from the PROXY_PROBE_* environment variables (started by the caller)."""
+    # Serverless functions don't keep background threads alive between requests
+    default_interval = '0' if os.getenv('VERCEL_ENV') else '10'
+    return HealthProber(
+        client,
+        interval=float(os.getenv('PROXY_PROBE_INTERVAL', default_interval)),
+        timeout=float(os.getenv('PROXY_PROBE_TIMEOUT', '5')),
+    )
@@ -13,6 +13,7 @@ let selectedWordsForCenter: string[] = [];
 // Initialize Elements
 const form = document.getElementById('guessForm') as HTMLFormElement;
 const input = document.getElementById('wordInput') as HTMLInputElement;
+const defaultPlaceholder = input.placeholder;
 const result = document.getElementById('result') as HTMLDivElement;
 const targetWordDisplay = document.getElementById('targetWord') as HTMLElement;
 const visualizationSection = document.getElementById('visualizationSection') as HTMLDivElement;
@@ -206,14 +207,18 @@ form.addEventListener('submit', async (e) => {
     if (!guess) return;
 
     try {
-        const response: GameResponse = await checkWord(guess);
+        const response: GameResponse = await checkWord(guess, gameState.attempts.length);
         console.log('Response from check-word:', response); // Debug log
 
         // Update game state only if we have a valid response
         if (response && response.history) {
+            // Delta response: the server only sent the attempts after `history_since`
+            const attempts = response.history_since === undefined
+                ? response.history
+                : [...gameState.attempts.slice(0, response.history_since), ...response.history];
             gameState = {
                 ...gameState,
-                attempts: response.history,
+                attempts,
                 word_found: response.word_found
             };
             
@@ -221,7 +226,11 @@ form.addEventListener('submit', async (e) => {
             UI.updateGameDisplay(gameState);
             await updateVisualization();
             
-            if (response.word_found && response.similar_words) {
+            input.placeholder = response.suggestions?.length
+                ? `Vouliez-vous dire : ${response.suggestions.join(', ')} ?`
+                : defaultPlaceholder;
+
+            if (response.word_found && response.similar_words?.length) {
                 gameState.similar_words = response.similar_words;
                 UI.showSimilarWords(response.similar_words);
             }
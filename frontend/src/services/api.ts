@@ -12,6 +12,17 @@ const getBaseUrl = () => {
 
 const API_URL = getBaseUrl();
 
+// Per-browser game session, so concurrent players each get their own game
+const SESSION_ID = (() => {
+    const key = 'semantix-session-id';
+    let id = localStorage.getItem(key);
+    if (!id) {
+        id = crypto.randomUUID();
+        localStorage.setItem(key, id);
+    }
+    return id;
+})();
+
 
 export async function checkSystemHealth() {
     return apiCall('/system-health');
@@ -23,6 +34,7 @@ async function apiCall(endpoint: string, options?: RequestInit) {
             ...options,
             headers: {
                 'Content-Type': 'application/json',
+                'X-Session-Id': SESSION_ID,
                 ...options?.headers,
             },
         });
@@ -40,11 +52,12 @@ async function apiCall(endpoint: string, options?: RequestInit) {
 }
 
 // frontend/src/services/api.ts
-export async function checkWord(guessWord: string) {
+// With `since` (the number of attempts already shown), only the newer attempts are returned
+export async function checkWord(guessWord: string, since?: number) {
     try {
         const response = await apiCall('/check-word', {
             method: 'POST',
-            body: JSON.stringify({ word: guessWord })
+            body: JSON.stringify({ word: guessWord, since })
         });
         
         // Debug log the response
@@ -63,6 +76,13 @@ export async function checkWord(guessWord: string) {
     }
 }
 
+export async function checkWords(guessWords: string[]) {
+    return apiCall('/check-words', {
+        method: 'POST',
+        body: JSON.stringify({ words: guessWords })
+    });
+}
+
 export async function getGameState() {
     return apiCall('/game-state');
 }
@@ -84,6 +104,13 @@ export async function getCenterWord(chosenWords: string[]): Promise<{word: strin
     });
 }
 
+export async function getMidpointWord(chosenWord: string): Promise<{word: string; similarity: number}> {
+    return apiCall('/get-midpoint-word', {
+        method: 'POST',
+        body: JSON.stringify({ chosen_word: chosenWord })
+    });
+}
+
 export async function useJoker(jokerType: 'high_similarity' | 'medium_similarity') {
     console.log(`Sending joker request for type: ${jokerType}`);
     
@@ -4,6 +4,7 @@ export interface GameState {
     attempts: Array<{
         word: string;
         similarity: number;
+        rank?: number;
     }>;
     word_found?: boolean;
     similar_words?: Array<{
@@ -23,11 +24,19 @@ export interface GameState {
 }
 
 export interface GameResponse {
+    word?: string;
+    error?: string;
     similarity: number;
+    rank?: number | null;
     history: Array<{
         word: string;
         similarity: number;
+        rank?: number;
     }>;
+    history_since?: number;
+    history_length?: number;
+    // Close vocabulary words, when the guess was not found
+    suggestions?: string[];
     word_found: boolean;
     similar_words: Array<{
         word: string;
@@ -26,12 +26,19 @@ export function updateWordList(gameState: GameState) {
             <div class="guessed-word-item flex justify-between items-center p-2 rounded-lg bg-slate-50 hover:bg-slate-100 transition-colors"
                  data-word="${attempt.word}">
                 <span class="font-medium">${attempt.word}</span>
+                ${formatRank(attempt.rank)}
                 <span class="${getScoreColorClass(attempt.similarity)}">${(attempt.similarity * 100).toFixed(1)}%</span>
             </div>
         `).join('');
     }
 }
 
+// Semantix-style proximity rank, only shown for the 1000 closest words
+function formatRank(rank?: number): string {
+    if (rank === undefined || rank === null || rank > 1000) return '';
+    return `<span class="text-xs text-slate-500">${rank}/1000</span>`;
+}
+
 export function showJokerWords(words: Array<{word: string; similarity: number}>, type: 'high_similarity' | 'medium_similarity') {
     console.log(`Showing joker words for ${type}:`, words); // Debug log
     